@@ -0,0 +1,214 @@
+# aggregates.py - Precomputed aggregates for the dashboard views
+import os
+import pickle
+import numpy as np
+import pandas as pd
+
+from cleaning import CLEANED_PARQUET_PATH
+from dataset import load_cleaned, dataset_version
+from term_frequency import GroupedTermCounts, count_terms_by
+from time_index import PublicationIndex
+from metrics import instrument
+
+AGGREGATES_PATH = 'data/aggregates.pkl'
+# Bumped whenever the set of aggregates changes, so older files get rebuilt
+AGGREGATES_FORMAT = 3
+AGGREGATE_COLUMNS = ['title', 'journal', 'publish_time', 'year', 'abstract_word_count']
+
+# Abstract length histogram: fixed bins so per-year histograms can be summed
+ABSTRACT_BINS = 50
+
+# Aggregates that are plain sums over rows, so they can be updated from added/removed rows
+ADDITIVE_KEYS = ['total_papers', 'abstract_sum', 'year_counts', 'journal_counts',
+                 'journal_year_counts', 'journal_abstract_sum', 'year_abstract_histograms',
+                 'year_abstract_sum', 'title_terms_by_year', 'day_counts']
+
+
+def abstract_bin_edges(words):
+    """Histogram bin edges covering the abstract word counts"""
+    if len(words) == 0:
+        return np.arange(ABSTRACT_BINS + 1, dtype=np.float64)
+    return np.linspace(words.min(), words.max(), ABSTRACT_BINS + 1)
+
+
+def _int_index(series):
+    series.index = series.index.astype(int)
+    return series
+
+
+def count_aggregates(df, edges):
+    """Additive aggregates (counts and sums) over the rows of df"""
+    years = df['year'].astype('float64')
+    journals = df['journal'].astype(str)
+    words = df['abstract_word_count'].astype('float64')
+
+    bin_ids = np.clip(np.searchsorted(edges, words, side='right') - 1, 0, ABSTRACT_BINS - 1)
+    year_histograms = (
+        pd.DataFrame({'year': years, 'bin': bin_ids})
+        .dropna()
+        .groupby(['year', 'bin'])
+        .size()
+        .unstack(fill_value=0)
+        .reindex(columns=range(ABSTRACT_BINS), fill_value=0)
+    )
+
+    return {
+        'total_papers': len(df),
+        'abstract_sum': float(words.sum()),
+        'year_counts': _int_index(years.value_counts().sort_index()),
+        'journal_counts': journals.value_counts(),
+        # Per-(journal, year) counts answer any year-filtered journal question without rows
+        'journal_year_counts': (
+            pd.DataFrame({'journal': journals, 'year': years})
+            .dropna()
+            .groupby(['journal', 'year'])
+            .size()
+            .rename('count')
+        ),
+        'journal_abstract_sum': words.groupby(journals).sum(),
+        'year_abstract_histograms': _int_index(year_histograms),
+        'year_abstract_sum': _int_index(words.groupby(years).sum()),
+        # Title word counts per year; .total() gives the counts over all papers
+        'title_terms_by_year': count_terms_by(df['title'], df['year']),
+        # Papers per publication day; finalize_aggregates turns them into a PublicationIndex
+        'day_counts': df['publish_time'].dropna().dt.normalize().value_counts().sort_index(),
+    }
+
+
+def _combine(old, delta, sign):
+    """old + sign * delta for one additive aggregate, dropping entries that reach zero"""
+    if isinstance(old, GroupedTermCounts):
+        return old + delta if sign > 0 else old - delta
+    if isinstance(old, (int, float)):
+        return old + sign * delta
+    combined = old.add(delta * sign, fill_value=0)
+    if isinstance(combined, pd.DataFrame):
+        combined = combined[combined.sum(axis=1) > 0].astype('int64')
+    else:
+        combined = combined[combined != 0]
+    return combined.sort_index()
+
+
+def finalize_aggregates(counts, edges, recent_papers):
+    """Build the full aggregates dict (additive counts plus derived values) the views use"""
+    year_counts = counts['year_counts'].astype('int64')
+    journal_counts = counts['journal_counts'].astype('int64').sort_values(ascending=False, kind='stable')
+    journal_year_counts = counts['journal_year_counts'].astype('int64')
+    total = counts['total_papers']
+
+    journal_year_range = (
+        journal_year_counts.reset_index()
+        .groupby('journal')['year']
+        .agg(['min', 'max'])
+        .reindex(journal_counts.index)
+    )
+    journal_abstract_mean = (counts['journal_abstract_sum'] / journal_counts).reindex(journal_counts.index)
+
+    aggregates = dict(counts)
+    aggregates.update({
+        'year_counts': year_counts,
+        'journal_counts': journal_counts,
+        'journal_year_counts': journal_year_counts,
+        'year_min': int(year_counts.index.min()) if len(year_counts) else None,
+        'year_max': int(year_counts.index.max()) if len(year_counts) else None,
+        'unique_journals': int(len(journal_counts)),
+        'abstract_mean': counts['abstract_sum'] / total if total else 0.0,
+        'journal_year_range': journal_year_range,
+        'journal_abstract_mean': journal_abstract_mean,
+        'abstract_bin_edges': edges,
+        'recent_papers': recent_papers,
+        'publications': PublicationIndex.from_day_counts(counts['day_counts'].astype('int64')),
+    })
+    return aggregates
+
+
+def recent_papers(df, n=5):
+    """Most recently published papers"""
+    return df.nlargest(n, 'publish_time')[['title', 'journal', 'publish_time']]
+
+
+@instrument('aggregates.compute')
+def compute_aggregates(df):
+    """Compute every count and statistic the dashboard views show, in one pass over the data"""
+    edges = abstract_bin_edges(df['abstract_word_count'].astype('float64'))
+    return finalize_aggregates(count_aggregates(df, edges), edges, recent_papers(df))
+
+
+@instrument('aggregates.update')
+def update_aggregates(aggregates, removed, added, recent=None):
+    """Update aggregates from the rows removed from and added to the dataset.
+
+    Counts are adjusted by the delta only; the histogram keeps its bin edges, so new
+    abstracts longer than the old maximum land in the last bin. recent is the new
+    'recent papers' table; when omitted it is derived from the old one and the delta,
+    which is only exact if no removed paper was among the recent ones.
+    """
+    edges = aggregates['abstract_bin_edges']
+    counts = {key: aggregates[key] for key in ADDITIVE_KEYS}
+    for rows, sign in ((removed, -1), (added, 1)):
+        if rows is not None and len(rows) > 0:
+            delta = count_aggregates(rows, edges)
+            counts = {key: _combine(counts[key], delta[key], sign) for key in ADDITIVE_KEYS}
+
+    if recent is None:
+        candidates = [aggregates['recent_papers']]
+        if added is not None and len(added) > 0:
+            candidates.append(recent_papers(added))
+        recent = recent_papers(pd.concat(candidates))
+    return finalize_aggregates(counts, edges, recent)
+
+
+def save_aggregates(aggregates, version, path=AGGREGATES_PATH):
+    """Save aggregates together with the dataset version they describe"""
+    # Written aside and renamed, so a reader never sees a partly written file
+    with open(f'{path}.{os.getpid()}.tmp', 'wb') as f:
+        pickle.dump({'version': version, 'format': AGGREGATES_FORMAT, 'aggregates': aggregates}, f)
+    os.replace(f.name, path)
+
+
+def read_aggregates(version, path=AGGREGATES_PATH):
+    """Aggregates saved for version; ValueError when the file is for another version or format"""
+    with open(path, 'rb') as f:
+        saved = pickle.load(f)
+    if saved.get('version') != version or saved.get('format') != AGGREGATES_FORMAT:
+        raise ValueError(f"Aggregates in '{path}' were saved for another dataset version or format")
+    return saved['aggregates']
+
+
+@instrument('aggregates.load')
+def load_aggregates(version=None, path=AGGREGATES_PATH, source=CLEANED_PARQUET_PATH):
+    """Return the aggregates for the current dataset version.
+
+    They are read from the aggregates file when it was built for the same version,
+    otherwise recomputed from the cleaned dataset at source and saved for the next run.
+    """
+    version = version or dataset_version()
+    try:
+        return read_aggregates(version, path)
+    except (FileNotFoundError, ValueError):
+        pass
+
+    aggregates = compute_aggregates(load_cleaned(AGGREGATE_COLUMNS, path=source))
+    save_aggregates(aggregates, version, path)
+    return aggregates
+
+
+@instrument('aggregates.year_range_counts')
+def year_range_counts(aggregates, start, end, granularity='year'):
+    """Papers per year (or day/week/month/quarter) within the years [start, end], indexed by period"""
+    return aggregates['publications'].counts(granularity, f'{start}-01-01', f'{end}-12-31')
+
+
+@instrument('aggregates.year_range_abstract_histogram')
+def year_range_abstract_histogram(aggregates, start, end):
+    """Abstract length histogram (counts per bin) for papers within [start, end]"""
+    return aggregates['year_abstract_histograms'].loc[start:end].sum().to_numpy()
+
+
+@instrument('aggregates.journal_year_counts')
+def journal_year_counts(aggregates, start, end):
+    """Papers per journal within [start, end], largest first"""
+    counts = aggregates['journal_year_counts']
+    years = counts.index.get_level_values('year')
+    in_range = counts[(years >= start) & (years <= end)]
+    return in_range.groupby(level='journal').sum().sort_values(ascending=False)
@@ -1,10 +1,24 @@
 # app.py
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from wordcloud import WordCloud
-import io
+import numpy as np
+import os
+import time
+from dataset import dataset_version
+from aggregates import (load_aggregates, year_range_counts, year_range_abstract_histogram)
+from search_index import load_search_index, query_key
+from facets import load_facets, select_rows
+from figures import FIRST_PAGE_FIGURES, FigureCache, draw_pie, wordcloud_png
+from query_cache import QueryCache
+from corpus import load_corpus
+from time_index import GRANULARITIES, load_publication_index
+from export import FORMATS, export, export_columns, iter_batches
+from dataset_profile import ProfileBuilder, describe
+from similarity import load_similarity_index
+from entities import load_entities
+from cleaning import CLEANED_PARQUET_PATH
+from shared_dataset import SHARED_MODE, SharedDataset, current_snapshot, published_snapshot
+from metrics import ENABLED as METRICS_ENABLED, REGISTRY, instrument
 
 # Page configuration
 st.set_page_config(
@@ -39,26 +53,189 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 @st.cache_data
-def load_data():
-    """Load and cache the cleaned dataset"""
-    try:
-        df = pd.read_csv('data/cleaned_metadata.csv')
-        df['publish_time'] = pd.to_datetime(df['publish_time'])
-        return df
-    except FileNotFoundError:
-        st.error("Cleaned dataset not found. Please run the data cleaning script first.")
-        return None
+def get_aggregates(version):
+    """Load and cache the precomputed aggregates for one dataset version"""
+    return load_aggregates(version)
+
+@st.cache_resource
+def get_search_index(version):
+    """Load (or build) the full-text search index once per dataset version, shared by all sessions"""
+    return load_search_index(version)
+
+@st.cache_resource
+def get_facets(version):
+    """Row positions per year and per journal, built once per dataset version"""
+    return load_facets()
+
+@st.cache_resource
+def get_publication_index(version):
+    """Row positions in publication date order, for the explorer's date filter"""
+    return load_publication_index()
+
+@st.cache_resource
+def get_similarity_index(version):
+    """Paper embeddings and their nearest-neighbour index, for the explorer's papers like this"""
+    return load_similarity_index(version)
+
+@st.cache_resource
+def get_entities(version):
+    """Normalized author and journal tables with the paper-author edges, shared by all sessions"""
+    return load_entities(version)
+
+@st.cache_resource
+def get_corpus(version):
+    """Compact corpus (encoded text, lazy abstracts), one copy shared by all sessions"""
+    return load_corpus(version)
+
+@st.cache_resource(max_entries=2)
+def get_shared_dataset(snapshot):
+    """Published snapshot mapped read-only; the previous one is released after a swap"""
+    shared = SharedDataset(snapshot)
+    # Its first-page charts were rendered when it was published
+    for key, image in shared.figures.items():
+        get_figure_cache().put((shared.version,) + key, image)
+    return shared
+
+@st.cache_resource
+def get_profiler():
+    """Background builder of the dataset profiles shown in the data summary"""
+    return ProfileBuilder()
+
+@st.cache_resource(max_entries=2)
+def get_profile(version, parquet_path):
+    """Future of the dataset profile, submitted once per version (computed in the background)"""
+    return get_profiler().submit(parquet_path)
+
+@st.cache_resource
+def get_figure_cache():
+    """Rendered charts shared by all sessions (LRU, bounded memory)"""
+    return FigureCache()
+
+@st.cache_resource
+def get_query_cache():
+    """Filter, search and aggregate results shared by all sessions (LRU + TTL, requests coalesced)"""
+    return QueryCache()
+
+def cached_query(key, compute):
+    """Result of compute() for key (normalized query parameters, including the dataset version)"""
+    return get_query_cache().get(key, compute)
+
+def show_figure(key, draw, figsize):
+    """Show a matplotlib chart, rendered once per key and then served from the cache"""
+    st.image(get_figure_cache().render(key, draw, figsize), use_column_width=True)
+
+def year_frame(counts):
+    """Per-year counts as a frame for the native charts (years as labels, not 2,020)"""
+    return pd.DataFrame({'Year': counts.index.astype(int).astype(str), 'Number of Papers': counts.to_numpy()})
+
+# Papers listed under "Papers like this" in the explorer
+SIMILAR_PAPERS = 5
+
+# Authors listed per paper in the explorer; the rest are counted
+AUTHORS_SHOWN = 10
+
+def format_authors(names):
+    """Author names of a paper for display, the first AUTHORS_SHOWN of them"""
+    if not names:
+        return "Unknown"
+    shown = "; ".join(names[:AUTHORS_SHOWN])
+    return shown if len(names) <= AUTHORS_SHOWN else f"{shown} and {len(names) - AUTHORS_SHOWN} more"
+
+# Label of each period in the trend chart (weeks are labelled by their first day)
+PERIOD_LABELS = {'day': '%Y-%m-%d', 'week': '%Y-%m-%d', 'month': '%Y-%m', 'quarter': None, 'year': '%Y'}
+
+def period_frame(counts, granularity):
+    """Counts per period as a frame for the native charts; the labels sort in time order"""
+    fmt = PERIOD_LABELS[granularity]
+    labels = counts.index.start_time.strftime(fmt) if fmt else counts.index.astype(str)
+    return pd.DataFrame({granularity.title(): labels, 'Number of Papers': counts.to_numpy()})
+
+def find_papers(corpus, search_index, facets, publications, search_term, year, journal, date_range):
+    """Row positions matching the explorer's search and filters, ranked by relevance when
+    searching (None = every row). The frame itself is never copied or masked.
+    """
+    selections = []
+    if date_range:
+        # Papers without a publication date are left out once a date range is chosen
+        selections.append(publications.positions_between(*date_range))
+    if year != 'All':
+        selections.append(facets['year'].positions(year))
+    if journal != 'All':
+        selections.append(facets['journal'].positions(journal))
+    
+    ranked = None
+    if search_term:
+        # Index lookup returns matching rows ordered by relevance (BM25)
+        results = search_index.search(search_term, corpus)
+        if results is not None:
+            ranked = results[0]
+    
+    return select_rows(selections, ordered=ranked)
+
+# How often a finished run checks whether a background result (word cloud, profile) is ready
+RERUN_POLL_SECONDS = 0.25
+
+def rerun_when_done(future):
+    """Rerun the script once a background result is ready, so the page picks it up.
+
+    Called after the whole page has been sent. A widget change meanwhile starts a
+    new run, which stops this one at its next poll (Streamlit checks for that
+    whenever an element is sent), so interactions never wait for the result.
+    """
+    heartbeat = st.empty()
+    while not future.done():
+        time.sleep(RERUN_POLL_SECONDS)
+        heartbeat.empty()
+    st.rerun()
+
+def show_export(version, path, positions=None, columns=None, key='export'):
+    """Export controls: the file is generated only when asked for, then reused per dataset version"""
+    col1, col2 = st.columns(2)
+    with col1:
+        fmt = st.selectbox("Format:", list(FORMATS), key=f'{key}_format')
+    with col2:
+        if columns is not None:
+            columns = st.multiselect("Columns (default: all):", columns, key=f'{key}_columns') or None
+    
+    request = (version, fmt, tuple(columns) if columns else None, positions.tobytes() if positions is not None else None)
+    if st.session_state.get(f'{key}_request') != request:
+        st.session_state.pop(f'{key}_path', None)
+    if st.button("Prepare download", key=f'{key}_prepare'):
+        with st.spinner("Writing export..."):
+            st.session_state[f'{key}_path'] = export(fmt, columns, positions, version, path)
+        st.session_state[f'{key}_request'] = request
+    
+    export_path = st.session_state.get(f'{key}_path')
+    if export_path and os.path.exists(export_path):
+        with open(export_path, 'rb') as f:
+            st.download_button(label=f"Download {os.path.basename(export_path)}", data=f,
+                               file_name=f"cord19_cleaned{FORMATS[fmt][0]}", mime=FORMATS[fmt][1],
+                               key=f'{key}_download')
+
+def show_metrics_panel():
+    """Developer panel (CORD19_METRICS set): stage timings and query cache counters of this server process"""
+    with st.sidebar.expander("⏱️ Timings"):
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Write files"):
+                st.caption("\n".join(REGISTRY.export()))
+        with col2:
+            if st.button("Reset"):
+                REGISTRY.reset()
+        summary = REGISTRY.summary()
+        if summary:
+            table = pd.DataFrame.from_dict(summary, orient='index')
+            st.dataframe(table[['count', 'p50_seconds', 'p95_seconds', 'max_seconds', 'last_rows', 'peak_mb']])
+        else:
+            st.caption("Nothing recorded yet")
+        st.write("**Query cache**")
+        st.dataframe(pd.Series(get_query_cache().stats(), name='value').astype(str))
 
 def main():
     # Header
     st.markdown('<h1 class="main-header">🔬 CORD-19 Data Explorer</h1>', unsafe_allow_html=True)
     st.write("Simple exploration of COVID-19 research papers")
     
-    # Load data
-    df = load_data()
-    if df is None:
-        return
-    
     # Sidebar
     st.sidebar.title("Navigation")
     section = st.sidebar.radio(
@@ -67,27 +244,89 @@ def main():
          "🔍 Paper Explorer", "📋 Data Summary"]
     )
     
+    # Cached data is keyed by the cleaned file's version, so a rewrite invalidates it.
+    # In shared mode everything comes from the published snapshot, memory-mapped and
+    # shared by all server processes; publishing a new one swaps it on the next rerun.
+    # Otherwise the snapshot of the current version, when published, is used as a warm
+    # start: it is opened instead of loading and indexing the cleaned dataset.
+    shared = None
+    if SHARED_MODE:
+        snapshot = current_snapshot()
+        if snapshot is None:
+            st.error("No published dataset found. Please run: python main.py publish")
+            return
+        try:
+            shared = get_shared_dataset(snapshot)
+        except ValueError as error:
+            st.error(f"{error}. Please run: python main.py publish")
+            return
+        version = shared.version
+    else:
+        version = dataset_version()
+        if version is None:
+            st.error("Cleaned dataset not found. Please run the data cleaning script first.")
+            return
+        snapshot = published_snapshot(version)
+        if snapshot is not None:
+            try:
+                shared = get_shared_dataset(snapshot)
+            except ValueError:
+                shared = None  # out of date: load the cleaned dataset instead
+    
+    if shared:
+        aggs, parquet_path = shared.aggregates, shared.parquet_path
+    else:
+        aggs, parquet_path = get_aggregates(version), CLEANED_PARQUET_PATH
+    
+    # The dataset profile is computed in the background as soon as a version is first seen.
+    # No view loads the cleaned dataset's rows: the dashboard and trends are answered from
+    # the aggregates, the journal and explorer views from the shared compact corpus and the
+    # author and journal tables, and the data summary from the profile.
+    profile = get_profile(version, parquet_path)
+    
+    pending = None  # a background computation whose result the page is waiting for
+    
     # Dashboard Overview
     if section == "📊 Dashboard Overview":
-        show_dashboard(df)
+        show_dashboard(aggs, version)
     
     # Publication Trends
     elif section == "📈 Publication Trends":
-        show_publication_trends(df)
+        pending = show_publication_trends(aggs, version)
     
     # Journal Analysis
     elif section == "🏆 Journal Analysis":
-        show_journal_analysis(df)
+        if shared:
+            corpus, entities = shared.corpus, shared.entities
+        else:
+            corpus, entities = get_corpus(version), get_entities(version)
+        show_journal_analysis(corpus, entities, version)
     
     # Paper Explorer
     elif section == "🔍 Paper Explorer":
-        show_paper_explorer(df)
+        if shared:
+            corpus, search_index, facets = shared.corpus, shared.search_index, shared.facets
+            publications, similarity, entities = shared.publications, shared.similarity, shared.entities
+        else:
+            corpus, search_index, facets = get_corpus(version), get_search_index(version), get_facets(version)
+            publications, similarity = get_publication_index(version), get_similarity_index(version)
+            entities = get_entities(version)
+        show_paper_explorer(corpus, aggs, search_index, facets, publications, similarity, entities,
+                            version, parquet_path)
     
     # Data Summary
     elif section == "📋 Data Summary":
-        show_data_summary(df)
+        pending = show_data_summary(profile, version, parquet_path)
+    
+    if METRICS_ENABLED:
+        show_metrics_panel()
+    
+    # A chart or profile still being computed in the background shows up once it is ready
+    if pending is not None:
+        rerun_when_done(pending)
 
-def show_dashboard(df):
+@instrument('app.dashboard')
+def show_dashboard(aggs, version):
     """Dashboard with overview metrics"""
     st.markdown('<h2 class="section-header">📊 Dashboard Overview</h2>', unsafe_allow_html=True)
     
@@ -95,17 +334,16 @@ def show_dashboard(df):
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("Total Papers", f"{len(df):,}")
+        st.metric("Total Papers", f"{aggs['total_papers']:,}")
     
     with col2:
-        st.metric("Time Span", f"{int(df['year'].min())}-{int(df['year'].max())}")
+        st.metric("Time Span", f"{aggs['year_min']}-{aggs['year_max']}")
     
     with col3:
-        st.metric("Unique Journals", f"{df['journal'].nunique():,}")
+        st.metric("Unique Journals", f"{aggs['unique_journals']:,}")
     
     with col4:
-        avg_abstract = df['abstract_word_count'].mean()
-        st.metric("Avg Abstract Words", f"{avg_abstract:.0f}")
+        st.metric("Avg Abstract Words", f"{aggs['abstract_mean']:.0f}")
     
     st.write("---")
     
@@ -114,32 +352,25 @@ def show_dashboard(df):
     
     with col1:
         st.subheader("Publications by Year")
-        yearly_counts = df['year'].value_counts().sort_index()
-        fig, ax = plt.subplots(figsize=(10, 6))
-        yearly_counts.plot(kind='bar', ax=ax, color='lightblue', edgecolor='black')
-        ax.set_xlabel('Year')
-        ax.set_ylabel('Number of Papers')
-        plt.xticks(rotation=45)
-        st.pyplot(fig)
+        # Native (vector) chart: only the counts are sent to the browser
+        st.bar_chart(year_frame(aggs['year_counts']), x='Year', y='Number of Papers')
     
     with col2:
         st.subheader("Top 10 Journals")
-        top_journals = df['journal'].value_counts().head(10)
-        fig, ax = plt.subplots(figsize=(10, 6))
-        ax.pie(top_journals.values, labels=top_journals.index, autopct='%1.1f%%')
-        st.pyplot(fig)
+        key = ('journal_pie', 10)
+        show_figure((version,) + key, *FIRST_PAGE_FIGURES[key](aggs))
     
     # Recent publications sample
     st.subheader("Recent Publications Sample")
-    recent_papers = df.nlargest(5, 'publish_time')[['title', 'journal', 'publish_time']]
-    st.dataframe(recent_papers)
+    st.dataframe(aggs['recent_papers'])
 
-def show_publication_trends(df):
+@instrument('app.trends')
+def show_publication_trends(aggs, version):
     """Publication trends analysis"""
     st.markdown('<h2 class="section-header">📈 Publication Trends</h2>', unsafe_allow_html=True)
     
     # Year range selector
-    min_year, max_year = int(df['year'].min()), int(df['year'].max())
+    min_year, max_year = aggs['year_min'], aggs['year_max']
     year_range = st.slider(
         "Select year range:",
         min_value=min_year,
@@ -147,87 +378,111 @@ def show_publication_trends(df):
         value=(min_year, max_year)
     )
     
-    # Filter data
-    filtered_df = df[(df['year'] >= year_range[0]) & (df['year'] <= year_range[1])]
-    
-    # Charts
+    # Charts (answered from the aggregates and the publication date index, no row scan)
     col1, col2 = st.columns(2)
     
     with col1:
-        st.subheader("Yearly Publication Trend")
-        yearly_counts = filtered_df['year'].value_counts().sort_index()
-        fig, ax = plt.subplots(figsize=(10, 6))
-        yearly_counts.plot(kind='line', marker='o', ax=ax, linewidth=2)
-        ax.set_xlabel('Year')
-        ax.set_ylabel('Number of Papers')
-        ax.grid(True, alpha=0.3)
-        st.pyplot(fig)
+        st.subheader("Publication Trend")
+        granularity = st.selectbox("Papers per:", list(GRANULARITIES), index=list(GRANULARITIES).index('year'))
+        counts = cached_query(('period_counts', version, year_range, granularity),
+                              lambda: year_range_counts(aggs, *year_range, granularity))
+        st.line_chart(period_frame(counts, granularity), x=granularity.title(), y='Number of Papers')
     
     with col2:
         st.subheader("Abstract Length Distribution")
-        fig, ax = plt.subplots(figsize=(10, 6))
-        ax.hist(filtered_df['abstract_word_count'], bins=50, alpha=0.7, edgecolor='black')
-        ax.set_xlabel('Word Count')
-        ax.set_ylabel('Frequency')
-        st.pyplot(fig)
+        histogram = pd.DataFrame({'Word Count': aggs['abstract_bin_edges'][:-1],
+                                  'Frequency': cached_query(('abstract_histogram', version, year_range),
+                                                            lambda: year_range_abstract_histogram(aggs, *year_range))})
+        st.bar_chart(histogram, x='Word Count', y='Frequency')
     
     # Word cloud
     st.subheader("Word Cloud of Paper Titles")
     if st.checkbox("Generate Word Cloud"):
-        all_titles = ' '.join(filtered_df['title'].dropna().astype(str))
-        wordcloud = WordCloud(width=800, height=400, background_color='white').generate(all_titles)
-        fig, ax = plt.subplots(figsize=(12, 6))
-        ax.imshow(wordcloud, interpolation='bilinear')
-        ax.axis('off')
-        st.pyplot(fig)
-
-def show_journal_analysis(df):
-    """Journal-specific analysis"""
+        max_words = st.slider("Maximum words:", 50, 300, 200, step=50)
+        terms_by_year = aggs['title_terms_by_year']
+        # Per-year title word counts summed over the selected range, no re-tokenizing.
+        # Rendered in a background thread and cached per (year range, max words); the
+        # rest of the page has already been sent while it renders.
+        future = get_figure_cache().submit(
+            (version, 'wordcloud', year_range, max_words),
+            lambda: wordcloud_png(terms_by_year.select(start=year_range[0], end=year_range[1]), max_words))
+        if not future.done():
+            st.info("Rendering word cloud...")
+            return future
+        st.image(future.result(), use_column_width=True)
+
+@instrument('app.journals')
+def show_journal_analysis(corpus, entities, version):
+    """Journal-specific analysis, from the normalized journal and author tables (no row scan)"""
     st.markdown('<h2 class="section-header">🏆 Journal Analysis</h2>', unsafe_allow_html=True)
     
-    # Top journals selector
+    # Top journals selector (journal ids are numbered by size, so these are the first rows)
     top_n = st.slider("Number of top journals to show:", 5, 20, 10)
-    top_journals = df['journal'].value_counts().head(top_n)
+    journals = cached_query(('journal_table', version, top_n), lambda: entities.journal_table(top_n))
+    top_journals = journals['papers']
     
     col1, col2 = st.columns(2)
     
     with col1:
         st.subheader(f"Top {top_n} Journals")
-        fig, ax = plt.subplots(figsize=(10, 8))
-        top_journals.plot(kind='barh', ax=ax)
-        ax.set_xlabel('Number of Papers')
-        st.pyplot(fig)
+        def draw(ax):
+            top_journals.plot(kind='barh', ax=ax)
+            ax.set_xlabel('Number of Papers')
+        show_figure((version, 'journal_bar', top_n), draw, (10, 8))
     
     with col2:
         st.subheader("Journal Distribution")
-        fig, ax = plt.subplots(figsize=(10, 8))
-        ax.pie(top_journals.values, labels=top_journals.index, autopct='%1.1f%%')
-        st.pyplot(fig)
+        show_figure((version, 'journal_share', top_n), draw_pie(top_journals), (10, 8))
     
     # Journal details
-    selected_journal = st.selectbox("Select a journal for details:", top_journals.index)
-    journal_papers = df[df['journal'] == selected_journal]
+    selected_journal = st.selectbox("Select a journal for details:", journals.index)
+    journal = journals.index.get_loc(selected_journal)
+    details = journals.iloc[journal]
     
     st.subheader(f"Details for {selected_journal}")
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        st.metric("Total Papers", len(journal_papers))
+        st.metric("Total Papers", int(details['papers']))
     
     with col2:
-        st.metric("Years Active", 
-                 f"{int(journal_papers['year'].min())}-{int(journal_papers['year'].max())}")
+        years_active = (f"{int(details['first_year'])}-{int(details['last_year'])}"
+                        if pd.notna(details['first_year']) else "Unknown")
+        st.metric("Years Active", years_active)
     
     with col3:
-        avg_words = journal_papers['abstract_word_count'].mean()
-        st.metric("Avg Abstract Words", f"{avg_words:.0f}")
+        st.metric("Avg Abstract Words", f"{details['abstract_mean']:.0f}")
     
     # Sample papers from selected journal
+    papers = entities.journal_papers_of(journal)
     st.subheader("Sample Papers")
-    sample_papers = journal_papers[['title', 'publish_time', 'authors']].head(5)
-    st.dataframe(sample_papers)
+    st.dataframe(corpus.take(papers[:5], ['title', 'publish_time', 'authors']))
+    
+    # Authors of the journal's papers, counted over the paper-author edges
+    st.subheader("Top Authors")
+    top_authors = cached_query(('journal_authors', version, journal), lambda: entities.top_authors(papers, n=10))
+    if len(top_authors) == 0:
+        st.info("No author information for this journal.")
+        return
+    st.dataframe(top_authors)
+    
+    selected_author = st.selectbox("Select an author for details:", top_authors.index)
+    author = entities.author_id(selected_author)
+    author_papers = entities.papers_by_author(author)
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.metric("Papers (all journals)", len(author_papers))
+        st.write("**Frequent co-authors:**")
+        coauthors = cached_query(('coauthors', version, author), lambda: entities.coauthors(author, n=10))
+        st.dataframe(coauthors.rename('shared papers'))
+    
+    with col2:
+        st.write("**Papers:**")
+        st.dataframe(corpus.take(author_papers[:10], ['title', 'journal', 'year']), hide_index=True)
 
-def show_paper_explorer(df):
+@instrument('app.explorer')
+def show_paper_explorer(corpus, aggs, search_index, facets, publications, similarity, entities, version, parquet_path):
     """Interactive paper explorer"""
     st.markdown('<h2 class="section-header">🔍 Paper Explorer</h2>', unsafe_allow_html=True)
     
@@ -235,90 +490,128 @@ def show_paper_explorer(df):
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        search_term = st.text_input("Search in titles and abstracts:")
+        search_term = st.text_input("Search in titles and abstracts:",
+                                    help='All words must match; use "double quotes" for phrases')
     
     with col2:
         year_filter = st.selectbox("Filter by year:", 
-                                 ['All'] + sorted(df['year'].unique(), reverse=True))
+                                 ['All'] + sorted(facets['year'].values(), reverse=True))
     
     with col3:
         journal_filter = st.selectbox("Filter by journal:", 
-                                    ['All'] + df['journal'].value_counts().head(20).index.tolist())
-    
-    # Apply filters
-    filtered_df = df.copy()
+                                    ['All'] + aggs['journal_counts'].head(20).index.tolist())
     
-    if search_term:
-        mask = (filtered_df['title'].str.contains(search_term, case=False, na=False) | 
-                filtered_df['abstract'].str.contains(search_term, case=False, na=False))
-        filtered_df = filtered_df[mask]
-    
-    if year_filter != 'All':
-        filtered_df = filtered_df[filtered_df['year'] == year_filter]
+    first_day, last_day = publications.first_day, publications.last_day
+    date_range = ()
+    if first_day is not None:
+        date_range = st.date_input("Published between:", value=(first_day, last_day),
+                                   min_value=first_day, max_value=last_day)
     
-    if journal_filter != 'All':
-        filtered_df = filtered_df[filtered_df['journal'] == journal_filter]
+    # Apply filters as row positions, once per normalized query for all sessions
+    date_filter = None
+    if len(date_range) == 2 and tuple(date_range) != (first_day.date(), last_day.date()):
+        date_filter = tuple(date_range)
+    key = ('papers', version, query_key(search_term) if search_term else None, year_filter, journal_filter, date_filter)
+    positions = cached_query(key, lambda: find_papers(corpus, search_index, facets, publications, search_term,
+                                                      year_filter, journal_filter, date_filter))
+    total_found = len(corpus) if positions is None else len(positions)
     
-    st.write(f"**Found {len(filtered_df):,} papers matching your criteria**")
+    st.write(f"**Found {total_found:,} papers matching your criteria**")
     
     # Results display
-    if len(filtered_df) > 0:
+    if total_found > 0:
         papers_per_page = st.slider("Papers per page:", 5, 50, 10)
         
         # Pagination
-        total_pages = (len(filtered_df) // papers_per_page) + 1
+        total_pages = -(-total_found // papers_per_page)
         page = st.number_input("Page", min_value=1, max_value=total_pages, value=1)
         
         start_idx = (page - 1) * papers_per_page
         end_idx = start_idx + papers_per_page
         
-        for idx, (_, paper) in enumerate(filtered_df.iloc[start_idx:end_idx].iterrows()):
-            with st.expander(f"{paper['title']}"):
-                st.write(f"**Journal:** {paper['journal']}")
-                st.write(f"**Published:** {paper['publish_time'].strftime('%Y-%m-%d')}")
-                st.write(f"**Authors:** {paper['authors'][:200]}...")
-                st.write(f"**Abstract:** {paper['abstract'][:500]}...")
+        # Only the rows of the current page are materialized (and their abstracts read)
+        if positions is None:
+            page_positions = np.arange(start_idx, min(end_idx, total_found))
+        else:
+            page_positions = positions[start_idx:end_idx]
+        page_df = corpus.take(page_positions)
+        
+        for position, paper in zip(page_positions, page_df.itertuples(index=False)):
+            with st.expander(f"{paper.title}"):
+                published = paper.publish_time.strftime('%Y-%m-%d') if pd.notna(paper.publish_time) else "Unknown"
+                st.write(f"**Journal:** {paper.journal}")
+                st.write(f"**Published:** {published}")
+                st.write(f"**Authors:** {format_authors(entities.author_list(position))}")
+                st.write(f"**Abstract:** {paper.abstract[:500]}...")
+                
+                # Nearest neighbours of the paper's embedding (approximate, a few lists scanned)
+                if st.checkbox("Papers like this", key=f"similar_{position}"):
+                    similar, scores = similarity.similar(position, k=SIMILAR_PAPERS)
+                    if len(similar):
+                        similar_df = corpus.take(similar, ['title', 'journal', 'year'])
+                        similar_df['similarity'] = scores
+                        st.dataframe(similar_df, hide_index=True)
+                    else:
+                        st.info("No similar papers found.")
+        
+        # Export the whole result set (in row order), not just this page
+        if positions is not None:
+            with st.expander("Export these results"):
+                show_export(version, parquet_path, np.sort(positions), key='explorer_export')
     else:
         st.info("No papers found matching your criteria.")
 
-def show_data_summary(df):
-    """Data summary and statistics"""
+@instrument('app.summary')
+def show_data_summary(profile, version, parquet_path):
+    """Data summary and statistics, from the dataset profile (a future; computed in the background)"""
     st.markdown('<h2 class="section-header">📋 Data Summary</h2>', unsafe_allow_html=True)
     
     col1, col2 = st.columns(2)
     
+    with col1:
+        st.subheader("Sample Data")
+        st.dataframe(next(iter_batches(parquet_path, batch_rows=10)).to_pandas())
+    
+    with col2:
+        # Download cleaned data (written in chunks on request, cached per dataset version)
+        st.subheader("Download Data")
+        show_export(version, parquet_path, columns=export_columns(parquet_path))
+    
+    # The rest of the page is shown while the profile is computed
+    if not profile.done():
+        st.info("Computing dataset profile…")
+        return profile
+    if profile.exception() is not None:
+        get_profile.clear()  # the failed build is not kept: the next run submits it again
+        st.error(f"The dataset profile could not be computed: {profile.exception()}")
+        return None
+    profile = profile.result()
+    columns = profile['columns']
+    
+    col1, col2 = st.columns(2)
+    
     with col1:
         st.subheader("Dataset Information")
-        st.write(f"**Shape:** {df.shape[0]:,} rows × {df.shape[1]} columns")
-        st.write(f"**Time period:** {df['publish_time'].min().strftime('%Y-%m-%d')} to {df['publish_time'].max().strftime('%Y-%m-%d')}")
-        st.write(f"**Unique journals:** {df['journal'].nunique():,}")
+        st.write(f"**Shape:** {profile['rows']:,} rows × {len(columns)} columns")
+        first, last = columns.loc['publish_time', ['min', 'max']]
+        if pd.notna(first):
+            st.write(f"**Time period:** {first.strftime('%Y-%m-%d')} to {last.strftime('%Y-%m-%d')}")
+        st.write(f"**Unique journals:** {columns.loc['journal', 'cardinality']:,}")
         
         st.subheader("Column Information")
         col_info = pd.DataFrame({
-            'Column': df.columns,
-            'Non-Null': df.notnull().sum(),
-            'Null': df.isnull().sum(),
-            'Data Type': df.dtypes
+            'Column': columns.index,
+            'Non-Null': columns['non_null'],
+            'Null': columns['null'],
+            'Distinct': columns['cardinality'],
+            'Data Type': columns['dtype']
         })
         st.dataframe(col_info)
     
     with col2:
-        st.subheader("Sample Data")
-        st.dataframe(df.head(10))
-        
         st.subheader("Basic Statistics")
         st.write("Abstract word count:")
-        st.write(df['abstract_word_count'].describe())
-        
-        # Download cleaned data
-        st.subheader("Download Data")
-        csv = df.to_csv(index=False)
-        st.download_button(
-            label="Download cleaned data as CSV",
-            data=csv,
-            file_name="cord19_cleaned.csv",
-            mime="text/csv"
-        )
+        st.write(describe(profile, 'abstract_word_count'))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
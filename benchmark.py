@@ -0,0 +1,243 @@
+# benchmark.py - Timing and memory benchmarks for load -> clean -> analyze -> render
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import contextlib
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+from cleaning import read_metadata, clean_chunk, first_publish_time
+from dataset import write_parquet, load_cleaned
+from aggregates import compute_aggregates, AGGREGATE_COLUMNS
+from search_index import InvertedIndex
+from term_frequency import count_terms_by
+from dedup import DuplicateIndex
+from similarity import SimilarityIndex
+from entities import EntityTables, ENTITY_COLUMNS
+from partitions import write_partitions
+
+DEFAULT_SIZES = [100_000]
+DEFAULT_OUTPUT = 'benchmark_results.json'
+DEFAULT_THRESHOLD = 0.20  # 20% slower than the baseline counts as a regression
+
+WORDS = ('covid sars cov coronavirus pandemic patients clinical the of and in study virus infection '
+         'respiratory vaccine model analysis data outbreak transmission severe acute syndrome '
+         'cases hospital mortality risk treatment immune response protein cell antibody testing '
+         'public health china wuhan lockdown mask children ventilation trial cohort review').split()
+SOURCES = ['PMC', 'Medline', 'WHO', 'Elsevier', 'MedRxiv', 'ArXiv']
+JOURNALS = ['PLoS One', 'BMJ', 'Lancet', 'Nature', 'Cell', 'Virology Journal', 'J Virol',
+            'Sci Rep', 'Emerg Infect Dis', 'Viruses'] + [f'Journal {i}' for i in range(190)]
+SEARCH_QUERIES = ['covid', 'vaccine trial', 'respiratory syndrome', '"public health"', 'antibody response cell']
+
+# Distinct titles/abstracts generated, then sampled; keeps generation fast at millions of rows
+TEXT_POOL_SIZE = 20_000
+
+
+def _texts(rng, n, min_words, max_words):
+    lengths = rng.integers(min_words, max_words, n)
+    words = np.array(WORDS)
+    return np.array([' '.join(words[rng.integers(0, len(words), k)]) for k in lengths], dtype=object)
+
+
+def make_synthetic_metadata(n_rows, seed=0):
+    """A metadata.csv-shaped frame with realistic missing values and mixed date formats"""
+    rng = np.random.default_rng(seed)
+    titles = _texts(rng, TEXT_POOL_SIZE, 3, 20)[rng.integers(0, TEXT_POOL_SIZE, n_rows)]
+    abstracts = _texts(rng, TEXT_POOL_SIZE, 50, 300)[rng.integers(0, TEXT_POOL_SIZE, n_rows)]
+
+    days = np.datetime64('2000-01-01') + rng.integers(0, 8400, n_rows).astype('timedelta64[D]')
+    publish_time = np.datetime_as_string(days, unit='D').astype(object)
+    year_only = rng.random(n_rows) < 0.05
+    publish_time[year_only] = np.datetime_as_string(days[year_only], unit='Y').astype(object)
+
+    journal_weights = 1 / np.arange(1, len(JOURNALS) + 1)
+    journals = np.array(JOURNALS, dtype=object)[rng.choice(len(JOURNALS), n_rows, p=journal_weights / journal_weights.sum())]
+
+    df = pd.DataFrame({
+        'cord_uid': [f'{i:08x}' for i in range(n_rows)],
+        'sha': None,
+        'source_x': np.array(SOURCES, dtype=object)[rng.integers(0, len(SOURCES), n_rows)],
+        'title': titles,
+        'doi': [f'10.1000/{i}' for i in range(n_rows)],
+        'pmcid': None,
+        'pubmed_id': rng.integers(10_000_000, 40_000_000, n_rows).astype(str),
+        'license': 'cc-by',
+        'abstract': abstracts,
+        'publish_time': publish_time,
+        'authors': 'Smith, J.; Doe, A.; Lee, K.',
+        'journal': journals,
+        'mag_id': None,
+        'who_covidence_id': None,
+        'arxiv_id': None,
+        'pdf_json_files': None,
+        'pmc_json_files': None,
+        'url': 'https://example.org',
+        's2_id': None,
+    })
+    # Missing values in roughly the proportions of the real dataset
+    for col, share in (('title', 0.01), ('abstract', 0.2), ('journal', 0.07), ('authors', 0.03), ('publish_time', 0.01)):
+        df.loc[rng.random(n_rows) < share, col] = None
+    return df
+
+
+class StageTimer:
+    """Runs stages and records either their time or their peak allocation (tracemalloc).
+
+    tracemalloc slows code down several times, so timing and memory are measured
+    in separate passes.
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.results = {}
+
+    def run(self, name, func, *args, **kwargs):
+        if self.trace_memory:
+            tracemalloc.start()
+            value = func(*args, **kwargs)
+            self.results[name] = {'peak_mb': round(tracemalloc.get_traced_memory()[1] / 1e6, 1)}
+            tracemalloc.stop()
+        else:
+            start = time.perf_counter()
+            value = func(*args, **kwargs)
+            self.results[name] = {'seconds': round(time.perf_counter() - start, 4)}
+        return value
+
+
+def _search(index, documents):
+    return [index.search(query, documents) for query in SEARCH_QUERIES]
+
+
+def _analyze_partitions(directory):
+    from part3_analysis import analyze_partitioned
+    with contextlib.redirect_stdout(io.StringIO()):
+        return analyze_partitioned(directory)
+
+
+def _render(aggregates):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    images = []
+    year_counts = aggregates['year_counts']
+    top_journals = aggregates['journal_counts'].head(10)
+    for draw in (lambda ax: ax.bar(year_counts.index, year_counts.values),
+                 lambda ax: ax.barh(range(len(top_journals)), top_journals.values),
+                 lambda ax: ax.pie(top_journals.values, labels=top_journals.index)):
+        fig, ax = plt.subplots(figsize=(10, 6))
+        draw(ax)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', dpi=100)
+        plt.close(fig)
+        images.append(buffer.getvalue())
+    return images
+
+
+def run_stages(timer, raw_path, parquet_path):
+    """Every pipeline stage, in order, on the synthetic file at raw_path"""
+    import part3_analysis  # imported up front: loading pyplot is not part of any stage's time
+    raw = timer.run('load', read_metadata, raw_path)
+    cleaned = timer.run('clean', lambda: clean_chunk(raw, date_anchor=first_publish_time(raw)))
+    del raw
+    timer.run('write_parquet', write_parquet, cleaned, parquet_path)
+    del cleaned
+    df = timer.run('load_cleaned', load_cleaned, None, parquet_path)
+    timer.run('deduplicate', lambda: DuplicateIndex.build(df).clusters())
+    aggregates = timer.run('aggregate', compute_aggregates, df[AGGREGATE_COLUMNS])
+    index = timer.run('search_index', InvertedIndex.build, df[['title', 'abstract']])
+    timer.run('search_queries', _search, index, df)
+    timer.run('similarity_index', SimilarityIndex.build, df[['paper_id', 'title', 'abstract']])
+    timer.run('entities', EntityTables.build, df[ENTITY_COLUMNS])
+    timer.run('word_frequency', count_terms_by, df['title'], df['year'])
+    partitioned = os.path.join(os.path.dirname(parquet_path), 'partitioned')
+    timer.run('partition', write_partitions, 'benchmark', parquet_path, partitioned)
+    timer.run('out_of_core', _analyze_partitions, partitioned)
+    timer.run('render', _render, aggregates)
+    return timer.results
+
+
+def benchmark_size(n_rows, workdir, trace_memory=True, seed=0):
+    """Run every stage on n_rows synthetic papers; returns {stage: {seconds, peak_mb}}"""
+    print(f"\n{n_rows:,} rows")
+    raw_path = os.path.join(workdir, 'metadata.csv')
+    parquet_path = os.path.join(workdir, 'cleaned_metadata.parquet')
+    make_synthetic_metadata(n_rows, seed).to_csv(raw_path, index=False)
+
+    results = run_stages(StageTimer(), raw_path, parquet_path)
+    if trace_memory:
+        for stage, measured in run_stages(StageTimer(trace_memory=True), raw_path, parquet_path).items():
+            results[stage].update(measured)
+
+    for stage, measured in results.items():
+        peak = f"  peak {measured['peak_mb']:8.1f} MB" if 'peak_mb' in measured else ""
+        print(f"  {stage:<16} {measured['seconds']:8.3f}s{peak}")
+    return results
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Stages that got slower than the baseline by more than threshold"""
+    regressions = []
+    for size, stages in results['results'].items():
+        for stage, measured in stages.items():
+            reference = baseline.get('results', {}).get(size, {}).get(stage)
+            if reference and reference['seconds'] > 0:
+                change = measured['seconds'] / reference['seconds'] - 1
+                if change > threshold:
+                    regressions.append((size, stage, reference['seconds'], measured['seconds'], change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the CORD-19 pipeline on synthetic data")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="numbers of rows to benchmark, e.g. 100000 1000000 5000000")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="where to write the JSON results")
+    parser.add_argument('--baseline', help="earlier results file to compare against")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown before a stage counts as a regression (0.2 = 20%%)")
+    parser.add_argument('--no-memory', action='store_true',
+                        help="skip the tracemalloc pass that measures peak memory per stage")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    print("=== CORD-19 PIPELINE BENCHMARK ===")
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'memory_traced': not args.no_memory,
+        },
+        'results': {},
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for n_rows in args.sizes:
+            results['results'][str(n_rows)] = benchmark_size(n_rows, workdir, not args.no_memory, args.seed)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✅ Results saved to '{args.output}'")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for size, stage, before, after, change in regressions:
+            print(f"❌ {size} rows / {stage}: {before:.3f}s -> {after:.3f}s (+{change:.0%})")
+        if regressions:
+            return 1
+        print(f"✅ No stage slower than the baseline by more than {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
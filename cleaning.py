@@ -0,0 +1,192 @@
+# cleaning.py - Shared cleaning steps and the streaming (low memory) cleaning mode
+import os
+import sys
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+RAW_PATH = 'data/metadata.csv'
+CLEANED_CSV_PATH = 'data/cleaned_metadata.csv'
+CLEANED_PARQUET_PATH = 'data/cleaned_metadata.parquet'
+
+# Rows per chunk in streaming mode. Peak memory depends on this, not on the file size.
+DEFAULT_CHUNKSIZE = 50_000
+
+# Identifier columns are read as text so every row keeps its exact value
+# (e.g. pubmed_id 32109013 instead of 32109013.0) no matter how the file is split up.
+ID_COLUMNS = ['sha', 'pmcid', 'pubmed_id', 'mag_id', 'who_covidence_id', 'arxiv_id', 's2_id']
+
+# Processes used for the derived columns (1 = serial). Results are identical either way.
+DEFAULT_WORKERS = int(os.environ.get('CORD19_CLEANING_WORKERS', '1'))
+
+# Below this many rows a chunk is processed serially; the handoff would cost more than it saves
+MIN_PARALLEL_ROWS = 20_000
+
+
+def read_metadata(path=RAW_PATH, chunksize=None):
+    """Read metadata.csv, either whole or as an iterator of chunks"""
+    return pd.read_csv(path, dtype={col: str for col in ID_COLUMNS}, chunksize=chunksize)
+
+
+def first_publish_time(df):
+    """First non-null publish_time value, used to pin down the date format"""
+    values = df['publish_time'].dropna()
+    return values.iloc[0] if len(values) > 0 else None
+
+
+def parse_publish_time(values, date_anchor=None):
+    """Convert publish_time to datetime exactly like a single pass over the full file would.
+
+    pandas infers the date format from the first non-null value it sees, so a chunk
+    starting with '2020' would parse differently from one starting with '2020-03-12'.
+    Putting the file's first value (the anchor) in front of every chunk keeps the
+    inferred format the same for all chunks.
+    """
+    if date_anchor is None:
+        return pd.to_datetime(values, errors='coerce')
+    anchored = pd.concat([pd.Series([date_anchor]), values.reset_index(drop=True)], ignore_index=True)
+    parsed = pd.to_datetime(anchored, errors='coerce').iloc[1:]
+    parsed.index = values.index
+    return parsed
+
+
+def count_words(texts):
+    """Number of whitespace-separated words in each text, without building the word lists"""
+    return texts.str.count(r'\S+')
+
+
+def derive_features(publish_time, title, abstract, date_anchor=None):
+    """Derived columns for a slice of rows: parsed date, year and word counts.
+
+    Every row is handled independently, so slices can be processed in any order
+    (or in other processes) and concatenated.
+    """
+    parsed = parse_publish_time(publish_time, date_anchor)
+    return pd.DataFrame({
+        'publish_time': parsed,
+        # year is always float so rows with and without a date are written the same way
+        'year': parsed.dt.year.astype('float64'),
+        'abstract_word_count': count_words(abstract).fillna(0),
+        'title_word_count': count_words(title),
+    }, index=publish_time.index)
+
+
+class FeatureExtractor:
+    """Computes the derived columns, serially or spread over a process pool.
+
+    Only the three source columns of each slice are sent to a worker, and the
+    results come back as compact numeric columns. Slices are contiguous and
+    reassembled in order, so the output is identical to the serial path.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS):
+        self.workers = max(1, workers)
+        self.executor = ProcessPoolExecutor(self.workers) if self.workers > 1 else None
+
+    def __call__(self, chunk, date_anchor=None):
+        columns = (chunk['publish_time'], chunk['title'], chunk['abstract'])
+        if self.executor is None or len(chunk) < MIN_PARALLEL_ROWS:
+            return derive_features(*columns, date_anchor)
+
+        bounds = np.linspace(0, len(chunk), self.workers + 1).astype(int)
+        futures = [
+            self.executor.submit(derive_features, *(col.iloc[start:end] for col in columns), date_anchor)
+            for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+        return pd.concat([future.result() for future in futures])
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def clean_chunk(chunk, date_anchor=None, first_paper_id=1, extractor=None):
+    """Apply the part 2 cleaning steps to one chunk (or to the whole dataset).
+
+    extractor is an optional FeatureExtractor for computing the derived columns in parallel.
+    """
+    # Drop rows without titles
+    chunk = chunk[chunk['title'].notna()].copy()
+
+    # Fill missing abstracts, authors and journals
+    chunk['abstract'] = chunk['abstract'].fillna('No abstract available')
+    chunk['authors'] = chunk['authors'].fillna('Unknown authors')
+    chunk['journal'] = chunk['journal'].fillna('Unknown Journal')
+
+    # Convert publish_time to datetime, extract the year and count words
+    if extractor is None:
+        features = derive_features(chunk['publish_time'], chunk['title'], chunk['abstract'], date_anchor)
+    else:
+        features = extractor(chunk, date_anchor)
+    for col in features.columns:
+        chunk[col] = features[col]
+
+    # Create a paper ID if not exists
+    if 'paper_id' not in chunk.columns:
+        chunk['paper_id'] = range(first_paper_id, first_paper_id + len(chunk))
+
+    return chunk
+
+
+def clean_csv_streaming(input_path=RAW_PATH, output_path=CLEANED_CSV_PATH, chunksize=DEFAULT_CHUNKSIZE,
+                        parquet_path=CLEANED_PARQUET_PATH, workers=DEFAULT_WORKERS):
+    """Clean metadata.csv chunk by chunk, appending each cleaned chunk to the output files.
+
+    output_path is the CSV export and parquet_path the typed columnar file; pass None
+    to skip either one. workers > 1 computes the derived columns in a process pool.
+    Duplicate detection needs every row, so chunks are hashed as they go by (their
+    signatures spilled to side files next to the output) and the cluster columns are
+    added to the files at the end.
+    """
+    from dataset import ParquetChunkWriter
+    from dedup import DuplicateSpill, rewrite_with_clusters, report
+
+    parquet_writer = ParquetChunkWriter(parquet_path) if parquet_path else None
+    extractor = FeatureExtractor(workers)
+    rows_in = 0
+    rows_out = 0
+    date_anchor = None
+
+    with DuplicateSpill(parquet_path or output_path) as duplicates:
+        try:
+            for chunk in read_metadata(input_path, chunksize=chunksize):
+                if date_anchor is None:
+                    date_anchor = first_publish_time(chunk)
+
+                cleaned = clean_chunk(chunk, date_anchor=date_anchor, first_paper_id=rows_out + 1,
+                                      extractor=extractor)
+                duplicates.append(cleaned, workers)
+                if output_path:
+                    cleaned.to_csv(output_path, mode='w' if rows_in == 0 else 'a', header=rows_in == 0,
+                                   index=False)
+                if parquet_writer is not None:
+                    parquet_writer.write(cleaned)
+
+                rows_in += len(chunk)
+                rows_out += len(cleaned)
+                print(f"  Cleaned {rows_in:,} rows so far...")
+        finally:
+            extractor.close()
+            if parquet_writer is not None:
+                parquet_writer.close()
+
+        print(f"Removed {rows_in - rows_out} rows without titles")
+        clusters = duplicates.clusters()
+    rewrite_with_clusters(clusters, parquet_path, output_path, chunksize)
+    report(clusters)
+    for path in (output_path, parquet_path):
+        if path:
+            print(f"✅ Cleaned dataset saved to '{path}' ({rows_out:,} rows)")
+    return rows_out
+
+if __name__ == "__main__":
+    print("=== PART 2 (STREAMING MODE): DATA CLEANING AND PREPARATION ===\n")
+    chunksize = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_CHUNKSIZE
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_WORKERS
+    clean_csv_streaming(chunksize=chunksize, workers=workers)
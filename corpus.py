@@ -0,0 +1,199 @@
+# corpus.py - Compact in-memory corpus for the app: encoded text, nulls for placeholders, lazy abstracts
+import os
+import sys
+import json
+import mmap
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from dataset import load_cleaned, dataset_version
+from metrics import instrument
+
+ABSTRACTS_PATH = 'data/abstracts.bin'
+ABSTRACT_OFFSETS_PATH = 'data/abstracts.offsets.npy'
+ABSTRACTS_META_PATH = 'data/abstracts.json'
+
+# Columns held in memory; abstracts stay in the side file until a paper is shown
+CORPUS_COLUMNS = ['title', 'authors', 'journal', 'publish_time', 'year']
+
+# Placeholders written by the cleaning step. The store holds nulls instead and puts
+# the placeholder back only for the rows handed out.
+PLACEHOLDERS = {
+    'abstract': 'No abstract available',
+    'authors': 'Unknown authors',
+    'journal': 'Unknown Journal',
+}
+
+# Text columns are dictionary-encoded (category) when at most this share of values is distinct
+MAX_DICTIONARY_RATIO = 0.5
+
+# Abstracts encoded at a time while writing the side file
+BUILD_BATCH_SIZE = 50_000
+
+
+def encode_text(values):
+    """Category for repetitive text, Arrow-backed strings otherwise"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.remove_unused_categories()
+    if values.nunique() <= MAX_DICTIONARY_RATIO * len(values):
+        return values.astype('category')
+    return values.astype('string[pyarrow]')
+
+
+def to_compact(df):
+    """Compact copy of a cleaned frame: placeholders -> nulls, encoded text, downcast numbers"""
+    compact = {}
+    for col in df.columns:
+        values = df[col]
+        placeholder = PLACEHOLDERS.get(col)
+        if placeholder is not None:
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                if placeholder in values.cat.categories:
+                    values = values.cat.remove_categories([placeholder])
+            else:
+                values = values.where(values != placeholder)
+        if pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values) \
+                or isinstance(values.dtype, pd.CategoricalDtype):
+            values = encode_text(values)
+        elif pd.api.types.is_integer_dtype(values) and not pd.api.types.is_extension_array_dtype(values):
+            values = pd.to_numeric(values, downcast='integer')
+        compact[col] = values
+    return pd.DataFrame(compact, index=df.index)
+
+
+def write_abstracts(abstracts, version, path=ABSTRACTS_PATH,
+                    offsets_path=ABSTRACT_OFFSETS_PATH, meta_path=ABSTRACTS_META_PATH):
+    """Write abstracts as one UTF-8 file plus row offsets; missing abstracts take no bytes.
+
+    Every file is written aside and renamed into place (the meta file last), so
+    processes mapping the old file keep reading it and concurrent writers never
+    interleave their bytes.
+    """
+    abstracts = abstracts.reset_index(drop=True)
+    offsets = np.zeros(len(abstracts) + 1, dtype=np.int64)
+    position = 0
+    suffix = f'.{os.getpid()}.tmp'
+    with open(path + suffix, 'wb') as f:
+        for start in range(0, len(abstracts), BUILD_BATCH_SIZE):
+            batch = abstracts.iloc[start:start + BUILD_BATCH_SIZE].astype(object)
+            batch = batch.where(batch.notna() & (batch != PLACEHOLDERS['abstract']), '')
+            encoded = [text.encode('utf-8') for text in batch]
+            lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+            offsets[start + 1:start + 1 + len(encoded)] = position + np.cumsum(lengths)
+            position += int(lengths.sum())
+            f.write(b''.join(encoded))
+    with open(offsets_path + suffix, 'wb') as f:
+        np.save(f, offsets)
+    with open(meta_path + suffix, 'w') as f:
+        json.dump({'version': version, 'rows': len(abstracts)}, f)
+    for target in (path, offsets_path, meta_path):
+        os.replace(target + suffix, target)
+
+
+class AbstractStore:
+    """Abstracts read from the memory-mapped side file, one row at a time"""
+
+    def __init__(self, path=ABSTRACTS_PATH, offsets_path=ABSTRACT_OFFSETS_PATH):
+        self.path = path
+        self.offsets = np.load(offsets_path, mmap_mode='r')
+        self._data = None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def _buffer(self):
+        if self._data is None:
+            with open(self.path, 'rb') as f:
+                # An empty file cannot be mapped (a corpus without any abstract)
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b''
+        return self._data
+
+    def get(self, position):
+        """Abstract of one row, or None when the paper has none"""
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        if start == end:
+            return None
+        return self._buffer()[start:end].decode('utf-8')
+
+    def take(self, positions):
+        return [self.get(position) for position in positions]
+
+
+def load_abstracts(version=None):
+    """AbstractStore for the current dataset version, writing the side file if needed"""
+    version = version or dataset_version()
+    meta = None
+    if os.path.exists(ABSTRACTS_META_PATH) and os.path.exists(ABSTRACT_OFFSETS_PATH):
+        with open(ABSTRACTS_META_PATH) as f:
+            meta = json.load(f)
+    if meta is None or meta['version'] != version:
+        write_abstracts(load_cleaned(['abstract'])['abstract'], version)
+    return AbstractStore()
+
+
+class CorpusStore:
+    """The cleaned corpus as the app serves it.
+
+    Text columns are dictionary-encoded or Arrow-backed, the cleaning placeholders
+    are nulls and abstracts are only read for the rows handed out by take().
+    Row positions are the same as in load_cleaned(), so search and facet positions apply.
+    """
+
+    def __init__(self, frame, abstracts):
+        self.frame = frame
+        self.abstracts = abstracts
+
+    def __len__(self):
+        return len(self.frame)
+
+    @property
+    def columns(self):
+        return list(self.frame.columns) + ['abstract']
+
+    def memory_usage(self):
+        """Bytes held in memory (the abstracts side file is not counted)"""
+        return int(self.frame.memory_usage(deep=True).sum() + self.abstracts.offsets.nbytes)
+
+    @instrument('corpus.take', rows=len)
+    def take(self, positions, columns=None):
+        """Plain frame of the given rows, abstracts loaded and placeholders restored"""
+        positions = np.asarray(positions, dtype=np.int64)
+        columns = columns or self.columns
+        rows = self.frame.take(positions)[[col for col in columns if col != 'abstract']]
+        for col in rows.columns:
+            # Arrow-backed columns (memory-mapped store, see shared_dataset.py) become plain ones
+            if isinstance(rows[col].dtype, pd.ArrowDtype):
+                values = pa.array(rows[col].array).to_pandas()
+                values.index = rows.index
+                rows[col] = values
+        if 'abstract' in columns:
+            rows['abstract'] = self.abstracts.take(positions)
+        for col, placeholder in PLACEHOLDERS.items():
+            if col in rows.columns:
+                rows[col] = rows[col].astype(object).where(rows[col].notna(), placeholder)
+        return rows[columns]
+
+
+def load_corpus(version=None, columns=CORPUS_COLUMNS):
+    """CorpusStore for the current dataset version"""
+    version = version or dataset_version()
+    return CorpusStore(to_compact(load_cleaned(columns)), load_abstracts(version))
+
+
+def memory_report(version=None):
+    """(bytes as a plain frame, bytes in the compact store) for the same columns"""
+    store = load_corpus(version)
+    full = load_cleaned(CORPUS_COLUMNS + ['abstract'])
+    return int(full.memory_usage(deep=True).sum()), store.memory_usage()
+
+
+if __name__ == "__main__":
+    if dataset_version() is None:
+        print("Cleaned dataset not found. Please run the data cleaning script first.")
+        sys.exit(1)
+    full_bytes, compact_bytes = memory_report()
+    print(f"Plain frame:   {full_bytes / 1e6:10.1f} MB")
+    print(f"Compact store: {compact_bytes / 1e6:10.1f} MB")
+    print(f"Saved:         {(full_bytes - compact_bytes) / 1e6:10.1f} MB "
+          f"({1 - compact_bytes / max(full_bytes, 1):.0%})")
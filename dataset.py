@@ -0,0 +1,173 @@
+# dataset.py - Typed, columnar storage for the cleaned dataset
+import os
+import time
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from cleaning import CLEANED_CSV_PATH, CLEANED_PARQUET_PATH, ID_COLUMNS
+from metrics import instrument
+
+# Columns that get a real type in the columnar file. Everything else is text.
+CATEGORY_COLUMNS = ['journal', 'source_x']
+TYPED_COLUMNS = {
+    'publish_time': pa.timestamp('ns'),
+    'year': pa.int16(),
+    'abstract_word_count': pa.int32(),
+    'title_word_count': pa.int16(),
+    'paper_id': pa.int64(),
+    'cluster_id': pa.int64(),
+    'canonical': pa.bool_(),
+    'deleted': pa.bool_(),
+}
+
+# Rows removed from the source by an incremental update are kept, marked in this column
+TOMBSTONE_COLUMN = 'deleted'
+
+# Directories of memory-mapped arrays hold one subdirectory per write; this file names the current one
+CURRENT_FILE = 'CURRENT'
+KEEP_WRITES = 2  # the previous write is kept, for readers that have just read the old name
+
+
+def to_typed(df):
+    """Convert a cleaned frame to compact, analysis-ready dtypes"""
+    df = df.copy()
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    if 'publish_time' in df.columns:
+        df['publish_time'] = pd.to_datetime(df['publish_time'], errors='coerce')
+    if 'year' in df.columns:
+        df['year'] = df['year'].astype('Int16')
+    if 'abstract_word_count' in df.columns:
+        df['abstract_word_count'] = df['abstract_word_count'].fillna(0).astype('int32')
+    if 'title_word_count' in df.columns:
+        df['title_word_count'] = df['title_word_count'].fillna(0).astype('int16')
+    return df
+
+
+def arrow_schema(columns):
+    """Fixed Arrow schema for the cleaned dataset, so every chunk is written the same way"""
+    fields = []
+    for col in columns:
+        if col in CATEGORY_COLUMNS:
+            fields.append(pa.field(col, pa.dictionary(pa.int32(), pa.string())))
+        else:
+            fields.append(pa.field(col, TYPED_COLUMNS.get(col, pa.string())))
+    return pa.schema(fields)
+
+
+def to_arrow(df, schema=None):
+    """Typed Arrow table for a cleaned frame"""
+    typed = to_typed(df)
+    return pa.Table.from_pandas(typed, schema=schema or arrow_schema(typed.columns), preserve_index=False)
+
+
+def write_parquet(df, path=CLEANED_PARQUET_PATH):
+    """Save a cleaned frame as a typed Parquet file"""
+    pq.write_table(to_arrow(df), path)
+
+
+class ParquetChunkWriter:
+    """Append cleaned chunks to one Parquet file (used by the streaming cleaning mode)"""
+
+    def __init__(self, path=CLEANED_PARQUET_PATH):
+        self.path = path
+        self.schema = None
+        self.writer = None
+
+    def write(self, chunk):
+        table = to_arrow(chunk, self.schema)
+        if self.writer is None:
+            # The first table's schema carries the pandas metadata (Int16 year, categories)
+            self.schema = table.schema
+            self.writer = pq.ParquetWriter(self.path, self.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def swap_directory(directory, write, keep=KEEP_WRITES):
+    """Write a new set of files into directory and switch readers to it in one rename.
+
+    write(path) fills a fresh subdirectory; CURRENT then names it. Readers see the
+    old files or the new ones, never a mix, and never a moment without either.
+    Processes mapping the files of a pruned write keep reading them.
+    """
+    os.makedirs(directory, exist_ok=True)
+    name = f'{time.time_ns():016x}-{os.getpid()}'
+    staging = os.path.join(directory, name + '.tmp')
+    os.makedirs(staging)
+    try:
+        write(staging)
+        os.replace(staging, os.path.join(directory, name))
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    pointer = os.path.join(directory, CURRENT_FILE)
+    with open(f'{pointer}.{os.getpid()}.tmp', 'w') as f:
+        f.write(name)
+    os.replace(f.name, pointer)
+
+    # Oldest first: names start with the time of the write. Loose files are left from the
+    # older, flat layout.
+    writes = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith('.tmp') or entry.name in (name, CURRENT_FILE):
+            continue
+        if entry.is_dir():
+            writes.append(entry.name)
+        else:
+            os.remove(entry.path)
+    for old in sorted(writes)[:max(0, len(writes) - (keep - 1))]:
+        shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
+
+
+def current_directory(directory):
+    """Subdirectory of directory named by CURRENT (see swap_directory).
+
+    Raises FileNotFoundError when nothing was written there yet, and ValueError
+    when directory holds files of the older, flat layout.
+    """
+    try:
+        with open(os.path.join(directory, CURRENT_FILE)) as f:
+            return os.path.join(directory, f.read().strip())
+    except FileNotFoundError:
+        if os.path.isdir(directory) and os.listdir(directory):
+            raise ValueError(f"'{directory}' was written in an older layout") from None
+        raise
+
+
+@instrument('dataset.load_cleaned', rows=len)
+def load_cleaned(columns=None, path=CLEANED_PARQUET_PATH, csv_path=CLEANED_CSV_PATH):
+    """Load the cleaned dataset, reading only the requested columns.
+
+    Uses the typed Parquet file when it exists and falls back to the CSV export.
+    Tombstoned rows (see incremental.py) are left out.
+    Raises FileNotFoundError when neither has been created yet.
+    """
+    if os.path.exists(path):
+        if TOMBSTONE_COLUMN not in pq.read_schema(path).names:
+            return pd.read_parquet(path, columns=list(columns) if columns else None)
+        df = pd.read_parquet(path, columns=list(columns) + [TOMBSTONE_COLUMN] if columns else None)
+        return df[~df[TOMBSTONE_COLUMN]].drop(columns=TOMBSTONE_COLUMN).reset_index(drop=True)
+    df = pd.read_csv(csv_path, usecols=list(columns) if columns else None,
+                     dtype={col: str for col in ID_COLUMNS})
+    return to_typed(df)
+
+
+def dataset_version(path=CLEANED_PARQUET_PATH, csv_path=CLEANED_CSV_PATH):
+    """Identify the current cleaned file by name, size and modification time.
+
+    Caches keyed by this string are invalidated whenever the cleaned dataset is rewritten.
+    Returns None when no cleaned dataset exists yet.
+    """
+    for candidate in (path, csv_path):
+        if os.path.exists(candidate):
+            stat = os.stat(candidate)
+            return f"{os.path.basename(candidate)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return None
@@ -0,0 +1,150 @@
+# dataset_profile.py - Per-column profile of a dataset file, computed once in the background and persisted
+import os
+import pickle
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+import pandas as pd
+import pyarrow.parquet as pq
+
+from cleaning import CLEANED_PARQUET_PATH, read_metadata
+from dataset import TOMBSTONE_COLUMN, dataset_version, load_cleaned
+
+# Bumped whenever the profile's contents change, so older files get rebuilt
+PROFILE_FORMAT = 1
+PROFILE_SUFFIX = '.profile.pkl'  # the profile of data/x.parquet is data/x.parquet.profile.pkl
+PROFILE_STATS = ['dtype', 'non_null', 'null', 'null_percent', 'cardinality',
+                 'min', 'max', 'mean', 'std', '25%', '50%', '75%']
+QUANTILES = [0.25, 0.5, 0.75]
+
+
+def profile_path(path):
+    """Where the profile of a dataset file is persisted: next to the file"""
+    return path + PROFILE_SUFFIX
+
+
+def profile_column(values):
+    """Profile statistics of one column (a Series)"""
+    non_null = int(values.notna().sum())
+    stats = {
+        'dtype': str(values.dtype),
+        'non_null': non_null,
+        'null': len(values) - non_null,
+        'null_percent': 100 * (len(values) - non_null) / len(values) if len(values) else 0.0,
+        'cardinality': int(values.nunique()),
+    }
+    # Min/max and quantiles only for numbers and dates; mean and std only for numbers
+    if pd.api.types.is_bool_dtype(values.dtype):
+        return stats
+    if pd.api.types.is_numeric_dtype(values.dtype) or pd.api.types.is_datetime64_any_dtype(values.dtype):
+        present = values.dropna()
+        if len(present):
+            stats['min'], stats['max'] = present.min(), present.max()
+            quantiles = present.quantile(QUANTILES)
+            stats.update({f'{q:.0%}': quantiles[q] for q in QUANTILES})
+            if pd.api.types.is_numeric_dtype(values.dtype):
+                numbers = present.astype('float64')
+                stats['mean'], stats['std'] = numbers.mean(), numbers.std()
+    return stats
+
+
+def compute_profile(path=None, frame=None):
+    """Profile of every column: {'rows': n, 'columns': frame of PROFILE_STATS per column}.
+
+    A Parquet file is read one column at a time (tombstoned rows left out), so
+    only one column is in memory; anything else is profiled from frame.
+    """
+    if frame is None and path.endswith('.parquet'):
+        names = [name for name in pq.read_schema(path).names if name != TOMBSTONE_COLUMN]
+        columns = {name: profile_column(load_cleaned([name], path=path)[name]) for name in names}
+        rows = columns[names[0]]['non_null'] + columns[names[0]]['null'] if names else 0
+    else:
+        if frame is None:
+            frame = read_metadata(path)
+        columns = {name: profile_column(frame[name]) for name in frame.columns}
+        rows = len(frame)
+    table = pd.DataFrame.from_dict(columns, orient='index').reindex(columns=PROFILE_STATS)
+    return {'rows': rows, 'columns': table}
+
+
+def file_version(path):
+    """Version string of any dataset file (name, size and modification time)"""
+    return dataset_version(path, csv_path=path)
+
+
+def save_profile(profile, version, path):
+    """Persist a profile next to its dataset file (replaced atomically, other processes may be reading)"""
+    target = profile_path(path)
+    with open(f'{target}.{os.getpid()}.tmp', 'wb') as f:
+        pickle.dump({'version': version, 'format': PROFILE_FORMAT, 'profile': profile}, f)
+    os.replace(f.name, target)
+
+
+def read_profile(version, path):
+    """The persisted profile of a dataset file if it describes this version, else None"""
+    try:
+        with open(profile_path(path), 'rb') as f:
+            saved = pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return None
+    if saved.get('version') == version and saved.get('format') == PROFILE_FORMAT:
+        return saved['profile']
+    return None
+
+
+def load_profile(path, version=None, frame=None):
+    """Profile of a dataset file, read from disk or computed (and persisted) when missing or stale"""
+    version = version or file_version(path)
+    profile = read_profile(version, path)
+    if profile is None:
+        profile = compute_profile(path, frame)
+        save_profile(profile, version, path)
+    return profile
+
+
+def describe(profile, column):
+    """describe()-style Series of one profiled numeric column"""
+    stats = profile['columns'].loc[column]
+    return pd.Series({'count': stats['non_null'], 'mean': stats['mean'], 'std': stats['std'],
+                      'min': stats['min'], '25%': stats['25%'], '50%': stats['50%'],
+                      '75%': stats['75%'], 'max': stats['max']}, name=column)
+
+
+class ProfileBuilder:
+    """Computes dataset profiles in a background thread, once per file version.
+
+    submit() returns at once; the future is already done when the profile was
+    persisted earlier, and requests for a profile being computed share its future.
+    """
+
+    def __init__(self, workers=1):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='profile')
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def submit(self, path, version=None, frame=None):
+        version = version or file_version(path)
+        profile = read_profile(version, path)
+        if profile is not None:
+            future = Future()
+            future.set_result(profile)
+            return future
+        key = (path, version)
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                future = self._executor.submit(self._build, key, frame)
+                self._pending[key] = future
+            return future
+
+    def _build(self, key, frame):
+        try:
+            return load_profile(*key, frame=frame)
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+
+if __name__ == "__main__":
+    profile = load_profile(CLEANED_PARQUET_PATH)
+    print(f"Rows: {profile['rows']:,}")
+    print(profile['columns'].to_string())
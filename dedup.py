@@ -0,0 +1,414 @@
+# dedup.py - Near-duplicate papers: exact identifiers plus MinHash/LSH over title and abstract
+import os
+import pickle
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from cleaning import DEFAULT_WORKERS, MIN_PARALLEL_ROWS
+from dataset import load_cleaned, dataset_version
+
+DUPLICATES_PATH = 'data/duplicates.pkl'
+
+# Columns added to the cleaned dataset: the paper_id of the cluster's canonical paper,
+# and whether the row is that canonical paper
+DEDUP_COLUMNS = ['cluster_id', 'canonical']
+
+# Identifiers that mark the same paper when equal (after normalization)
+KEY_COLUMNS = ['doi', 'pmcid', 'pubmed_id']
+NO_ABSTRACT = 'No abstract available'
+
+# MinHash signature length and LSH banding (BANDS bands of NUM_PERM // BANDS values)
+NUM_PERM = 64
+BANDS = 16
+SHINGLE_SIZE = 3  # words per shingle
+MIN_SHINGLES = 5  # shorter texts ("Editorial", "Reply") only match through identifiers
+SIMILARITY_THRESHOLD = 0.8  # estimated Jaccard similarity of candidate pairs
+BUCKET_WINDOW = 32  # bucket members compared with each of the next ones (larger buckets: see _group_pairs)
+
+# Texts hashed at a time (and per worker task)
+SIGNATURE_BATCH = 10_000
+
+# Fixed hash functions, so signatures from different runs and processes are comparable
+_PRIME = np.uint64(4294967311)
+_rng = np.random.default_rng(19)
+_A = _rng.integers(1, 2**32, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 2**32, NUM_PERM, dtype=np.uint64)
+_EMPTY = np.iinfo(np.uint32).max
+
+
+def document_text(frame):
+    """Title and abstract (without the missing-abstract placeholder) of every row"""
+    abstracts = frame['abstract'].fillna('').astype(str)
+    abstracts = abstracts.where(abstracts != NO_ABSTRACT, '')
+    return (frame['title'].fillna('').astype(str) + ' ' + abstracts).reset_index(drop=True)
+
+
+def shingle_hashes(texts):
+    """(row, 32-bit hash) for every word SHINGLE_SIZE-gram of every text"""
+    words = texts.str.lower().str.findall(r'[a-z0-9]+').explode().dropna()
+    rows = words.index.to_numpy(dtype=np.int64)
+    hashes = pd.util.hash_array(words.to_numpy(dtype=object))
+    if len(hashes) < SHINGLE_SIZE:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint64)
+
+    end = len(hashes) - SHINGLE_SIZE + 1
+    combined = hashes[:end].copy()
+    for offset in range(1, SHINGLE_SIZE):
+        combined = combined * np.uint64(1099511628211) ^ hashes[offset:end + offset]
+    # Keep the shingles whose words all belong to the same text
+    same_text = rows[:end] == rows[SHINGLE_SIZE - 1:]
+    return rows[:end][same_text], combined[same_text] & np.uint64(0xFFFFFFFF)
+
+
+def minhash_signatures(texts):
+    """(MinHash signature per text, number of shingles per text) for one batch of texts"""
+    texts = texts.reset_index(drop=True)
+    rows, hashes = shingle_hashes(texts)
+    signatures = np.full((len(texts), NUM_PERM), _EMPTY, dtype=np.uint32)
+    if len(rows):
+        # rows is sorted, so each text's shingles are one contiguous run
+        starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+        for i in range(NUM_PERM):
+            permuted = (_A[i] * hashes + _B[i]) % _PRIME
+            signatures[rows[starts], i] = np.minimum.reduceat(permuted, starts)
+    return signatures, np.bincount(rows, minlength=len(texts)).astype(np.int32)
+
+
+def compute_signatures(texts, workers=DEFAULT_WORKERS):
+    """minhash_signatures over all texts, in batches, in worker processes when worthwhile"""
+    batches = [texts.iloc[start:start + SIGNATURE_BATCH] for start in range(0, len(texts), SIGNATURE_BATCH)]
+    if workers > 1 and len(texts) >= MIN_PARALLEL_ROWS:
+        with ProcessPoolExecutor(workers) as executor:
+            results = list(executor.map(minhash_signatures, batches))
+    else:
+        results = [minhash_signatures(batch) for batch in batches]
+    if not results:
+        return np.zeros((0, NUM_PERM), dtype=np.uint32), np.zeros(0, dtype=np.int32)
+    return np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results])
+
+
+def normalized_keys(frame):
+    """Identifier columns, lower-cased and stripped (DOIs without their URL prefix); missing = NA"""
+    keys = {}
+    for col in KEY_COLUMNS:
+        values = frame[col] if col in frame.columns else pd.Series(pd.NA, index=frame.index)
+        values = values.astype('string').str.strip().str.lower()
+        if col == 'doi':
+            values = values.str.replace(r'^https?://(dx\.)?doi\.org/', '', regex=True)
+        keys[col] = values.mask(values == '').reset_index(drop=True)
+    return pd.DataFrame(keys)
+
+
+def quality(frame):
+    """Canonical paper preference: has an abstract, then has a date, then longer abstract"""
+    has_abstract = (frame['abstract'].notna() & (frame['abstract'] != NO_ABSTRACT)).to_numpy(dtype=np.int64)
+    has_date = frame['publish_time'].notna().to_numpy(dtype=np.int64)
+    words = frame['abstract_word_count'].fillna(0).to_numpy(dtype=np.int64)
+    return (has_abstract << 40) | (has_date << 39) | np.minimum(words, (1 << 39) - 1)
+
+
+def _equal_pairs(values, valid=None):
+    """Pairs of positions with equal values (each to the next one in sorted order)"""
+    positions = np.arange(len(values)) if valid is None else np.flatnonzero(valid)
+    values = values[positions]
+    order = np.argsort(values, kind='stable')
+    same = values[order][1:] == values[order][:-1]
+    return positions[order][:-1][same], positions[order][1:][same]
+
+
+def _group_pairs(values, window=BUCKET_WINDOW):
+    """Pairs of positions with equal values.
+
+    Each member of a group is paired with the next window members in sorted order
+    and with the group's first member: a group of up to window + 1 members yields
+    every pair, a larger one O(size * window) pairs instead of O(size ** 2).
+    """
+    if len(values) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    order = np.argsort(values, kind='stable')
+    values = values[order]
+    starts = np.flatnonzero(np.r_[True, values[1:] != values[:-1]])
+    group_first = np.repeat(starts, np.diff(np.r_[starts, len(values)]))
+
+    # Members k apart in sorted order, for k = 1..window
+    first, second = [], []
+    i = np.arange(len(values))
+    for k in range(1, window + 1):
+        i = i[i + k < len(values)]
+        i = i[values[i + k] == values[i]]
+        if len(i) == 0:
+            break
+        first.append(order[i])
+        second.append(order[i + k])
+    # Members further down a large group are linked to its first member only
+    far = np.flatnonzero(np.arange(len(values)) - group_first > window)
+    first.append(order[group_first[far]])
+    second.append(order[far])
+    return np.concatenate(first), np.concatenate(second)
+
+
+def _fold(values):
+    """One 64-bit hash per row of a 2-D array of signature values"""
+    values = np.asarray(values).astype(np.uint64)
+    hashes = values[:, 0].copy()
+    for col in range(1, values.shape[1]):
+        hashes = hashes * _PRIME ^ values[:, col]
+    return hashes
+
+
+def candidate_pairs(column, signatures, signature_hashes=None):
+    """Pairs of rows that are the same paper: equal identifiers or similar signatures.
+
+    column(name) returns one column of the index rows (identifiers and shingles), so
+    the rows can stay on disk; signatures may be a memory map. signature_hashes
+    (_fold of the signatures) is computed when not given.
+    """
+    pairs = []
+    for col in KEY_COLUMNS:
+        codes = pd.factorize(column(col))[0]
+        pairs.append(_equal_pairs(codes, codes >= 0))
+
+    # Papers with the same signature are paired directly; LSH compares one of them
+    valid = column('shingles').to_numpy() >= MIN_SHINGLES
+    if signature_hashes is None:
+        signature_hashes = _fold(signatures) if len(signatures) else np.zeros(0, dtype=np.uint64)
+    a, b = _equal_pairs(signature_hashes, valid)
+    pairs.append((a, b))
+    band_rows = np.flatnonzero(valid)
+    band_rows = band_rows[np.unique(signature_hashes[band_rows], return_index=True)[1]]
+
+    # LSH: rows sharing all values of one band are candidates, kept if similar enough.
+    # Members of a bucket are compared with each other, not only with a neighbour, so
+    # a dissimilar member between two similar ones does not hide their pair. Oversized
+    # buckets (a boilerplate band shared by thousands of papers) are compared in a
+    # window, so their cost stays linear.
+    width = NUM_PERM // BANDS
+    for band in range(BANDS):
+        a, b = _group_pairs(_fold(signatures[band_rows, band * width:(band + 1) * width]))
+        a, b = band_rows[a], band_rows[b]
+        similar = (signatures[a] == signatures[b]).mean(axis=1) >= SIMILARITY_THRESHOLD
+        pairs.append((a[similar], b[similar]))
+    return np.concatenate([p[0] for p in pairs]), np.concatenate([p[1] for p in pairs])
+
+
+def cluster_frame(paper_ids, quality, labels):
+    """Frame of paper_id, cluster_id (paper_id of the canonical paper) and canonical"""
+    if len(paper_ids) == 0:
+        return pd.DataFrame({'paper_id': np.zeros(0, dtype=np.int64),
+                             'cluster_id': np.zeros(0, dtype=np.int64), 'canonical': np.zeros(0, dtype=bool)})
+    # Best quality first within each cluster, then the lowest paper_id
+    order = np.lexsort((paper_ids, -quality, labels))
+    first = np.r_[True, labels[order][1:] != labels[order][:-1]]
+    canonical = np.zeros(len(order), dtype=bool)
+    canonical[order[first]] = True
+    canonical_of_label = pd.Series(paper_ids[order[first]], index=labels[order[first]])
+    return pd.DataFrame({
+        'paper_id': paper_ids,
+        'cluster_id': canonical_of_label.reindex(labels).to_numpy(dtype=np.int64),
+        'canonical': canonical,
+    })
+
+
+def connected_components(n, a, b):
+    """Component label (smallest member) of n nodes joined by edges a[i]-b[i]"""
+    parent = np.arange(n)
+    while len(a):
+        roots_a, roots_b = parent[a], parent[b]
+        if (roots_a == roots_b).all():
+            break
+        # Hook the larger root under the smaller one, then flatten the trees
+        np.minimum.at(parent, np.maximum(roots_a, roots_b), np.minimum(roots_a, roots_b))
+        while True:
+            grandparent = parent[parent]
+            if (grandparent == parent).all():
+                break
+            parent = grandparent
+    return parent
+
+
+class DuplicateIndex:
+    """Identifiers, MinHash signatures and canonical preference of every paper.
+
+    Clusters are recomputed from these without looking at the texts again, so an
+    update only hashes the added or changed papers.
+    """
+
+    def __init__(self, rows, signatures, version=None):
+        self.rows = rows.reset_index(drop=True)  # paper_id, identifiers, quality, shingles
+        self.signatures = signatures
+        self.version = version
+
+    def __len__(self):
+        return len(self.rows)
+
+    @classmethod
+    def build(cls, frame, workers=DEFAULT_WORKERS):
+        """Index over cleaned rows (paper_id, title, abstract, publish_time, identifiers)"""
+        signatures, shingles = compute_signatures(document_text(frame), workers)
+        rows = normalized_keys(frame)
+        rows.insert(0, 'paper_id', frame['paper_id'].to_numpy(dtype=np.int64))
+        rows['quality'] = quality(frame)
+        rows['shingles'] = shingles
+        return cls(rows, signatures)
+
+    @classmethod
+    def concat(cls, indexes):
+        indexes = list(indexes)
+        if not indexes:
+            return cls(pd.DataFrame(columns=['paper_id'] + KEY_COLUMNS + ['quality', 'shingles']),
+                       np.zeros((0, NUM_PERM), dtype=np.uint32))
+        return cls(pd.concat([index.rows for index in indexes], ignore_index=True),
+                   np.concatenate([index.signatures for index in indexes]))
+
+    def update(self, removed_ids, added, workers=DEFAULT_WORKERS):
+        """New index without the removed papers and with the added (or changed) rows"""
+        gone = set(removed_ids) | set(added['paper_id'])
+        keep = ~self.rows['paper_id'].isin(gone).to_numpy()
+        kept = DuplicateIndex(self.rows[keep], self.signatures[keep])
+        return DuplicateIndex.concat([kept, DuplicateIndex.build(added, workers)])
+
+    def candidate_pairs(self):
+        """Pairs of rows that are the same paper: equal identifiers or similar signatures"""
+        return candidate_pairs(lambda col: self.rows[col], self.signatures)
+
+    def clusters(self):
+        """Frame of paper_id, cluster_id (paper_id of the canonical paper) and canonical"""
+        labels = connected_components(len(self.rows), *self.candidate_pairs())
+        return cluster_frame(self.rows['paper_id'].to_numpy(dtype=np.int64),
+                             self.rows['quality'].to_numpy(dtype=np.int64), labels)
+
+    def assign(self, frame):
+        """frame with the DEDUP_COLUMNS set from this index's clusters"""
+        return assign_clusters(frame, self.clusters())
+
+    def save(self, version, path=DUPLICATES_PATH):
+        with open(path, 'wb') as f:
+            pickle.dump({'version': version, 'rows': self.rows, 'signatures': self.signatures}, f)
+
+    @classmethod
+    def load(cls, path=DUPLICATES_PATH):
+        with open(path, 'rb') as f:
+            saved = pickle.load(f)
+        return cls(saved['rows'], saved['signatures'], saved['version'])
+
+
+class DuplicateSpill:
+    """DuplicateIndex of a file cleaned chunk by chunk, kept on disk (streaming mode).
+
+    Each chunk's index rows go to a Parquet side file and its signatures to a raw
+    side file, so memory does not grow with the file. clusters() maps the signatures
+    and reads one identifier column at a time; what it holds per row is a few integers.
+    Used as a context manager, the side files are removed on the way out, also on errors.
+    """
+
+    def __init__(self, path):
+        self.rows_path = path + '.dedup.parquet'
+        self.signatures_path = path + '.signatures'
+        self.rows = 0
+        self._writer = None
+        self._signatures = open(self.signatures_path, 'wb')
+
+    def append(self, frame, workers=DEFAULT_WORKERS):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        index = DuplicateIndex.build(frame, workers)
+        rows = index.rows.astype({col: 'string' for col in KEY_COLUMNS})
+        rows['signature_hash'] = _fold(index.signatures) if len(index) else np.zeros(0, dtype=np.uint64)
+        table = pa.Table.from_pandas(rows, preserve_index=False)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.rows_path, table.schema)
+        self._writer.write_table(table)
+        self._signatures.write(np.ascontiguousarray(index.signatures, dtype=np.uint32).tobytes())
+        self.rows += len(index)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._signatures.close()
+
+    def clusters(self):
+        import pyarrow.parquet as pq
+
+        self.close()
+        if self.rows == 0:
+            return cluster_frame(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+        signatures = np.memmap(self.signatures_path, dtype=np.uint32, mode='r', shape=(self.rows, NUM_PERM))
+        column = lambda col: pq.read_table(self.rows_path, columns=[col]).column(0).to_pandas()
+        labels = connected_components(self.rows, *candidate_pairs(column, signatures, column('signature_hash').to_numpy()))
+        return cluster_frame(column('paper_id').to_numpy(dtype=np.int64), column('quality').to_numpy(dtype=np.int64), labels)
+
+    def remove(self):
+        self.close()
+        for path in (self.rows_path, self.signatures_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.remove()
+
+
+def assign_clusters(frame, clusters):
+    """frame with the DEDUP_COLUMNS from a clusters() frame (papers not in it stand alone)"""
+    clusters = clusters.set_index('paper_id')
+    paper_ids = frame['paper_id']
+    frame = frame.copy()
+    frame['cluster_id'] = clusters['cluster_id'].reindex(paper_ids).fillna(paper_ids.astype('float64')).to_numpy(dtype=np.int64)
+    frame['canonical'] = clusters['canonical'].reindex(paper_ids).fillna(True).to_numpy(dtype=bool)
+    return frame
+
+
+def deduplicate(df, workers=DEFAULT_WORKERS):
+    """Cleaned frame with the DEDUP_COLUMNS added, and the DuplicateIndex behind them"""
+    index = DuplicateIndex.build(df, workers)
+    return index.assign(df), index
+
+
+def load_duplicate_index(version=None, path=DUPLICATES_PATH, workers=DEFAULT_WORKERS):
+    """DuplicateIndex for the current dataset version, building and saving it if needed"""
+    version = version or dataset_version()
+    if os.path.exists(path):
+        index = DuplicateIndex.load(path)
+        if index.version == version:
+            return index
+    index = DuplicateIndex.build(load_cleaned(['paper_id', 'title', 'abstract', 'publish_time',
+                                               'abstract_word_count'] + KEY_COLUMNS), workers)
+    index.version = version
+    index.save(version, path)
+    return index
+
+
+def report(df):
+    """Print how many duplicates were found"""
+    duplicates = int((~df['canonical']).sum())
+    clusters = df.loc[~df['canonical'], 'cluster_id'].nunique()
+    print(f"Found {duplicates:,} duplicate papers in {clusters:,} clusters")
+
+
+def rewrite_with_clusters(clusters, parquet_path=None, csv_path=None, chunksize=None):
+    """Add the DEDUP_COLUMNS to cleaned files written chunk by chunk (streaming mode)"""
+    from dataset import ParquetChunkWriter
+    from cleaning import DEFAULT_CHUNKSIZE
+    import pyarrow.parquet as pq
+
+    chunksize = chunksize or DEFAULT_CHUNKSIZE
+    if parquet_path:
+        writer = ParquetChunkWriter(parquet_path + '.tmp')
+        try:
+            for batch in pq.ParquetFile(parquet_path).iter_batches(batch_size=chunksize):
+                writer.write(assign_clusters(batch.to_pandas(), clusters))
+        finally:
+            writer.close()
+        os.replace(parquet_path + '.tmp', parquet_path)
+    if csv_path:
+        # Read back as the exact text that was written, so only the new columns change
+        chunks = pd.read_csv(csv_path, dtype=str, keep_default_na=False, chunksize=chunksize)
+        for i, chunk in enumerate(chunks):
+            chunk = assign_clusters(chunk.astype({'paper_id': 'int64'}), clusters)
+            chunk.to_csv(csv_path + '.tmp', mode='w' if i == 0 else 'a', header=i == 0, index=False)
+        os.replace(csv_path + '.tmp', csv_path)
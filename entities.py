@@ -0,0 +1,260 @@
+# entities.py - Author and journal dimension tables, with paper <-> author edges as CSR arrays
+import os
+import json
+import numpy as np
+import pandas as pd
+
+from cleaning import CLEANED_PARQUET_PATH
+from dataset import load_cleaned, dataset_version, swap_directory, current_directory
+from metrics import instrument
+
+ENTITIES_DIR = 'data/entities'
+ENTITIES_FORMAT = 3
+ENTITY_COLUMNS = ['authors', 'journal', 'year', 'abstract_word_count']
+
+# Written by the cleaning step for missing values; papers without authors get no author edges
+UNKNOWN_AUTHORS = 'Unknown authors'
+UNKNOWN_JOURNAL = 'Unknown Journal'
+AUTHOR_SEPARATOR = ';'
+
+
+def canonical_names(names):
+    """Display names (whitespace collapsed) and matching keys for a Series of names.
+
+    Keys ignore case, Unicode compatibility forms, dots and spacing, so 'Smith, J.'
+    and 'smith,  J' are the same entity.
+    """
+    display = names.str.replace(r'\s+', ' ', regex=True).str.strip()
+    keys = (display.str.normalize('NFKC')
+            .str.casefold()
+            .str.replace(r'[.\s]+', ' ', regex=True)
+            .str.replace(r'\s*,\s*', ', ', regex=True)
+            .str.strip(' ,'))
+    return display, keys
+
+
+def _dimension(names):
+    """Entity id per name (-1 when blank) and the display name per id.
+
+    Only the distinct raw names are canonicalized. Ids are numbered by how often
+    the entity occurs, most first; the most frequent spelling is the one shown.
+    """
+    raw_codes, raw_names = pd.factorize(names.to_numpy())
+    display, keys = canonical_names(pd.Series(raw_names, dtype=object))
+    key_codes, _ = pd.factorize(keys.where(keys != '').to_numpy())  # blank keys get -1
+    occurrences = np.bincount(raw_codes, minlength=len(raw_names))
+
+    n_entities = key_codes.max() + 1 if len(key_codes) else 0
+    weights = np.bincount(key_codes[key_codes >= 0], weights=occurrences[key_codes >= 0], minlength=n_entities)
+    rank = np.empty(n_entities, dtype=np.int64)
+    rank[np.argsort(-weights, kind='stable')] = np.arange(n_entities)
+    ids = np.where(key_codes >= 0, rank[np.maximum(key_codes, 0)] if n_entities else -1, -1)
+
+    spellings = pd.DataFrame({'id': ids, 'name': display.to_numpy(), 'count': occurrences})
+    spellings = spellings[spellings['id'] >= 0].sort_values('count', ascending=False, kind='stable')
+    shown = spellings.drop_duplicates('id').set_index('id')['name'].sort_index()
+    return ids[raw_codes], shown.to_numpy(dtype=object)
+
+
+def _csr(groups, members, n_groups):
+    """(offsets, members sorted by group): the members of group g are at offsets[g]:offsets[g + 1]"""
+    order = np.argsort(groups, kind='stable')
+    offsets = np.zeros(n_groups + 1, dtype=np.int64)
+    np.cumsum(np.bincount(groups, minlength=n_groups), out=offsets[1:])
+    return offsets, members[order]
+
+
+def _names_blob(names):
+    return np.frombuffer('\n'.join(names).encode('utf-8'), dtype=np.uint8)
+
+
+def _blob_names(blob):
+    return np.array(blob.tobytes().decode('utf-8').split('\n') if blob.size else [], dtype=object)
+
+
+class EntityTables:
+    """Integer-keyed authors and journals of the cleaned papers.
+
+    Papers are row positions (as in load_cleaned()). Authors and journals are ids
+    numbered by paper count, largest first, so the top n are ids 0..n-1. Paper ->
+    authors and author -> papers are CSR arrays (offsets plus a flat array), so
+    papers by author, authors of a paper and co-authors cost O(degree), and
+    journal details are one row of the journal table.
+    """
+
+    ARRAYS = ('author_names', 'journal_names', 'paper_journal', 'paper_offsets', 'paper_authors',
+              'author_offsets', 'author_papers', 'journal_offsets', 'journal_papers',
+              'journal_first_year', 'journal_last_year', 'journal_abstract_mean')
+
+    def __init__(self, version=None, **arrays):
+        self.version = version
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+        self._author_ids = None
+        self._journal_ids = None
+
+    @classmethod
+    @instrument('entities.build', rows=lambda tables: len(tables.paper_journal))
+    def build(cls, frame, version=None):
+        """Tables for a frame with ENTITY_COLUMNS, one row per paper"""
+        n_papers = len(frame)
+
+        journals = frame['journal'].astype(str)
+        journals = journals.where(journals.str.strip(' .') != '', UNKNOWN_JOURNAL)  # every paper has a journal
+        paper_journal, journal_names = _dimension(journals)
+        journal_offsets, journal_papers = _csr(paper_journal, np.arange(n_papers, dtype=np.int64), len(journal_names))
+
+        years = pd.Series(frame['year'].astype('float64').to_numpy())
+        words = pd.Series(frame['abstract_word_count'].astype('float64').to_numpy())
+        by_journal = pd.DataFrame({'journal': paper_journal, 'year': years, 'words': words}).groupby('journal')
+        index = np.arange(len(journal_names))
+        journal_first_year = by_journal['year'].min().reindex(index).to_numpy()
+        journal_last_year = by_journal['year'].max().reindex(index).to_numpy()
+        journal_abstract_mean = by_journal['words'].mean().reindex(index).to_numpy()
+
+        # One edge per (paper, distinct author), in paper order
+        authors = frame['authors'].astype(str).reset_index(drop=True)
+        authors = authors[authors != UNKNOWN_AUTHORS].str.split(AUTHOR_SEPARATOR).explode()
+        edge_author, author_names = _dimension(authors)
+        edges = pd.DataFrame({'paper': authors.index.to_numpy(), 'author': edge_author})
+        edges = edges[edges['author'] >= 0].drop_duplicates()
+        # Authors are ranked by distinct papers: a paper listing one author twice counts once
+        order = np.argsort(-np.bincount(edges['author'], minlength=len(author_names)), kind='stable')
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        edges['author'] = rank[edges['author'].to_numpy()]
+        author_names = author_names[order]
+        paper_offsets, paper_authors = _csr(edges['paper'].to_numpy(), edges['author'].to_numpy(), n_papers)
+        author_offsets, author_papers = _csr(paper_authors, np.repeat(np.arange(n_papers), np.diff(paper_offsets)),
+                                             len(author_names))
+
+        return cls(version, author_names=author_names, journal_names=journal_names,
+                   paper_journal=paper_journal.astype(np.int32),
+                   paper_offsets=paper_offsets, paper_authors=paper_authors.astype(np.int32),
+                   author_offsets=author_offsets, author_papers=author_papers,
+                   journal_offsets=journal_offsets, journal_papers=journal_papers,
+                   journal_first_year=journal_first_year, journal_last_year=journal_last_year,
+                   journal_abstract_mean=journal_abstract_mean)
+
+    def __len__(self):
+        return len(self.paper_journal)
+
+    # Lookups by name (dicts built on first use)
+
+    def author_id(self, name):
+        """Id of the author with this name (any spelling), or None"""
+        if self._author_ids is None:
+            _, keys = canonical_names(pd.Series(self.author_names, dtype=object))
+            self._author_ids = dict(zip(keys, range(len(keys))))
+        _, key = canonical_names(pd.Series([name]))
+        return self._author_ids.get(key.iloc[0])
+
+    def journal_id(self, name):
+        """Id of the journal with this name (any spelling), or None"""
+        if self._journal_ids is None:
+            _, keys = canonical_names(pd.Series(self.journal_names, dtype=object))
+            self._journal_ids = dict(zip(keys, range(len(keys))))
+        _, key = canonical_names(pd.Series([name]))
+        return self._journal_ids.get(key.iloc[0])
+
+    # O(degree) queries
+
+    def authors_of(self, position):
+        """Author ids of one paper, in the order they were listed"""
+        return self.paper_authors[self.paper_offsets[position]:self.paper_offsets[position + 1]]
+
+    def author_list(self, position):
+        """Author names of one paper"""
+        return list(self.author_names[self.authors_of(position)])
+
+    def papers_by_author(self, author):
+        """Sorted row positions of an author's papers"""
+        return self.author_papers[self.author_offsets[author]:self.author_offsets[author + 1]]
+
+    def journal_papers_of(self, journal):
+        """Sorted row positions of a journal's papers"""
+        return self.journal_papers[self.journal_offsets[journal]:self.journal_offsets[journal + 1]]
+
+    def top_authors(self, positions=None, n=10):
+        """Papers per author among the given papers (all papers when None), most first"""
+        if positions is None:
+            top = np.arange(min(n, len(self.author_names)))
+            counts = np.diff(self.author_offsets)[top]
+        else:
+            positions = np.asarray(positions, dtype=np.int64)
+            starts = self.paper_offsets[positions]
+            degrees = self.paper_offsets[positions + 1] - starts
+            # Edge index of every (paper, author) pair of these papers, without a Python loop
+            edges = np.arange(degrees.sum()) + np.repeat(starts - (np.cumsum(degrees) - degrees), degrees)
+            authors, counts = np.unique(self.paper_authors[edges], return_counts=True)
+            order = np.argsort(-counts, kind='stable')[:n]
+            top, counts = authors[order], counts[order]
+        return pd.Series(counts, index=pd.Index(self.author_names[top], name='author'), name='papers')
+
+    def coauthors(self, author, n=10):
+        """Authors sharing most papers with author, as papers per co-author name"""
+        top = self.top_authors(self.papers_by_author(author), n + 1)
+        return top.drop(self.author_names[author], errors='ignore').head(n)
+
+    def journal_table(self, n=None):
+        """Dimension table of the journals (largest first), with papers, years active and abstract length"""
+        n = len(self.journal_names) if n is None else min(n, len(self.journal_names))
+        return pd.DataFrame({
+            'papers': np.diff(self.journal_offsets)[:n],
+            'first_year': self.journal_first_year[:n],
+            'last_year': self.journal_last_year[:n],
+            'abstract_mean': self.journal_abstract_mean[:n],
+        }, index=pd.Index(self.journal_names[:n], name='journal'))
+
+    def save_arrays(self, directory, version=None):
+        """Save as .npy files (plus a small JSON header), so load_arrays() can memory-map them.
+
+        The files are switched in whole (see dataset.swap_directory), so a reader
+        gets the old tables or the new ones, never a mix.
+        """
+        def write(path):
+            for name in self.ARRAYS:
+                array = getattr(self, name)
+                if name.endswith('_names'):
+                    array = _names_blob(array)
+                np.save(os.path.join(path, f'{name}.npy'), array)
+            with open(os.path.join(path, 'entities.json'), 'w') as f:
+                json.dump({'version': version or self.version, 'format': ENTITIES_FORMAT}, f)
+
+        swap_directory(directory, write)
+
+    @classmethod
+    def load_arrays(cls, directory, mmap_mode='r'):
+        """Tables saved by save_arrays(); the edge arrays stay in the (shared) page cache"""
+        directory = current_directory(directory)
+        with open(os.path.join(directory, 'entities.json')) as f:
+            meta = json.load(f)
+        if meta.get('format') != ENTITIES_FORMAT:
+            raise ValueError(f"Entity tables in '{directory}' have an old format")
+        arrays = {}
+        for name in cls.ARRAYS:
+            array = np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode)
+            arrays[name] = _blob_names(array) if name.endswith('_names') else array
+        return cls(meta['version'], **arrays)
+
+
+def load_entities(version=None, directory=ENTITIES_DIR, source=CLEANED_PARQUET_PATH):
+    """EntityTables for the current dataset version, building (from source) and saving them if needed"""
+    version = version or dataset_version()
+    try:
+        tables = EntityTables.load_arrays(directory)
+        if tables.version == version:
+            return tables
+    except (FileNotFoundError, ValueError):
+        pass
+    tables = EntityTables.build(load_cleaned(ENTITY_COLUMNS, path=source), version)
+    tables.save_arrays(directory)
+    return tables
+
+
+if __name__ == "__main__":
+    tables = load_entities()
+    print(f"{len(tables):,} papers, {len(tables.author_names):,} authors, "
+          f"{len(tables.journal_names):,} journals, {len(tables.paper_authors):,} paper-author edges")
+    print(tables.journal_table(10))
+    print(tables.top_authors(n=10))
@@ -0,0 +1,134 @@
+# export.py - Chunked, cached exports of the cleaned dataset (CSV, compressed CSV, Parquet)
+import io
+import os
+import sys
+import hashlib
+import argparse
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from cleaning import CLEANED_PARQUET_PATH
+from dataset import TOMBSTONE_COLUMN, dataset_version
+
+EXPORT_DIR = 'data/exports'
+EXPORT_BATCH_ROWS = 20_000
+KEEP_EXPORTS = 8  # most recently used exports kept on disk, older ones are deleted
+
+# Export formats: file suffix, MIME type and Arrow compression codec of the stream (None = plain)
+FORMATS = {
+    'csv': ('.csv', 'text/csv', None),
+    'csv.gz': ('.csv.gz', 'application/gzip', 'gzip'),
+    'csv.zst': ('.csv.zst', 'application/zstd', 'zstd'),
+    'parquet': ('.parquet', 'application/vnd.apache.parquet', None),
+}
+
+
+def export_name(version, fmt, columns=None, positions=None):
+    """File name of an export, unique per dataset version, format, columns and row selection"""
+    digest = hashlib.blake2b(f'{version}:{fmt}:{columns}'.encode('utf-8'), digest_size=8)
+    if positions is not None:
+        digest.update(np.ascontiguousarray(positions, dtype=np.int64).tobytes())
+    return f'cord19_cleaned_{digest.hexdigest()}{FORMATS[fmt][0]}'
+
+
+def export_columns(path=CLEANED_PARQUET_PATH):
+    """Columns that can be exported (read from the file's schema, no data loaded)"""
+    return [col for col in pq.read_schema(path).names if col != TOMBSTONE_COLUMN]
+
+
+def iter_batches(path=CLEANED_PARQUET_PATH, columns=None, positions=None, batch_rows=EXPORT_BATCH_ROWS):
+    """Record batches of the cleaned dataset, without tombstoned rows.
+
+    positions are sorted row positions of the live rows (as used by the facet and
+    date indexes) to export a subset; None exports every row.
+    """
+    parquet = pq.ParquetFile(path)
+    names = parquet.schema_arrow.names
+    columns = [col for col in (columns or names) if col != TOMBSTONE_COLUMN]
+    has_tombstones = TOMBSTONE_COLUMN in names
+    read = columns + [TOMBSTONE_COLUMN] if has_tombstones else columns
+
+    offset = 0  # live rows seen so far
+    for batch in parquet.iter_batches(batch_size=batch_rows, columns=read):
+        if has_tombstones:
+            batch = batch.filter(pc.invert(batch.column(TOMBSTONE_COLUMN))).select(columns)
+        start, offset = offset, offset + batch.num_rows
+        if positions is not None:
+            lo, hi = np.searchsorted(positions, [start, offset])
+            batch = batch.take(pa.array(positions[lo:hi] - start))
+        if batch.num_rows:
+            yield batch
+
+
+def write_export(target, fmt, batches):
+    """Write batches to target in one export format, one batch in memory at a time.
+
+    The file is written next to target and renamed into place, so a half-written
+    export is never served. Returns the number of rows written.
+    """
+    staging = f'{target}.{os.getpid()}.tmp'
+    rows = 0
+    try:
+        if fmt == 'parquet':
+            writer = None
+            for batch in batches:
+                if writer is None:
+                    writer = pq.ParquetWriter(staging, batch.schema, compression='zstd')
+                writer.write_batch(batch)
+                rows += batch.num_rows
+            if writer is None:
+                raise ValueError("Nothing to export")
+            writer.close()
+        else:
+            codec = FORMATS[fmt][2]
+            sink = pa.CompressedOutputStream(staging, codec) if codec else pa.OSFile(staging, 'wb')
+            with io.TextIOWrapper(sink, encoding='utf-8', newline='') as text:
+                for batch in batches:
+                    batch.to_pandas().to_csv(text, header=rows == 0, index=False)
+                    rows += batch.num_rows
+        os.replace(staging, target)
+    finally:
+        if os.path.exists(staging):
+            os.remove(staging)
+    return rows
+
+
+def export(fmt='csv', columns=None, positions=None, version=None, path=CLEANED_PARQUET_PATH,
+           export_dir=EXPORT_DIR):
+    """Path of an export of the cleaned dataset, generated on first request and then reused.
+
+    Exports are cached on disk per dataset version, format, columns and row
+    selection (see iter_batches), so a rewrite of the cleaned file invalidates them.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}', expected one of {', '.join(FORMATS)}")
+    version = version or dataset_version(path)
+    if version is None:
+        raise FileNotFoundError("Cleaned dataset not found. Please run the data cleaning script first.")
+
+    target = os.path.join(export_dir, export_name(version, fmt, columns, positions))
+    if os.path.exists(target):
+        os.utime(target)
+        return target
+
+    os.makedirs(export_dir, exist_ok=True)
+    write_export(target, fmt, iter_batches(path, columns, positions))
+
+    exports = [entry for entry in os.scandir(export_dir) if entry.is_file() and not entry.name.endswith('.tmp')]
+    for entry in sorted(exports, key=lambda e: e.stat().st_mtime, reverse=True)[KEEP_EXPORTS:]:
+        os.remove(entry.path)
+    return target
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the cleaned CORD-19 dataset")
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--columns', nargs='+', help="columns to export (default: all)")
+    args = parser.parse_args()
+    try:
+        print(f"✅ Exported to '{export(args.format, args.columns)}'")
+    except FileNotFoundError as error:
+        print(error)
+        sys.exit(1)
@@ -0,0 +1,75 @@
+# facets.py - Precomputed row positions per filter value, for copy-free filtering
+import numpy as np
+import pandas as pd
+
+from dataset import load_cleaned
+from metrics import instrument
+
+FACET_COLUMNS = ['year', 'journal']
+
+
+class FacetIndex:
+    """Sorted row positions for every value of one column"""
+
+    def __init__(self, values):
+        values = pd.Series(values).reset_index(drop=True)
+        groups = values.groupby(values, observed=True, sort=True).indices
+        self.positions_by_value = {self._key(value): positions.astype(np.int64)
+                                   for value, positions in groups.items()}
+
+    @staticmethod
+    def _key(value):
+        # Plain Python values, so lookups work with whatever a widget hands back
+        return value.item() if isinstance(value, np.generic) else value
+
+    def values(self):
+        return list(self.positions_by_value)
+
+    def positions(self, value):
+        """Row positions holding this value (empty when it never occurs)"""
+        return self.positions_by_value.get(self._key(value), np.zeros(0, dtype=np.int64))
+
+    def to_arrays(self):
+        """(values, offsets, positions): the positions of values[i] are positions[offsets[i]:offsets[i + 1]]"""
+        values = list(self.positions_by_value)
+        lengths = [len(self.positions_by_value[value]) for value in values]
+        offsets = np.zeros(len(values) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        positions = np.concatenate(list(self.positions_by_value.values())) if values else np.zeros(0, dtype=np.int64)
+        return values, offsets, positions
+
+    @classmethod
+    def from_arrays(cls, values, offsets, positions):
+        """FacetIndex over arrays from to_arrays(); positions may be memory-mapped (no copy)"""
+        facet = cls.__new__(cls)
+        facet.positions_by_value = {value: positions[offsets[i]:offsets[i + 1]] for i, value in enumerate(values)}
+        return facet
+
+
+def build_facets(df, columns=FACET_COLUMNS):
+    """FacetIndex for each filter column"""
+    return {col: FacetIndex(df[col]) for col in columns}
+
+
+def load_facets(columns=FACET_COLUMNS):
+    """Build the facet indexes from the cleaned dataset"""
+    return build_facets(load_cleaned(columns), columns)
+
+
+@instrument('filter.select_rows', rows=len)
+def select_rows(selections, ordered=None):
+    """Intersect row selections without touching the frame.
+
+    selections are sorted position arrays (from FacetIndex); ordered is an optional
+    array whose order is kept, such as search results ranked by relevance.
+    Returns None when nothing is selected, meaning every row matches.
+    """
+    selected = None
+    for positions in selections:
+        selected = positions if selected is None else np.intersect1d(selected, positions, assume_unique=True)
+
+    if ordered is None:
+        return selected
+    if selected is None:
+        return ordered
+    return ordered[np.isin(ordered, selected, assume_unique=True)]
@@ -0,0 +1,137 @@
+# figures.py - Rendered chart cache shared by all app sessions
+import io
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from metrics import instrument
+
+# matplotlib and wordcloud are imported on the first render, not with this module:
+# together they add about a second to a cold start and most pages draw no chart.
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024  # total size of the cached PNGs
+DPI = 100
+RENDER_WORKERS = 2  # background threads for slow charts (word clouds)
+
+
+@instrument('figures.render')
+def render_png(draw, figsize, dpi=DPI):
+    """Call draw(ax) on a new figure and return the figure as PNG bytes.
+
+    The figure is a plain matplotlib Figure, not a pyplot one, so it never enters
+    pyplot's global figure registry; it is cleared as soon as it has been saved.
+    """
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=figsize)
+    try:
+        draw(fig.subplots())
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+        return buffer.getvalue()
+    finally:
+        fig.clear()
+
+
+@instrument('figures.wordcloud')
+def wordcloud_png(term_counts, max_words=200, width=800, height=400):
+    """Word cloud of a TermCounts as PNG bytes (drawn by WordCloud itself, no matplotlib)"""
+    from wordcloud import WordCloud
+    wordcloud = WordCloud(width=width, height=height, background_color='white', max_words=max_words)
+    wordcloud.generate_from_frequencies(term_counts.to_frequencies(max_words))
+    buffer = io.BytesIO()
+    wordcloud.to_image().save(buffer, format='png')
+    return buffer.getvalue()
+
+
+def draw_pie(counts):
+    """Pie chart of counts, for render_png"""
+    return lambda ax: ax.pie(counts.values, labels=counts.index, autopct='%1.1f%%')
+
+
+# Charts on the app's first page (the dashboard), prerendered into the published
+# snapshot: key (without the dataset version) -> function of the aggregates
+# returning (draw, figsize)
+FIRST_PAGE_FIGURES = {
+    ('journal_pie', 10): lambda aggregates: (draw_pie(aggregates['journal_counts'].head(10)), (10, 6)),
+}
+
+
+def render_first_page(aggregates):
+    """{key: PNG bytes} of FIRST_PAGE_FIGURES"""
+    return {key: render_png(*figure(aggregates)) for key, figure in FIRST_PAGE_FIGURES.items()}
+
+
+class FigureCache:
+    """LRU cache of rendered charts, keyed by chart and parameters, bounded by total size.
+
+    Safe to share between sessions (threads); a chart is rendered once per key until
+    it is evicted. Slow charts can be rendered in background threads with submit().
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._images = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(RENDER_WORKERS, thread_name_prefix='render')
+
+    def __len__(self):
+        return len(self._images)
+
+    def get(self, key):
+        with self._lock:
+            image = self._images.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self._images.move_to_end(key)
+            self.hits += 1
+            return image
+
+    def put(self, key, image):
+        if len(image) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._images:
+                self.nbytes -= len(self._images.pop(key))
+            self._images[key] = image
+            self.nbytes += len(image)
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._images.popitem(last=False)
+                self.nbytes -= len(evicted)
+
+    def render(self, key, draw, figsize, dpi=DPI):
+        """Cached PNG for key, rendered with render_png(draw, figsize) on a miss"""
+        image = self.get(key)
+        if image is None:
+            image = render_png(draw, figsize, dpi)
+            self.put(key, image)
+        return image
+
+    def submit(self, key, render):
+        """Future for the PNG of key; render() runs in a background thread on a miss.
+
+        Requests for a key that is already being rendered share the same future.
+        """
+        image = self.get(key)
+        if image is not None:
+            future = Future()
+            future.set_result(image)
+            return future
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                future = self._executor.submit(self._render_pending, key, render)
+                self._pending[key] = future
+            return future
+
+    def _render_pending(self, key, render):
+        try:
+            image = render()
+            self.put(key, image)
+            return image
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
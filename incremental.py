@@ -0,0 +1,230 @@
+# incremental.py - Incremental re-cleaning when a new metadata.csv snapshot lands
+import os
+import json
+import pandas as pd
+
+from cleaning import (RAW_PATH, CLEANED_CSV_PATH, CLEANED_PARQUET_PATH, DEFAULT_CHUNKSIZE,
+                      read_metadata, first_publish_time, clean_chunk, clean_csv_streaming)
+from dataset import TOMBSTONE_COLUMN, write_parquet, dataset_version
+from aggregates import load_aggregates, save_aggregates, update_aggregates, recent_papers, AGGREGATE_COLUMNS
+from dedup import load_duplicate_index, assign_clusters
+from similarity import SIMILARITY_DIR, load_similarity_index
+from entities import ENTITIES_DIR, EntityTables
+
+MANIFEST_PATH = 'data/manifest.parquet'
+STATE_PATH = 'data/incremental_state.json'
+
+# paper_id recorded for source rows that the cleaning step dropped (no title)
+NO_PAPER = -1
+
+
+def row_keys(chunk, seen):
+    """Stable key per source row: cord_uid, plus an occurrence number for repeated ids.
+
+    seen counts how often each cord_uid has appeared in earlier chunks of the same file.
+    """
+    uids = chunk['cord_uid'].fillna('').astype(str)
+    occurrence = uids.groupby(uids).cumcount()
+    offset = uids.map(lambda uid: seen.get(uid, 0))
+    for uid, n in uids.value_counts().items():
+        seen[uid] = seen.get(uid, 0) + n
+    return uids + '#' + (occurrence + offset).astype(str)
+
+
+def _as_text(values):
+    """Column values as text, whatever dtype read_csv inferred for this chunk"""
+    if pd.api.types.is_float_dtype(values):
+        finite = values.dropna()
+        if ((finite % 1 == 0) & (finite.abs() < 2 ** 53)).all():
+            # A whole-number column reads as float in a chunk with a missing value
+            values = values.astype('Int64')
+    return values.astype('string').fillna('')
+
+
+def row_fingerprints(chunk):
+    """64-bit content hash of every source row.
+
+    Rows are hashed as text, so a row's fingerprint depends on its values only and
+    not on the dtypes inferred for the chunk it was read in.
+    """
+    return pd.util.hash_pandas_object(chunk.apply(_as_text), index=False).astype('UInt64')
+
+
+def manifest_rows(input_path=RAW_PATH, chunksize=DEFAULT_CHUNKSIZE):
+    """Manifest of a snapshot that is cleaned from scratch, a chunk at a time.
+
+    Papers are numbered in file order, skipping rows without a title, as the
+    cleaning does. Only the keys, fingerprints and ids are kept, never the rows.
+    Returns (manifest rows, the snapshot's first publish_time).
+    """
+    seen = {}
+    scanned = []
+    date_anchor = None
+    papers = 0
+    for chunk in read_metadata(input_path, chunksize=chunksize):
+        if date_anchor is None:
+            date_anchor = first_publish_time(chunk)
+        has_title = chunk['title'].notna()
+        paper_ids = (papers + has_title.cumsum()).where(has_title, NO_PAPER).astype('int64')
+        papers += int(has_title.sum())
+        scanned.append(pd.DataFrame({'key': row_keys(chunk, seen), 'fingerprint': row_fingerprints(chunk),
+                                     'paper_id': paper_ids}, index=chunk.index))
+    return pd.concat(scanned), date_anchor
+
+
+def scan_snapshot(input_path=RAW_PATH, chunksize=DEFAULT_CHUNKSIZE, manifest=None):
+    """Fingerprint every row of a snapshot.
+
+    Returns (manifest rows for the snapshot, raw rows that are new or changed
+    compared to manifest). With no manifest every row is reported as changed.
+    """
+    previous = manifest.set_index('key')['fingerprint'] if manifest is not None else None
+    seen = {}
+    scanned, dirty = [], []
+
+    for chunk in read_metadata(input_path, chunksize=chunksize):
+        keys = row_keys(chunk, seen)
+        fingerprints = row_fingerprints(chunk)
+        scanned.append(pd.DataFrame({'key': keys, 'fingerprint': fingerprints}, index=chunk.index))
+
+        if previous is not None:
+            old = pd.Series(previous.reindex(keys).to_numpy(), index=chunk.index, dtype='UInt64')
+            changed = (old != fingerprints).fillna(True)
+            chunk = chunk[changed]
+            keys = keys[changed]
+        dirty.append(chunk.assign(_key=keys))
+
+    return pd.concat(scanned), pd.concat(dirty)
+
+
+def load_state():
+    if not os.path.exists(STATE_PATH):
+        return None
+    with open(STATE_PATH) as f:
+        return json.load(f)
+
+
+def save_state(state):
+    with open(STATE_PATH, 'w') as f:
+        json.dump(state, f)
+
+
+def full_rebuild(input_path=RAW_PATH, chunksize=DEFAULT_CHUNKSIZE):
+    """Clean a snapshot from scratch and record its manifest for later incremental runs"""
+    rows = clean_csv_streaming(input_path, CLEANED_CSV_PATH, chunksize, CLEANED_PARQUET_PATH)
+
+    scanned, date_anchor = manifest_rows(input_path, chunksize)
+    scanned.to_parquet(MANIFEST_PATH, index=False)
+
+    save_state({'date_anchor': date_anchor, 'next_paper_id': rows + 1})
+    load_aggregates(dataset_version())
+    print(f"✅ Full rebuild: {rows:,} papers cleaned, manifest saved to '{MANIFEST_PATH}'")
+
+
+def update_incremental(input_path=RAW_PATH, chunksize=DEFAULT_CHUNKSIZE):
+    """Re-clean only the rows of a new snapshot that were added or changed.
+
+    Changed papers are replaced in place (keeping their paper_id), new papers are
+    appended and papers missing from the snapshot are tombstoned. Aggregates and
+    title word counts are updated from the delta, duplicate clusters from the
+    delta's MinHash signatures, and only the delta's papers are embedded again for
+    the similar-papers index. The author and journal tables are rebuilt from the
+    updated store. The CSV export is not rewritten, but the cleaned Parquet file is:
+    the store is read whole and written back on every update, so an update costs
+    at least one pass over the full dataset even when the delta is small.
+    Falls back to a full rebuild when there is no manifest yet.
+    """
+    state = load_state()
+    if state is None or not os.path.exists(MANIFEST_PATH) or not os.path.exists(CLEANED_PARQUET_PATH):
+        print("No manifest found, running a full rebuild...")
+        return full_rebuild(input_path, chunksize)
+
+    manifest = pd.read_parquet(MANIFEST_PATH)
+    aggregates = load_aggregates(dataset_version())
+    duplicates = load_duplicate_index(dataset_version())
+    similar = load_similarity_index(dataset_version())
+
+    scanned, dirty = scan_snapshot(input_path, chunksize, manifest)
+    old_ids = manifest.set_index('key')['paper_id']
+    deleted_keys = manifest['key'][~manifest['key'].isin(scanned['key'])]
+
+    # Clean the delta only
+    keys = dirty.pop('_key')
+    cleaned = clean_chunk(dirty, date_anchor=state['date_anchor'], first_paper_id=0)
+    cleaned_keys = keys.loc[cleaned.index]
+    previous_id = old_ids.reindex(cleaned_keys).fillna(NO_PAPER).astype('int64').to_numpy()
+    is_new = previous_id == NO_PAPER
+    next_id = state['next_paper_id']
+    cleaned['paper_id'] = previous_id
+    cleaned.loc[is_new, 'paper_id'] = range(next_id, next_id + int(is_new.sum()))
+    next_id += int(is_new.sum())
+
+    # Manifest for the new snapshot: unchanged rows keep their paper_id
+    scanned['paper_id'] = old_ids.reindex(scanned['key']).fillna(NO_PAPER).astype('int64').to_numpy()
+    scanned.loc[keys.index, 'paper_id'] = NO_PAPER
+    scanned.loc[cleaned.index, 'paper_id'] = cleaned['paper_id'].to_numpy()
+
+    # Papers whose current row goes away: deleted rows, and changed rows (replaced or now dropped)
+    changed_ids = old_ids.reindex(keys).dropna().astype('int64')
+    gone_ids = set(old_ids.reindex(deleted_keys).astype('int64')) | set(changed_ids)
+    gone_ids.discard(NO_PAPER)
+    replaced_ids = set(cleaned['paper_id'][~is_new])
+    tombstone_ids = gone_ids - replaced_ids
+
+    store = pd.read_parquet(CLEANED_PARQUET_PATH)
+    if TOMBSTONE_COLUMN not in store.columns:
+        store[TOMBSTONE_COLUMN] = False
+    store = store.astype({col: object for col in store.select_dtypes('category').columns})
+    store_pos = pd.Series(range(len(store)), index=store['paper_id'])
+
+    live = ~store[TOMBSTONE_COLUMN]
+    removed = store[store['paper_id'].isin(gone_ids) & live]
+
+    # Replace changed papers in place, tombstone the rest, append new papers
+    cleaned[TOMBSTONE_COLUMN] = False
+    cleaned_columns = [col for col in store.columns if col in cleaned.columns]
+    cleaned = cleaned.reindex(columns=store.columns)
+    replaced = cleaned[~is_new]
+    if len(replaced):
+        # Column by column, in the store's dtypes (a whole-row assignment goes through object
+        # arrays); the cluster columns are assigned again below
+        rows = store_pos.loc[replaced['paper_id']].to_numpy()
+        for col in cleaned_columns:
+            store.iloc[rows, store.columns.get_loc(col)] = replaced[col].astype(store[col].dtype).to_numpy()
+    if tombstone_ids:
+        store.loc[store['paper_id'].isin(tombstone_ids), TOMBSTONE_COLUMN] = True
+    store = pd.concat([store, cleaned[is_new]], ignore_index=True)
+
+    # A removed paper may have been one of the most recent ones, so re-rank from the store
+    recent = None
+    if len(removed):
+        live_store = store[~store[TOMBSTONE_COLUMN].astype(bool)]
+        recent = recent_papers(live_store[AGGREGATE_COLUMNS].astype({'publish_time': 'datetime64[ns]'}))
+    aggregates = update_aggregates(aggregates, removed, cleaned, recent=recent)
+
+    # Near-duplicate clusters: only the changed and added papers are hashed again
+    duplicates = duplicates.update(gone_ids, cleaned)
+    store = assign_clusters(store, duplicates.clusters())
+
+    # Embeddings follow the live rows' order; unchanged papers keep their vectors
+    similar = similar.update(store[~store[TOMBSTONE_COLUMN].astype(bool)], set(cleaned['paper_id'][~is_new]))
+
+    # Author and journal tables are keyed by live row position, which shifts, so they are
+    # rebuilt from the store (no cleaning or text parsing beyond splitting author lists)
+    entities = EntityTables.build(store[~store[TOMBSTONE_COLUMN].astype(bool)])
+
+    write_parquet(store, CLEANED_PARQUET_PATH)
+    scanned.to_parquet(MANIFEST_PATH, index=False)
+    save_state({'date_anchor': state['date_anchor'], 'next_paper_id': next_id})
+    save_aggregates(aggregates, dataset_version())
+    duplicates.save(dataset_version())
+    similar.save_arrays(SIMILARITY_DIR, dataset_version())
+    entities.save_arrays(ENTITIES_DIR, dataset_version())
+
+    print(f"✅ Incremental update: {int(is_new.sum()):,} added, {len(replaced):,} changed, "
+          f"{len(tombstone_ids):,} tombstoned")
+
+
+if __name__ == "__main__":
+    print("=== INCREMENTAL DATA CLEANING ===\n")
+    update_incremental()
@@ -1,43 +1,81 @@
-# main.py - Main script to run all parts
+# main.py - Command line entry point for the whole project
 import os
+import sys
+import argparse
 
-def main():
-    print("=== CORD-19 DATA ANALYSIS PROJECT ===\n")
-    print("This project will guide you through analyzing the CORD-19 dataset.")
-    print("Please make sure you have downloaded metadata.csv from Kaggle and placed it in the data/ folder.\n")
-    
+from cleaning import RAW_PATH, DEFAULT_WORKERS
+
+
+def run_pipeline(args):
+    from pipeline import Pipeline
+    pipeline = Pipeline(raw_path=args.raw, workers=args.workers, streaming=args.streaming,
+                        show=args.show, force=args.force)
+    pipeline.run(args.stages)
+    print("\n✅ Pipeline completed!")
+    print("🎯 Now you can run the Streamlit app with: streamlit run app.py")
+    return 0
+
+
+def run_incremental(args):
+    from incremental import update_incremental
+    update_incremental(args.raw)
+    return 0
+
+
+def run_publish(args):
+    from shared_dataset import publish
+    print(f"✅ Published '{publish()}'")
+    return 0
+
+
+def run_app(args):
+    print("Starting Streamlit application...")
+    return os.system("streamlit run app.py")
+
+
+def build_parser():
+    from pipeline import STAGES
+    parser = argparse.ArgumentParser(
+        description="CORD-19 data analysis project. Place metadata.csv from Kaggle in the data/ folder first.")
+    commands = parser.add_subparsers(dest='command')
+
+    run = commands.add_parser('run', help="run pipeline stages (default: all of them)")
+    run.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES,
+                     help="stages to run, always in pipeline order")
+    run.add_argument('--raw', default=RAW_PATH, help="raw metadata.csv to start from")
+    run.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                     help="processes used for the derived cleaning columns")
+    run.add_argument('--streaming', action='store_true',
+                     help="clean the CSV chunk by chunk (low memory)")
+    run.add_argument('--force', action='store_true', help="ignore memoized stage outputs")
+    run.add_argument('--show', action='store_true', help="open the figures in a window as well")
+    run.set_defaults(func=run_pipeline)
+
+    incremental = commands.add_parser('incremental', help="apply a new metadata.csv snapshot incrementally")
+    incremental.add_argument('--raw', default=RAW_PATH, help="the new snapshot")
+    incremental.set_defaults(func=run_incremental)
+
+    publish = commands.add_parser('publish', help="publish the cleaned dataset for shared, memory-mapped serving")
+    publish.set_defaults(func=run_publish)
+
+    app = commands.add_parser('app', help="start the Streamlit application")
+    app.set_defaults(func=run_app)
+    return parser
+
+
+def main(argv=None):
     # Create necessary directories
     os.makedirs('data', exist_ok=True)
     os.makedirs('visualizations', exist_ok=True)
-    
-    print("Choose which part to run:")
-    print("1. Data Loading and Basic Exploration")
-    print("2. Data Cleaning and Preparation") 
-    print("3. Data Analysis and Visualization")
-    print("4. Run Streamlit Application")
-    print("5. Run All Parts Sequentially")
-    
-    choice = input("\nEnter your choice (1-5): ").strip()
-    
-    if choice == '1':
-        import part1_exploration
-    elif choice == '2':
-        import part2_cleaning
-    elif choice == '3':
-        import part3_analysis
-    elif choice == '4':
-        print("Starting Streamlit application...")
-        print("Please run: streamlit run app.py")
-        os.system("streamlit run app.py")
-    elif choice == '5':
-        print("Running all parts sequentially...\n")
-        import part1_exploration
-        import part2_cleaning
-        import part3_analysis
-        print("\n✅ All analysis parts completed!")
-        print("🎯 Now you can run the Streamlit app with: streamlit run app.py")
-    else:
-        print("Invalid choice. Please run 1-5.")
+
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        # No command: run every stage non-interactively
+        args = parser.parse_args(['run'] + (argv or []))
+    print("=== CORD-19 DATA ANALYSIS PROJECT ===\n")
+    return args.func(args)
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
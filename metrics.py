@@ -0,0 +1,229 @@
+# metrics.py - Stage timings, row counts and peak memory, with JSON-lines and Prometheus exporters
+import os
+import json
+import time
+import bisect
+import functools
+import threading
+import tracemalloc
+
+# Off unless CORD19_METRICS is set: 1 records latency and rows, 'memory' also peak memory
+# (tracemalloc, which slows allocation-heavy code down several times)
+METRICS_MODE = os.environ.get('CORD19_METRICS', '')
+ENABLED = METRICS_MODE not in ('', '0')
+TRACE_MEMORY = METRICS_MODE == 'memory'
+
+METRICS_DIR = os.environ.get('CORD19_METRICS_DIR', 'data/metrics')
+JSONL_FILE = 'metrics.jsonl'
+PROMETHEUS_FILE = 'metrics.prom'
+
+# Latency histogram bucket upper bounds in seconds (the last bucket is +Inf)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class StageStats:
+    """Latency histogram, row counts and peak memory of one stage"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # per bucket, not cumulative
+        self.rows = 0
+        self.last_rows = None
+        self.peak_bytes = None
+
+    def add(self, seconds, rows=None, peak_bytes=None):
+        self.count += 1
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        if rows is not None:
+            self.rows += rows
+            self.last_rows = rows
+        if peak_bytes is not None:
+            self.peak_bytes = max(self.peak_bytes or 0, peak_bytes)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile, capped at the slowest call seen"""
+        rank, seen = q * self.count, 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n:
+                return min(LATENCY_BUCKETS[i], self.max_seconds) if i < len(LATENCY_BUCKETS) else self.max_seconds
+        return 0.0
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_seconds': self.seconds / self.count if self.count else 0.0,
+            'p50_seconds': self.quantile(0.5),
+            'p95_seconds': self.quantile(0.95),
+            'max_seconds': self.max_seconds,
+            'rows': self.rows,
+            'last_rows': self.last_rows,
+            'peak_mb': round(self.peak_bytes / 1e6, 1) if self.peak_bytes is not None else None,
+        }
+
+
+class Registry:
+    """Process-wide stage statistics, shared by every thread (and app session)"""
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, rows=None, peak_bytes=None):
+        with self._lock:
+            stats = self._stats.get(stage)
+            if stats is None:
+                stats = self._stats[stage] = StageStats()
+            stats.add(seconds, rows, peak_bytes)
+
+    def summary(self):
+        """{stage: summary dict}, stages in name order"""
+        with self._lock:
+            return {stage: self._stats[stage].summary() for stage in sorted(self._stats)}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def export_jsonl(self, path=None):
+        """Append one line per stage (timestamped summary) to a JSON-lines file"""
+        path = path or os.path.join(METRICS_DIR, JSONL_FILE)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        now = time.time()
+        with open(path, 'a') as f:
+            for stage, summary in self.summary().items():
+                f.write(json.dumps({'time': now, 'pid': os.getpid(), 'stage': stage, **summary}) + '\n')
+        return path
+
+    def export_prometheus(self, path=None):
+        """Write the statistics in the Prometheus text format (replaced atomically, for a textfile collector)"""
+        path = path or os.path.join(METRICS_DIR, PROMETHEUS_FILE)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        lines = ['# HELP cord19_stage_seconds Time spent in each stage.',
+                 '# TYPE cord19_stage_seconds histogram']
+        with self._lock:
+            stats = sorted(self._stats.items())
+            for stage, s in stats:
+                cumulative = 0
+                for bound, n in zip(LATENCY_BUCKETS + ('+Inf',), s.buckets):
+                    cumulative += n
+                    lines.append(f'cord19_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'cord19_stage_seconds_sum{{stage="{stage}"}} {s.seconds}')
+                lines.append(f'cord19_stage_seconds_count{{stage="{stage}"}} {s.count}')
+            lines += ['# HELP cord19_stage_rows_total Rows processed by each stage.',
+                      '# TYPE cord19_stage_rows_total counter']
+            lines += [f'cord19_stage_rows_total{{stage="{stage}"}} {s.rows}' for stage, s in stats]
+            lines += ['# HELP cord19_stage_peak_bytes Peak memory allocated during a stage.',
+                      '# TYPE cord19_stage_peak_bytes gauge']
+            lines += [f'cord19_stage_peak_bytes{{stage="{stage}"}} {s.peak_bytes}'
+                      for stage, s in stats if s.peak_bytes is not None]
+        with open(path + '.tmp', 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(path + '.tmp', path)
+        return path
+
+    def export(self):
+        """Write both exporter files to METRICS_DIR; returns their paths"""
+        return self.export_jsonl(), self.export_prometheus()
+
+
+REGISTRY = Registry()
+_memory = threading.local()  # stack of open spans' memory baselines, per thread
+
+
+class Span:
+    """Times one run of a stage; set .rows inside the block to record how many rows it handled.
+
+    With TRACE_MEMORY the peak is of all memory traced while the span was open, so
+    spans running at the same time in other threads are included in it.
+    """
+
+    __slots__ = ('stage', 'rows', '_start', '_memory')
+
+    def __init__(self, stage, rows=None):
+        self.stage = stage
+        self.rows = rows
+
+    def __enter__(self):
+        if TRACE_MEMORY:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            stack = _memory.__dict__.setdefault('stack', [])
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1][1] = max(stack[-1][1], peak)  # the enclosing span's peak so far
+            tracemalloc.reset_peak()
+            self._memory = [current, 0]
+            stack.append(self._memory)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self._start
+        peak_bytes = None
+        if TRACE_MEMORY:
+            stack = _memory.stack
+            stack.pop()
+            peak = max(tracemalloc.get_traced_memory()[1], self._memory[1])
+            peak_bytes = peak - self._memory[0]
+            if stack:
+                stack[-1][1] = max(stack[-1][1], peak)
+        REGISTRY.record(self.stage, seconds, self.rows, peak_bytes)
+        return False
+
+
+class _NoopSpan:
+    """What timed() returns while metrics are off: nothing recorded, rows ignored"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    rows = property(lambda self: None, lambda self, value: None)
+
+
+_NOOP = _NoopSpan()
+
+
+def timed(stage, rows=None):
+    """Context manager timing a block as stage (a shared no-op while metrics are off)"""
+    return Span(stage, rows) if ENABLED else _NOOP
+
+
+def instrument(stage, rows=None):
+    """Decorator timing every call of a function as stage.
+
+    rows is an optional function of the return value giving the rows handled (such as len).
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with Span(stage) as span:
+                result = func(*args, **kwargs)
+                if rows is not None and result is not None:
+                    span.rows = rows(result)
+            return result
+        return wrapper
+    return decorate
+
+
+def report():
+    """Print the recorded statistics as a table"""
+    summary = REGISTRY.summary()
+    if not summary:
+        return
+    print(f"\n{'stage':<32} {'calls':>6} {'mean':>9} {'p95':>9} {'rows':>12} {'peak MB':>9}")
+    for stage, s in summary.items():
+        peak = f"{s['peak_mb']:9.1f}" if s['peak_mb'] is not None else f"{'-':>9}"
+        print(f"{stage:<32} {s['count']:>6} {s['mean_seconds']:8.3f}s {s['p95_seconds']:8.3f}s "
+              f"{s['rows']:>12,} {peak}")
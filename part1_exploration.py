@@ -4,60 +4,91 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 from datetime import datetime
+from cleaning import RAW_PATH, read_metadata
+from dataset_profile import ProfileBuilder, describe
+from metrics import instrument
 
-print("=== PART 1: DATA LOADING AND BASIC EXPLORATION ===\n")
-
-# 1. Download and load the data
-print("1. Loading the dataset...")
-try:
-    df = pd.read_csv('data/metadata.csv')
-    print("✅ Dataset loaded successfully!")
-except FileNotFoundError:
-    print("❌ File not found. Please download metadata.csv from Kaggle and place in data/ folder")
-    exit()
-
-# 2. Examine the first few rows and data structure
-print("\n2. First few rows of the dataset:")
-print(df.head())
-
-print("\n3. Dataset columns:")
-print(df.columns.tolist())
-
-# 3. Basic data exploration
-print("\n4. DataFrame dimensions:")
-print(f"Rows: {df.shape[0]:,}")
-print(f"Columns: {df.shape[1]}")
-
-print("\n5. Data types of each column:")
-print(df.dtypes)
-
-print("\n6. Checking for missing values in important columns:")
-important_columns = ['title', 'abstract', 'publish_time', 'authors', 'journal', 'source_x']
-missing_data = df[important_columns].isnull().sum()
-missing_percent = (missing_data / len(df)) * 100
-
-missing_df = pd.DataFrame({
-    'Missing Count': missing_data,
-    'Missing Percentage': missing_percent
-})
-print(missing_df)
-
-print("\n7. Basic statistics for numerical columns:")
-# Identify numerical columns
-numerical_cols = df.select_dtypes(include=[np.number]).columns
-if len(numerical_cols) > 0:
-    print(df[numerical_cols].describe())
-else:
-    print("No numerical columns found in the dataset")
-
-print("\n8. Sample of paper titles:")
-print(df['title'].head(10).tolist())
-
-# Save basic info for later use
-basic_info = {
-    'shape': df.shape,
-    'columns': df.columns.tolist(),
-    'missing_data': missing_df
-}
-
-print("\n✅ Part 1 completed successfully!")
\ No newline at end of file
+IMPORTANT_COLUMNS = ['title', 'abstract', 'publish_time', 'authors', 'journal', 'source_x']
+
+
+@instrument('part1.load', rows=len)
+def load_raw(path=RAW_PATH):
+    """1. Download and load the data (returns None if metadata.csv is missing)"""
+    print("1. Loading the dataset...")
+    try:
+        df = read_metadata(path)
+        print("✅ Dataset loaded successfully!")
+        return df
+    except FileNotFoundError:
+        print("❌ File not found. Please download metadata.csv from Kaggle and place in data/ folder")
+        return None
+
+
+@instrument('part1.explore')
+def explore(df, path=RAW_PATH):
+    """Print the basic exploration of the raw dataset and return the basic info.
+
+    Missing values and statistics come from the profile persisted next to the
+    file at path; it is computed in the background (while the rest is printed)
+    when the file changed since the last run.
+    """
+    profile = ProfileBuilder().submit(path, frame=df)
+
+    # 2. Examine the first few rows and data structure
+    print("\n2. First few rows of the dataset:")
+    print(df.head())
+
+    print("\n3. Dataset columns:")
+    print(df.columns.tolist())
+
+    # 3. Basic data exploration
+    print("\n4. DataFrame dimensions:")
+    print(f"Rows: {df.shape[0]:,}")
+    print(f"Columns: {df.shape[1]}")
+
+    print("\n5. Data types of each column:")
+    print(df.dtypes)
+
+    if not profile.done():
+        print("\nComputing dataset profile…")
+    profile = profile.result()
+    columns = profile['columns']
+
+    print("\n6. Checking for missing values in important columns:")
+    missing_df = pd.DataFrame({
+        'Missing Count': columns.loc[IMPORTANT_COLUMNS, 'null'],
+        'Missing Percentage': columns.loc[IMPORTANT_COLUMNS, 'null_percent']
+    })
+    print(missing_df)
+
+    print("\n7. Basic statistics for numerical columns:")
+    # Identify numerical columns
+    numerical_cols = df.select_dtypes(include=[np.number]).columns
+    if len(numerical_cols) > 0:
+        print(pd.concat([describe(profile, col) for col in numerical_cols], axis=1))
+    else:
+        print("No numerical columns found in the dataset")
+
+    print("\n8. Sample of paper titles:")
+    print(df['title'].head(10).tolist())
+
+    # Basic info for later use
+    return {
+        'shape': df.shape,
+        'columns': df.columns.tolist(),
+        'missing_data': missing_df
+    }
+
+
+def main(path=RAW_PATH):
+    print("=== PART 1: DATA LOADING AND BASIC EXPLORATION ===\n")
+    df = load_raw(path)
+    if df is None:
+        return None
+    explore(df, path)
+    print("\n✅ Part 1 completed successfully!")
+    return df
+
+
+if __name__ == "__main__":
+    main()
@@ -1,77 +1,82 @@
 # part2_cleaning.py
-import pandas as pd
-import numpy as np
-from part1_exploration import df  # Import from previous part
-
-print("=== PART 2: DATA CLEANING AND PREPARATION ===\n")
-
-# Create a copy for cleaning
-df_clean = df.copy()
-
-print("1. Original dataset shape:", df_clean.shape)
-
-# 1. Handle missing data
-print("\n2. Handling missing values...")
-
-# Strategy for each column
-missing_strategy = {
-    'title': 'drop',  # Papers without titles are not useful
-    'abstract': 'fill',  # Fill with placeholder text
-    'publish_time': 'keep',  # We'll handle dates separately
-    'authors': 'fill',  # Fill with 'Unknown'
-    'journal': 'fill',  # Fill with 'Unknown Journal'
-    'source_x': 'keep'  # Keep as is
-}
-
-# Apply strategies
-rows_before = len(df_clean)
-
-# Drop rows without titles
-df_clean = df_clean[df_clean['title'].notna()]
-print(f"Removed {rows_before - len(df_clean)} rows without titles")
-
-# Fill missing abstracts
-df_clean['abstract'] = df_clean['abstract'].fillna('No abstract available')
-
-# Fill missing authors and journals
-df_clean['authors'] = df_clean['authors'].fillna('Unknown authors')
-df_clean['journal'] = df_clean['journal'].fillna('Unknown Journal')
-
-print("3. Missing values after cleaning:")
-important_columns = ['title', 'abstract', 'publish_time', 'authors', 'journal']
-print(df_clean[important_columns].isnull().sum())
-
-# 2. Prepare data for analysis
-print("\n4. Preparing data for analysis...")
-
-# Convert publish_time to datetime
-df_clean['publish_time'] = pd.to_datetime(df_clean['publish_time'], errors='coerce')
-
-# Extract year from publication date
-df_clean['year'] = df_clean['publish_time'].dt.year
-
-# Create abstract word count
-df_clean['abstract_word_count'] = df_clean['abstract'].str.split().str.len()
-df_clean['abstract_word_count'] = df_clean['abstract_word_count'].fillna(0)
-
-# Create title word count
-df_clean['title_word_count'] = df_clean['title'].str.split().str.len()
-
-# Create a paper ID if not exists
-if 'paper_id' not in df_clean.columns:
-    df_clean['paper_id'] = range(1, len(df_clean) + 1)
-
-print("5. New columns created:")
-new_columns = ['year', 'abstract_word_count', 'title_word_count', 'paper_id']
-print(df_clean[new_columns].head())
-
-print("\n6. Data types after cleaning:")
-print(df_clean[['publish_time', 'year', 'abstract_word_count']].dtypes)
-
-print("\n7. Dataset shape after cleaning:", df_clean.shape)
-
-# Save cleaned dataset
-df_clean.to_csv('data/cleaned_metadata.csv', index=False)
-print("✅ Cleaned dataset saved to 'data/cleaned_metadata.csv'")
-
-print("\n✅ Part 2 completed successfully!")
\ No newline at end of file
+from cleaning import (RAW_PATH, CLEANED_CSV_PATH, CLEANED_PARQUET_PATH, DEFAULT_WORKERS,
+                      clean_chunk, first_publish_time, FeatureExtractor)
+from dataset import write_parquet, dataset_version
+from part1_exploration import load_raw
+from dedup import deduplicate, report
+from similarity import SIMILARITY_DIR, SimilarityIndex
+from entities import ENTITIES_DIR, EntityTables
+from metrics import instrument
+
+
+@instrument('part2.clean', rows=len)
+def clean(df, workers=DEFAULT_WORKERS):
+    """Clean the raw dataset and print what changed; returns the cleaned frame"""
+    print("1. Original dataset shape:", df.shape)
+
+    # 1. Handle missing data
+    print("\n2. Handling missing values...")
+
+    # Apply strategies (the same steps are used by the streaming mode in cleaning.py).
+    # clean_chunk() returns a new frame, so the raw data is left untouched.
+    rows_before = len(df)
+    with FeatureExtractor(workers) as extractor:
+        df_clean = clean_chunk(df, date_anchor=first_publish_time(df), extractor=extractor)
+    print(f"Removed {rows_before - len(df_clean)} rows without titles")
+
+    # Mark near-duplicate papers (same identifiers, or near-identical title and abstract)
+    df_clean, _ = deduplicate(df_clean, workers)
+    report(df_clean)
+
+    print("3. Missing values after cleaning:")
+    important_columns = ['title', 'abstract', 'publish_time', 'authors', 'journal']
+    print(df_clean[important_columns].isnull().sum())
+
+    # 2. Prepare data for analysis
+    print("\n4. Preparing data for analysis...")
+    print("Converted publish_time to datetime, extracted year and created word counts")
+
+    print("5. New columns created:")
+    new_columns = ['year', 'abstract_word_count', 'title_word_count', 'paper_id', 'cluster_id', 'canonical']
+    print(df_clean[new_columns].head())
+
+    print("\n6. Data types after cleaning:")
+    print(df_clean[['publish_time', 'year', 'abstract_word_count']].dtypes)
+
+    print("\n7. Dataset shape after cleaning:", df_clean.shape)
+    return df_clean
+
+
+@instrument('part2.save')
+def save(df_clean, parquet_path=CLEANED_PARQUET_PATH, csv_path=CLEANED_CSV_PATH, workers=DEFAULT_WORKERS):
+    """Save cleaned dataset (typed Parquet for the app and analysis, CSV as an export),
+    the paper embeddings behind the explorer's "papers like this" and the normalized
+    author and journal tables
+    """
+    write_parquet(df_clean, parquet_path)
+    print(f"✅ Cleaned dataset saved to '{parquet_path}'")
+    version = dataset_version(parquet_path)
+    SimilarityIndex.build(df_clean, version, workers).save_arrays(SIMILARITY_DIR)
+    print(f"✅ Paper embeddings saved to '{SIMILARITY_DIR}'")
+    entities = EntityTables.build(df_clean, version)
+    entities.save_arrays(ENTITIES_DIR)
+    print(f"✅ {len(entities.author_names):,} authors and {len(entities.journal_names):,} journals "
+          f"saved to '{ENTITIES_DIR}'")
+    if csv_path:
+        df_clean.to_csv(csv_path, index=False)
+        print(f"✅ CSV export saved to '{csv_path}'")
+
+
+def main(path=RAW_PATH, workers=DEFAULT_WORKERS):
+    print("=== PART 2: DATA CLEANING AND PREPARATION ===\n")
+    df = load_raw(path)
+    if df is None:
+        return None
+    df_clean = clean(df, workers)
+    save(df_clean, workers=workers)
+    print("\n✅ Part 2 completed successfully!")
+    return df_clean
+
+
+if __name__ == "__main__":
+    main()
@@ -1,128 +1,520 @@
 # part3_analysis.py
+import os
+import re
+import json
+import pickle
+import hashlib
+import argparse
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 from wordcloud import WordCloud
-import collections
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from dataset import load_cleaned
+from aggregates import load_aggregates
+from time_index import PublicationIndex
+from term_frequency import GroupedTermCounts, UNKNOWN_GROUP, count_terms
+from partitions import PARTITIONS_DIR, load_partitions, list_partitions, iter_batches
+from cleaning import DEFAULT_WORKERS
+from metrics import instrument
+
+# Columns the analysis reads from the cleaned dataset
+ANALYSIS_COLUMNS = ['journal', 'source_x', 'publish_time', 'year', 'abstract_word_count']
+OUTPUT_DIR = 'visualizations'
+DPI = 300
+
+# Headless report: each figure's inputs are hashed and the figure is redrawn only
+# when its hash differs from the one recorded in this file (in the output folder).
+# Bump FIGURES_VERSION when the drawing code changes.
+HASHES_FILE = '.figure_hashes.json'
+FIGURES_VERSION = 1
+
+# Figure families drawn in bulk from the aggregates: one papers-per-year chart per
+# top journal, one top-title-words chart per recent year
+FIGURE_FAMILIES = ('journal', 'year')
+DEFAULT_TOP_N = 10
+
+# Out-of-core mode: columns read from each partition of the partitioned dataset
+# (year and source_x are in its path, not in its files)
+PARTITION_COLUMNS = ['journal', 'publish_time', 'abstract_word_count', 'title']
+HISTOGRAM_LIMIT = 500  # abstracts shorter than this are in the length histogram
 
 # Set up plotting style
 plt.style.use('default')
 sns.set_palette("husl")
 
-print("=== PART 3: DATA ANALYSIS AND VISUALIZATION ===\n")
-
-# Load cleaned data
-df_clean = pd.read_csv('data/cleaned_metadata.csv')
-df_clean['publish_time'] = pd.to_datetime(df_clean['publish_time'])
-
-print("1. Performing basic analysis...")
-
-# 1. Basic analysis
-# Count papers by publication year
-yearly_counts = df_clean['year'].value_counts().sort_index()
-print("\nPublications by year:")
-for year, count in yearly_counts.items():
-    if pd.notna(year):
-        print(f"  {int(year)}: {count:,} papers")
-
-# Identify top journals
-top_journals = df_clean['journal'].value_counts().head(10)
-print("\nTop 10 journals:")
-for journal, count in top_journals.items():
-    print(f"  {journal}: {count:,} papers")
-
-# Most frequent words in titles
-print("\nAnalyzing frequent words in titles...")
-all_titles = ' '.join(df_clean['title'].dropna().astype(str))
-words = all_titles.lower().split()
-# Remove common stop words
-stop_words = {'the', 'and', 'of', 'in', 'to', 'a', 'for', 'with', 'on', 'by', 
-              'as', 'an', 'from', 'at', 'that', 'is', 'are', 'this', 'was', 'were'}
-filtered_words = [word for word in words if word not in stop_words and len(word) > 2]
-word_freq = collections.Counter(filtered_words).most_common(20)
-
-print("Top 20 words in titles:")
-for word, count in word_freq:
-    print(f"  {word}: {count}")
-
-# 2. Create visualizations
-print("\n2. Creating visualizations...")
-
-# Create a figure with multiple subplots
-fig, axes = plt.subplots(2, 2, figsize=(15, 12))
-fig.suptitle('CORD-19 Dataset Analysis', fontsize=16, fontweight='bold')
-
-# Plot 1: Publications over time
-ax1 = axes[0, 0]
-yearly_counts = df_clean['year'].value_counts().sort_index()
-ax1.bar(yearly_counts.index, yearly_counts.values, color='skyblue', edgecolor='black')
-ax1.set_title('Number of Publications per Year')
-ax1.set_xlabel('Year')
-ax1.set_ylabel('Number of Papers')
-ax1.tick_params(axis='x', rotation=45)
-
-# Plot 2: Top publishing journals
-ax2 = axes[0, 1]
-top_journals = df_clean['journal'].value_counts().head(10)
-ax2.barh(range(len(top_journals)), top_journals.values)
-ax2.set_yticks(range(len(top_journals)))
-ax2.set_yticklabels(top_journals.index)
-ax2.set_title('Top 10 Journals by Publication Count')
-ax2.set_xlabel('Number of Papers')
-
-# Plot 3: Distribution by source
-ax3 = axes[1, 0]
-source_counts = df_clean['source_x'].value_counts().head(8)
-ax3.pie(source_counts.values, labels=source_counts.index, autopct='%1.1f%%')
-ax3.set_title('Paper Distribution by Source (Top 8)')
-
-# Plot 4: Abstract word count distribution
-ax4 = axes[1, 1]
-abstract_lengths = df_clean['abstract_word_count']
-ax4.hist(abstract_lengths[abstract_lengths < 500], bins=50, alpha=0.7, edgecolor='black')
-ax4.set_title('Distribution of Abstract Word Counts')
-ax4.set_xlabel('Word Count')
-ax4.set_ylabel('Frequency')
-
-plt.tight_layout()
-plt.savefig('visualizations/basic_analysis.png', dpi=300, bbox_inches='tight')
-plt.show()
-
-# 3. Word cloud of paper titles
-print("\n3. Generating word cloud...")
-plt.figure(figsize=(12, 8))
-wordcloud = WordCloud(width=800, height=400, background_color='white', 
-                      max_words=100, colormap='viridis').generate(all_titles)
-plt.imshow(wordcloud, interpolation='bilinear')
-plt.axis('off')
-plt.title('Word Cloud of Paper Titles', fontsize=16, pad=20)
-plt.tight_layout()
-plt.savefig('visualizations/wordcloud.png', dpi=300, bbox_inches='tight')
-plt.show()
-
-# 4. Additional analysis - Monthly trends for recent years
-print("\n4. Additional analysis - Monthly trends...")
-recent_data = df_clean[df_clean['year'] >= 2019].copy()
-recent_data['month'] = recent_data['publish_time'].dt.to_period('M')
-monthly_trend = recent_data['month'].astype(str).value_counts().sort_index()
-
-plt.figure(figsize=(12, 6))
-plt.plot(monthly_trend.index, monthly_trend.values, marker='o', linewidth=2, markersize=4)
-plt.title('Monthly Publication Trend (2019-2023)')
-plt.xlabel('Month')
-plt.ylabel('Number of Papers')
-plt.xticks(rotation=45, ha='right')
-plt.grid(True, alpha=0.3)
-plt.tight_layout()
-plt.savefig('visualizations/monthly_trend.png', dpi=300, bbox_inches='tight')
-plt.show()
-
-print("\n5. Summary Statistics:")
-print(f"Total papers analyzed: {len(df_clean):,}")
-print(f"Time period: {df_clean['year'].min()} - {df_clean['year'].max()}")
-print(f"Average abstract length: {df_clean['abstract_word_count'].mean():.1f} words")
-print(f"Unique journals: {df_clean['journal'].nunique():,}")
-
-print("\n✅ Part 3 completed successfully!")
-print("📊 Visualizations saved to 'visualizations/' folder")
\ No newline at end of file
+
+@instrument('part3.analyze')
+def analyze(df_clean, title_terms, publications=None):
+    """1. Basic analysis: counts per year, top journals and frequent title words.
+
+    publications is the PublicationIndex from the aggregates; built from df_clean if omitted.
+    """
+    print("1. Performing basic analysis...")
+
+    # Count papers by publication year, identify top journals, most frequent words in titles
+    yearly_counts = df_clean['year'].value_counts().sort_index()
+    top_journals = df_clean['journal'].value_counts().head(10)
+    word_freq = title_terms.most_common(20)
+    print_basic_analysis(yearly_counts, top_journals, word_freq)
+
+    # Monthly trends for recent years (prefix sums over publication days, no row scan)
+    if publications is None:
+        publications = PublicationIndex.from_dates(df_clean['publish_time'])
+    monthly_trend = publications.counts('month', start='2019-01-01')
+    monthly_trend.index = monthly_trend.index.astype(str)
+
+    # Abstract lengths as histogram counts, so the figures never need the rows
+    abstract_lengths = df_clean['abstract_word_count']
+    abstract_histogram = np.histogram(abstract_lengths[abstract_lengths < 500].dropna(), bins=50)
+
+    return {
+        'yearly_counts': yearly_counts,
+        'top_journals': top_journals,
+        'source_counts': df_clean['source_x'].value_counts().head(8),
+        'word_freq': word_freq,
+        'monthly_trend': monthly_trend,
+        'abstract_histogram': abstract_histogram,
+    }
+
+
+def print_basic_analysis(yearly_counts, top_journals, word_freq):
+    print("\nPublications by year:")
+    for year, count in yearly_counts.items():
+        if pd.notna(year):
+            print(f"  {int(year)}: {count:,} papers")
+
+    print("\nTop 10 journals:")
+    for journal, count in top_journals.items():
+        print(f"  {journal}: {count:,} papers")
+
+    print("\nAnalyzing frequent words in titles...")
+    print("Top 20 words in titles:")
+    for word, count in word_freq:
+        print(f"  {word}: {count}")
+
+
+def _partition_counts(paths):
+    """Worker: additive counts over one partition, read a batch at a time"""
+    counts = {'papers': 0, 'abstract_sum': 0.0, 'abstract_count': 0,
+              'lengths': np.zeros(HISTOGRAM_LIMIT, dtype=np.int64)}
+    journals, days, terms = [], [], []
+    for batch in iter_batches(paths, PARTITION_COLUMNS):
+        df = batch.to_pandas()
+        words = df['abstract_word_count'].dropna()
+        counts['papers'] += len(df)
+        counts['abstract_sum'] += float(words.sum())
+        counts['abstract_count'] += len(words)
+        short = words[(words >= 0) & (words < HISTOGRAM_LIMIT)].to_numpy(dtype=np.int64)
+        counts['lengths'] += np.bincount(short, minlength=HISTOGRAM_LIMIT)
+        journals.append(df['journal'].value_counts())
+        days.append(df['publish_time'].dropna().dt.normalize().value_counts())
+        title_terms = count_terms(df['title'])
+        terms.append(pd.Series(title_terms.counts, index=title_terms.terms))
+
+    def merged(parts, dtype):
+        parts = [part for part in parts if len(part)]
+        return pd.concat(parts).groupby(level=0).sum() if parts else pd.Series(dtype=dtype)
+
+    counts['journal_counts'] = merged(journals, 'int64')
+    counts['day_counts'] = merged(days, 'int64')
+    counts['title_terms'] = merged(terms, 'int64')
+    return counts
+
+
+def _histogram_from_lengths(lengths):
+    """np.histogram(..., bins=50) of the abstract lengths counted in lengths[word count]"""
+    present = np.flatnonzero(lengths)
+    if len(present) == 0:
+        return np.histogram(np.zeros(0), bins=50)
+    edges = np.linspace(present[0], present[-1], 51)
+    counts, edges = np.histogram(np.arange(len(lengths)), bins=edges, weights=lengths)
+    return counts.astype(np.int64), edges
+
+
+def _descending(series):
+    return series.astype('int64').sort_values(ascending=False, kind='stable')
+
+
+@instrument('part3.analyze_partitioned')
+def analyze_partitioned(directory=PARTITIONS_DIR, start_year=None, end_year=None, workers=DEFAULT_WORKERS):
+    """1. Basic analysis out of core, over the partitioned dataset (see partitions.py).
+
+    Only the partitions within [start_year, end_year] are read; each is counted
+    by a worker, a batch at a time, and the counts are merged. Returns the same
+    results as analyze(), plus the aggregates the figure families and the summary use.
+    """
+    print("1. Performing basic analysis (out of core)...")
+    partitions = list_partitions(directory, start_year, end_year)
+    print(f"Reading {len(partitions)} of {len(list_partitions(directory))} partitions (year x source)")
+
+    paths = [files for _, _, files in partitions]
+    if workers > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(min(workers, len(paths))) as executor:
+            counts = list(executor.map(_partition_counts, paths))
+    else:
+        counts = [_partition_counts(files) for files in paths]
+
+    # Papers per year and per source follow from the partition keys
+    keys = pd.DataFrame([(year, source, c['papers']) for (year, source, _), c in zip(partitions, counts)],
+                        columns=['year', 'source_x', 'count'])
+    yearly_counts = keys.dropna(subset=['year']).astype({'year': 'int64'}).groupby('year')['count'].sum()
+    source_counts = _descending(keys.dropna(subset=['source_x']).groupby('source_x')['count'].sum())
+
+    journal_parts = [(year, c['journal_counts']) for (year, _, _), c in zip(partitions, counts)]
+    journal_counts = pd.concat([part for _, part in journal_parts] or [pd.Series(dtype='int64')])
+    journal_counts = _descending(journal_counts.groupby(level=0).sum()).rename_axis('journal')
+    journal_year_counts = pd.concat(
+        [part.set_axis(pd.MultiIndex.from_product([part.index, [int(year)]], names=['journal', 'year']))
+         for year, part in journal_parts if year is not None and len(part)]
+        or [pd.Series(dtype='int64', index=pd.MultiIndex.from_arrays([[], []], names=['journal', 'year']))]
+    ).groupby(level=['journal', 'year']).sum().astype('int64').rename('count')
+
+    # Title words per year (as in the aggregates); the partitions of a year are summed
+    term_parts = [c['title_terms'].set_axis(pd.MultiIndex.from_product(
+                      [[UNKNOWN_GROUP if year is None else int(year)], c['title_terms'].index]))
+                  for (year, _, _), c in zip(partitions, counts) if len(c['title_terms'])]
+    title_terms_by_year = (GroupedTermCounts.from_series(pd.concat(term_parts).groupby(level=[0, 1]).sum())
+                           if term_parts else GroupedTermCounts([], [], []))
+    title_terms = title_terms_by_year.total()
+
+    word_freq = title_terms.most_common(20)
+    top_journals = journal_counts.head(10)
+    print_basic_analysis(yearly_counts, top_journals, word_freq)
+
+    day_counts = pd.concat([c['day_counts'] for c in counts] or [pd.Series(dtype='int64')])
+    publications = PublicationIndex.from_day_counts(day_counts.groupby(level=0).sum().astype('int64'))
+    monthly_trend = publications.counts('month', start='2019-01-01')
+    monthly_trend.index = monthly_trend.index.astype(str)
+
+    abstract_count = sum(c['abstract_count'] for c in counts)
+    results = {
+        'yearly_counts': yearly_counts,
+        'top_journals': top_journals,
+        'source_counts': source_counts.head(8),
+        'word_freq': word_freq,
+        'monthly_trend': monthly_trend,
+        'abstract_histogram': _histogram_from_lengths(sum(c['lengths'] for c in counts)),
+    }
+    aggregates = {
+        'total_papers': int(keys['count'].sum()),
+        'year_counts': yearly_counts,
+        'journal_counts': journal_counts,
+        'journal_year_counts': journal_year_counts,
+        'title_terms_by_year': title_terms_by_year,
+        'year_min': int(yearly_counts.index.min()) if len(yearly_counts) else None,
+        'year_max': int(yearly_counts.index.max()) if len(yearly_counts) else None,
+        'abstract_mean': sum(c['abstract_sum'] for c in counts) / abstract_count if abstract_count else float('nan'),
+        'unique_journals': int(len(journal_counts)),
+    }
+    return results, aggregates
+
+
+@instrument('part3.plot_basic_analysis')
+def plot_basic_analysis(results):
+    """2x2 grid: publications per year, top journals, sources and abstract lengths"""
+    # Create a figure with multiple subplots
+    fig, axes = plt.subplots(2, 2, figsize=(15, 12))
+    fig.suptitle('CORD-19 Dataset Analysis', fontsize=16, fontweight='bold')
+
+    # Plot 1: Publications over time
+    ax1 = axes[0, 0]
+    yearly_counts = results['yearly_counts']
+    ax1.bar(yearly_counts.index, yearly_counts.values, color='skyblue', edgecolor='black')
+    ax1.set_title('Number of Publications per Year')
+    ax1.set_xlabel('Year')
+    ax1.set_ylabel('Number of Papers')
+    ax1.tick_params(axis='x', rotation=45)
+
+    # Plot 2: Top publishing journals
+    ax2 = axes[0, 1]
+    top_journals = results['top_journals']
+    ax2.barh(range(len(top_journals)), top_journals.values)
+    ax2.set_yticks(range(len(top_journals)))
+    ax2.set_yticklabels(top_journals.index)
+    ax2.set_title('Top 10 Journals by Publication Count')
+    ax2.set_xlabel('Number of Papers')
+
+    # Plot 3: Distribution by source
+    ax3 = axes[1, 0]
+    source_counts = results['source_counts']
+    ax3.pie(source_counts.values, labels=source_counts.index, autopct='%1.1f%%')
+    ax3.set_title('Paper Distribution by Source (Top 8)')
+
+    # Plot 4: Abstract word count distribution (precomputed bins, drawn as a histogram)
+    ax4 = axes[1, 1]
+    counts, edges = results['abstract_histogram']
+    ax4.hist(edges[:-1], edges, weights=counts, alpha=0.7, edgecolor='black')
+    ax4.set_title('Distribution of Abstract Word Counts')
+    ax4.set_xlabel('Word Count')
+    ax4.set_ylabel('Frequency')
+
+    plt.tight_layout()
+    return fig
+
+
+@instrument('part3.plot_wordcloud')
+def plot_wordcloud(frequencies):
+    """Word cloud of paper titles, from {word: count}"""
+    fig = plt.figure(figsize=(12, 8))
+    wordcloud = WordCloud(width=800, height=400, background_color='white', 
+                          max_words=100, colormap='viridis').generate_from_frequencies(frequencies)
+    plt.imshow(wordcloud, interpolation='bilinear')
+    plt.axis('off')
+    plt.title('Word Cloud of Paper Titles', fontsize=16, pad=20)
+    plt.tight_layout()
+    return fig
+
+
+@instrument('part3.plot_monthly_trend')
+def plot_monthly_trend(monthly_trend):
+    """Monthly publication trend for recent years"""
+    fig = plt.figure(figsize=(12, 6))
+    plt.plot(monthly_trend.index, monthly_trend.values, marker='o', linewidth=2, markersize=4)
+    plt.title('Monthly Publication Trend (2019-2023)')
+    plt.xlabel('Month')
+    plt.ylabel('Number of Papers')
+    plt.xticks(rotation=45, ha='right')
+    plt.grid(True, alpha=0.3)
+    plt.tight_layout()
+    return fig
+
+
+def plot_journal_trend(journal, yearly_counts):
+    """Papers per year of one journal"""
+    fig, ax = plt.subplots(figsize=(10, 5))
+    ax.bar(yearly_counts.index, yearly_counts.values, color='skyblue', edgecolor='black')
+    ax.set_title(f'Publications per Year: {journal}')
+    ax.set_xlabel('Year')
+    ax.set_ylabel('Number of Papers')
+    fig.tight_layout()
+    return fig
+
+
+def plot_year_words(year, word_freq):
+    """Most frequent title words of one year, from [(word, count)]"""
+    fig, ax = plt.subplots(figsize=(10, 6))
+    words = [word for word, _ in word_freq][::-1]
+    ax.barh(words, [count for _, count in word_freq][::-1])
+    ax.set_title(f'Top {len(word_freq)} Title Words in {year}')
+    ax.set_xlabel('Occurrences')
+    fig.tight_layout()
+    return fig
+
+
+def _slug(text):
+    return re.sub(r'[^a-z0-9]+', '_', str(text).lower()).strip('_')[:60]
+
+
+def figure_jobs(results, title_terms, aggregates=None, families=(), top_n=DEFAULT_TOP_N):
+    """Every figure of the report as (file name, plot function, arguments).
+
+    The arguments are small (counts, not rows), so a job is cheap to hash and to
+    send to a worker process. The families are drawn from the aggregates.
+    """
+    basic = {key: results[key] for key in ('yearly_counts', 'top_journals', 'source_counts', 'abstract_histogram')}
+    jobs = [
+        ('basic_analysis.png', plot_basic_analysis, (basic,)),
+        ('wordcloud.png', plot_wordcloud, (title_terms.to_frequencies(100),)),
+        ('monthly_trend.png', plot_monthly_trend, (results['monthly_trend'],)),
+    ]
+    if 'journal' in families:
+        journal_years = aggregates['journal_year_counts']
+        for rank, journal in enumerate(aggregates['journal_counts'].head(top_n).index, 1):
+            yearly_counts = journal_years.xs(journal, level='journal') if journal in journal_years.index else journal_years[:0]
+            jobs.append((f'journal_trend_{rank:02d}_{_slug(journal)}.png', plot_journal_trend,
+                         (journal, yearly_counts)))
+    if 'year' in families:
+        terms_by_year = aggregates['title_terms_by_year']
+        for year in aggregates['year_counts'].index[-top_n:]:
+            jobs.append((f'title_words_{int(year)}.png', plot_year_words,
+                         (int(year), terms_by_year.select(groups=[year]).most_common(20))))
+    return jobs
+
+
+def _by_value(value):
+    """Plain, picklable form of a figure argument that depends on its values only.
+
+    pandas objects pickle differently once their internal caches are filled (drawing
+    a figure fills them), so they are reduced to their labels and values first.
+    """
+    if isinstance(value, pd.Series):
+        return ('series', value.name, str(value.dtype), _by_value(value.index), value.tolist())
+    if isinstance(value, pd.Index):
+        return ('index', value.names, str(value.dtype), value.tolist())
+    if isinstance(value, pd.DataFrame):
+        return ('frame', _by_value(value.index), [_by_value(value[col]) for col in value.columns])
+    if isinstance(value, np.ndarray):
+        return ('array', str(value.dtype), value.shape, value.tobytes())
+    if isinstance(value, (list, tuple)):
+        return type(value).__name__, [_by_value(item) for item in value]
+    if isinstance(value, dict):
+        return 'dict', [(key, _by_value(item)) for key, item in value.items()]
+    return value
+
+
+def figure_hash(name, plot, args, dpi):
+    """Content hash of everything a figure is drawn from"""
+    payload = pickle.dumps((FIGURES_VERSION, name, plot.__name__, _by_value(args), dpi), protocol=4)
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def _headless():
+    plt.switch_backend('Agg')
+
+
+def _render_figure(plot, args, path, dpi):
+    """Worker: draw one figure and save it (non-interactive backend, nothing shown)"""
+    fig = plot(*args)
+    fig.savefig(path, dpi=dpi, bbox_inches='tight')
+    plt.close(fig)
+    return path
+
+
+@instrument('part3.render_report')
+def render_report(jobs, output_dir=OUTPUT_DIR, workers=DEFAULT_WORKERS, dpi=DPI):
+    """Headless report: draws the figures whose inputs changed, concurrently in worker processes.
+
+    Returns the paths of the figures drawn; the others were up to date.
+    """
+    hashes_path = os.path.join(output_dir, HASHES_FILE)
+    try:
+        with open(hashes_path) as f:
+            saved = json.load(f)
+    except (FileNotFoundError, ValueError):
+        saved = {}
+
+    hashes, pending = {}, []
+    for name, plot, args in jobs:
+        path = os.path.join(output_dir, name)
+        hashes[name] = figure_hash(name, plot, args, dpi)
+        if saved.get(name) != hashes[name] or not os.path.exists(path):
+            pending.append((plot, args, path))
+    print(f"Drawing {len(pending)} of {len(jobs)} figures ({len(jobs) - len(pending)} unchanged)")
+
+    workers = min(workers, len(pending))
+    if workers > 1:
+        with ProcessPoolExecutor(workers, initializer=_headless) as executor:
+            drawn = list(executor.map(_render_figure, *zip(*pending), [dpi] * len(pending)))
+    else:
+        _headless()
+        drawn = [_render_figure(plot, args, path, dpi) for plot, args, path in pending]
+
+    # Figures that were not redrawn keep their hash; old entries of other figures are kept too
+    with open(hashes_path + '.tmp', 'w') as f:
+        json.dump({**saved, **hashes}, f, indent=1, sort_keys=True)
+    os.replace(hashes_path + '.tmp', hashes_path)
+    return drawn
+
+
+def _save(fig, path, show, dpi=DPI):
+    fig.savefig(path, dpi=dpi, bbox_inches='tight')
+    if show:
+        plt.show()
+    plt.close(fig)
+
+
+def print_summary(total, year_min, year_max, abstract_mean, unique_journals):
+    """5. Summary statistics"""
+    print("\n5. Summary Statistics:")
+    print(f"Total papers analyzed: {total:,}")
+    print(f"Time period: {year_min} - {year_max}")
+    print(f"Average abstract length: {abstract_mean:.1f} words")
+    print(f"Unique journals: {unique_journals:,}")
+
+
+def summarize(df_clean):
+    print_summary(len(df_clean), df_clean['year'].min(), df_clean['year'].max(),
+                  df_clean['abstract_word_count'].mean(), df_clean['journal'].nunique())
+
+
+def draw_figures(jobs, output_dir, show, workers):
+    """2-4. Figures one by one in a window (show), or headless by render_report"""
+    print("\n2-4. Creating visualizations, word cloud and monthly trends...")
+    if show:
+        for name, plot, args in jobs:
+            _save(plot(*args), os.path.join(output_dir, name), show)
+    else:
+        render_report(jobs, output_dir, workers)
+
+
+def run(df_clean, title_terms, output_dir=OUTPUT_DIR, show=True, publications=None,
+        aggregates=None, families=(), top_n=DEFAULT_TOP_N, workers=DEFAULT_WORKERS):
+    """Full part 3: analysis, the figures and the summary; returns the analysis results.
+
+    With show the figures are drawn one by one and shown in a window; otherwise
+    they are rendered headless by render_report (in parallel, unchanged ones skipped).
+    families needs the aggregates.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    results = analyze(df_clean, title_terms, publications)
+    jobs = figure_jobs(results, title_terms, aggregates, families, top_n)
+
+    # 2. Create visualizations, 3. word cloud of paper titles, 4. monthly trends
+    # for recent years (and the figure families, if any)
+    draw_figures(jobs, output_dir, show, workers)
+
+    summarize(df_clean)
+    return results
+
+
+def run_partitioned(directory=PARTITIONS_DIR, output_dir=OUTPUT_DIR, show=False, start_year=None, end_year=None,
+                    families=(), top_n=DEFAULT_TOP_N, workers=DEFAULT_WORKERS):
+    """Part 3 out of core: the same figures and summary from the partitioned dataset.
+
+    Nothing is loaded whole; with a year range only the partitions inside it are read.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    results, aggregates = analyze_partitioned(directory, start_year, end_year, workers)
+    title_terms = aggregates['title_terms_by_year'].total()
+    draw_figures(figure_jobs(results, title_terms, aggregates, families, top_n), output_dir, show, workers)
+    print_summary(aggregates['total_papers'], aggregates['year_min'], aggregates['year_max'],
+                  aggregates['abstract_mean'], aggregates['unique_journals'])
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Part 3: analysis and figures of the cleaned CORD-19 data")
+    parser.add_argument('--report', action='store_true',
+                        help="headless: render the figures in worker processes without showing them, "
+                             "skipping those whose inputs did not change")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="processes used in report mode")
+    parser.add_argument('--families', nargs='*', choices=FIGURE_FAMILIES, default=[],
+                        help="figure families to draw as well: one chart per top journal and/or per recent year")
+    parser.add_argument('--top-n', type=int, default=DEFAULT_TOP_N,
+                        help="journals (or most recent years) in each figure family")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--out-of-core', action='store_true',
+                        help="analyze the dataset partitioned by year and source (written on first use) "
+                             "partition by partition, in --workers processes, without loading it whole")
+    parser.add_argument('--start-year', type=int, help="out of core: first year analyzed")
+    parser.add_argument('--end-year', type=int, help="out of core: last year analyzed")
+    args = parser.parse_args(argv)
+    if (args.start_year is not None or args.end_year is not None) and not args.out_of_core:
+        parser.error("--start-year and --end-year need --out-of-core")
+
+    print("=== PART 3: DATA ANALYSIS AND VISUALIZATION ===\n")
+
+    if args.out_of_core:
+        # Partition by partition; the partitioned copy is rewritten when the cleaned data changed
+        results = run_partitioned(load_partitions(), args.output_dir, show=not args.report,
+                                  start_year=args.start_year, end_year=args.end_year,
+                                  families=args.families, top_n=args.top_n, workers=args.workers)
+    else:
+        # Load cleaned data (only the columns used, already typed).
+        # Title word counts (stop words removed) are kept with the aggregates, which
+        # incremental.py updates from the delta when a new snapshot lands.
+        df_clean = load_cleaned(ANALYSIS_COLUMNS)
+        aggregates = load_aggregates()
+        results = run(df_clean, aggregates['title_terms_by_year'].total(), args.output_dir, show=not args.report,
+                      publications=aggregates['publications'], aggregates=aggregates, families=args.families,
+                      top_n=args.top_n, workers=args.workers)
+
+    print("\n✅ Part 3 completed successfully!")
+    print(f"📊 Visualizations saved to '{args.output_dir}/' folder")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# partitions.py - Cleaned dataset partitioned by year and source, for out-of-core analysis
+import os
+import json
+import shutil
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from cleaning import CLEANED_PARQUET_PATH
+from dataset import CATEGORY_COLUMNS, TOMBSTONE_COLUMN, dataset_version
+from metrics import instrument
+
+PARTITIONS_DIR = 'data/partitioned'
+PARTITIONS_FORMAT = 1
+HEADER_FILE = 'partitions.json'
+
+# Rows read (and written) at a time, to bound memory whatever the dataset size
+BATCH_ROWS = 65_536
+
+# Hive layout: data/partitioned/year=2020/source_x=PMC/part-0.parquet. Rows without
+# a year (or source) go to the __HIVE_DEFAULT_PARTITION__ directory. The year key is
+# int32: pyarrow mis-groups int16 keys that contain nulls.
+PARTITION_TYPES = {'year': pa.int32(), 'source_x': pa.string()}
+PARTITIONING = ds.partitioning(pa.schema(list(PARTITION_TYPES.items())), flavor='hive')
+
+
+def _live_batches(parquet):
+    """Record batches of the cleaned file without tombstoned rows, categories as plain strings"""
+    for batch in parquet.iter_batches(batch_size=BATCH_ROWS):
+        table = pa.Table.from_batches([batch])
+        if TOMBSTONE_COLUMN in table.column_names:
+            table = table.filter(pc.invert(pc.fill_null(table[TOMBSTONE_COLUMN], False)))
+            table = table.drop([TOMBSTONE_COLUMN])
+        # Each batch has its own dictionary; strings are written the same way by every batch
+        types = {**{col: pa.string() for col in CATEGORY_COLUMNS}, **PARTITION_TYPES}
+        for col, type_ in types.items():
+            if col in table.column_names:
+                position = table.column_names.index(col)
+                table = table.set_column(position, col, table[col].cast(type_))
+        yield from table.to_batches()
+
+
+@instrument('partitions.write')
+def write_partitions(version=None, source=CLEANED_PARQUET_PATH, directory=PARTITIONS_DIR):
+    """Rewrite the cleaned Parquet file as a dataset partitioned by year and source_x.
+
+    The file is streamed a batch at a time. The new dataset is written next to the
+    old one and swapped in when complete; its header records the dataset version.
+    """
+    version = version or dataset_version()
+    parquet = pq.ParquetFile(source)
+    batches = _live_batches(parquet)
+    first = next(batches, None)
+    if first is None:
+        types = {**{col: pa.string() for col in CATEGORY_COLUMNS}, **PARTITION_TYPES}
+        schema = pa.schema([pa.field(f.name, types.get(f.name, f.type))
+                            for f in parquet.schema_arrow if f.name != TOMBSTONE_COLUMN])
+    else:
+        schema = first.schema
+
+    def all_batches():
+        if first is not None:
+            yield first
+            yield from batches
+
+    staging = directory + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    ds.write_dataset(all_batches(), staging, schema=schema, format='parquet', partitioning=PARTITIONING,
+                     basename_template='part-{i}.parquet', max_rows_per_group=BATCH_ROWS)
+    os.makedirs(staging, exist_ok=True)
+    with open(os.path.join(staging, HEADER_FILE), 'w') as f:
+        json.dump({'version': version, 'format': PARTITIONS_FORMAT}, f)
+
+    if os.path.exists(directory):
+        os.replace(directory, directory + '.old')
+    os.replace(staging, directory)
+    shutil.rmtree(directory + '.old', ignore_errors=True)
+    return directory
+
+
+def partitions_version(directory=PARTITIONS_DIR):
+    """Dataset version the partitioned copy was written from, or None"""
+    try:
+        with open(os.path.join(directory, HEADER_FILE)) as f:
+            header = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return header['version'] if header.get('format') == PARTITIONS_FORMAT else None
+
+
+def load_partitions(version=None, directory=PARTITIONS_DIR):
+    """Directory of the partitioned dataset for the current version, (re)writing it if needed"""
+    version = version or dataset_version()
+    if partitions_version(directory) != version:
+        write_partitions(version, directory=directory)
+    return directory
+
+
+def list_partitions(directory=PARTITIONS_DIR, start_year=None, end_year=None):
+    """[(year, source_x, [file paths])] of the partitions within the years [start_year, end_year].
+
+    Pruning uses the directory names only; no file outside the range is opened.
+    Partitions without a year are left out when a range is given. A missing year
+    or source is None.
+    """
+    dataset = ds.dataset(directory, format='parquet', partitioning=PARTITIONING,
+                         ignore_prefixes=['.', '_', HEADER_FILE])
+    condition = None
+    if start_year is not None:
+        condition = ds.field('year') >= start_year
+    if end_year is not None:
+        upper = ds.field('year') <= end_year
+        condition = upper if condition is None else condition & upper
+
+    groups = {}
+    for fragment in dataset.get_fragments(filter=condition):
+        keys = ds.get_partition_keys(fragment.partition_expression)
+        groups.setdefault((keys.get('year'), keys.get('source_x')), []).append(fragment.path)
+    return [(year, source, sorted(paths)) for (year, source), paths in groups.items()]
+
+
+def iter_batches(paths, columns, batch_size=BATCH_ROWS):
+    """Record batches of the given columns over a partition's files"""
+    for path in paths:
+        yield from pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=columns)
+
+
+if __name__ == "__main__":
+    directory = write_partitions()
+    partitions = list_partitions(directory)
+    print(f"Wrote {len(partitions):,} partitions (year x source_x) to '{directory}/'")
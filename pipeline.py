@@ -0,0 +1,185 @@
+# pipeline.py - Runs the three parts as stages, passing frames in memory and memoizing outputs
+import os
+import pickle
+import shutil
+import hashlib
+
+import part1_exploration
+import part2_cleaning
+import part3_analysis
+import metrics
+import shared_dataset
+from cleaning import RAW_PATH, CLEANED_CSV_PATH, CLEANED_PARQUET_PATH, DEFAULT_WORKERS, clean_csv_streaming
+from dataset import to_typed, load_cleaned, dataset_version
+from aggregates import compute_aggregates, load_aggregates, save_aggregates, AGGREGATE_COLUMNS
+
+STAGES = ['explore', 'clean', 'analyze', 'publish']
+CACHE_DIR = 'data/cache'
+KEEP_CLEANED = 3  # memoized cleaned datasets kept (full Parquet copies); older ones are deleted
+
+# Bump a stage's version when its code changes, so older memoized outputs are not reused
+STAGE_VERSIONS = {'explore': 1, 'clean': 2, 'analyze': 3}
+
+
+def file_hash(path, block_size=1 << 20):
+    """Content hash of a file"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Pipeline:
+    """Explore -> clean -> analyze -> publish, runnable as a whole or stage by stage.
+
+    Frames are handed from one stage to the next in memory. Each stage's output is
+    memoized under data/cache, keyed by a hash of its input file and the stage
+    version, so re-running a stage on unchanged input reuses the earlier result
+    without loading the upstream data at all.
+    """
+
+    def __init__(self, raw_path=RAW_PATH, cache_dir=CACHE_DIR, output_dir=part3_analysis.OUTPUT_DIR,
+                 workers=DEFAULT_WORKERS, streaming=False, show=False, force=False):
+        self.raw_path = raw_path
+        self.cache_dir = cache_dir
+        self.output_dir = output_dir
+        self.workers = workers
+        self.streaming = streaming
+        self.show = show
+        self.force = force
+        self.raw = None
+        self.cleaned = None
+        self.outputs = {}
+        self._hashes = {}
+
+    def _hash(self, path):
+        if path not in self._hashes:
+            self._hashes[path] = file_hash(path)
+        return self._hashes[path]
+
+    def stage_key(self, stage):
+        """Memo key: the stage, its version and the hash of its input file"""
+        source = CLEANED_PARQUET_PATH if stage == 'analyze' else self.raw_path
+        if not os.path.exists(source):
+            raise FileNotFoundError(f"Input for stage '{stage}' not found: {source}")
+        return f"{stage}-v{STAGE_VERSIONS[stage]}-{self._hash(source)}"
+
+    def _memo_path(self, key, extension):
+        return os.path.join(self.cache_dir, f"{key}.{extension}")
+
+    def _prune(self, stage, extension, keep):
+        """Delete all but the keep most recently used memoized outputs of a stage"""
+        memos = [entry for entry in os.scandir(self.cache_dir)
+                 if entry.name.startswith(f"{stage}-") and entry.name.endswith(f".{extension}")]
+        for entry in sorted(memos, key=lambda e: e.stat().st_mtime, reverse=True)[keep:]:
+            os.remove(entry.path)
+
+    def _load_raw(self):
+        if self.raw is None:
+            self.raw = part1_exploration.load_raw(self.raw_path)
+            if self.raw is None:
+                raise FileNotFoundError(self.raw_path)
+        return self.raw
+
+    def explore(self):
+        """Part 1; memoized output is the basic info dict"""
+        memo = self._memo_path(self.stage_key('explore'), 'pkl')
+        if not self.force and os.path.exists(memo):
+            with open(memo, 'rb') as f:
+                info = pickle.load(f)
+            print(f"Exploration unchanged (memoized): {info['shape'][0]:,} rows × {info['shape'][1]} columns")
+            print(info['missing_data'])
+            return info
+
+        info = part1_exploration.explore(self._load_raw(), self.raw_path)
+        with open(memo, 'wb') as f:
+            pickle.dump(info, f)
+        return info
+
+    def clean(self):
+        """Part 2; memoized output is the typed cleaned Parquet file"""
+        memo = self._memo_path(self.stage_key('clean'), 'parquet')
+        if not self.force and os.path.exists(memo):
+            print("Cleaned dataset unchanged (memoized), reusing it")
+            if not os.path.exists(CLEANED_PARQUET_PATH) or self._hash(CLEANED_PARQUET_PATH) != self._hash(memo):
+                shutil.copyfile(memo, CLEANED_PARQUET_PATH)
+                self._hashes.pop(CLEANED_PARQUET_PATH, None)
+            os.utime(memo)  # most recently used, so it is pruned last
+            self._prune('clean', 'parquet', KEEP_CLEANED)
+            return CLEANED_PARQUET_PATH
+
+        if self.streaming:
+            # Nothing is kept in memory; the analyze stage reads the columns it needs
+            clean_csv_streaming(self.raw_path, CLEANED_CSV_PATH, parquet_path=CLEANED_PARQUET_PATH,
+                                workers=self.workers)
+        else:
+            self.cleaned = part2_cleaning.clean(self._load_raw(), self.workers)
+            part2_cleaning.save(self.cleaned, workers=self.workers)
+        self._hashes.pop(CLEANED_PARQUET_PATH, None)
+        shutil.copyfile(CLEANED_PARQUET_PATH, memo)
+        self._prune('clean', 'parquet', KEEP_CLEANED)
+        return CLEANED_PARQUET_PATH
+
+    def analyze(self):
+        """Part 3; memoized output is the analysis results (missing figures are drawn again)"""
+        memo = self._memo_path(self.stage_key('analyze'), 'pkl')
+        if not self.force and os.path.exists(memo):
+            with open(memo, 'rb') as f:
+                results = pickle.load(f)
+            # The memo does not depend on the output directory, which may be new or emptied
+            title_terms = load_aggregates(dataset_version())['title_terms_by_year'].total()
+            jobs = part3_analysis.figure_jobs(results, title_terms)
+            missing = [job for job in jobs if not os.path.exists(os.path.join(self.output_dir, job[0]))]
+            if missing:
+                print(f"Analysis unchanged (memoized); drawing {len(missing)} missing figures "
+                      f"in '{self.output_dir}/'")
+                os.makedirs(self.output_dir, exist_ok=True)
+                part3_analysis.draw_figures(missing, self.output_dir, self.show, self.workers)
+            else:
+                print("Analysis unchanged (memoized); figures in "
+                      f"'{self.output_dir}/' are up to date")
+            return results
+
+        columns = sorted(set(part3_analysis.ANALYSIS_COLUMNS) | set(AGGREGATE_COLUMNS))
+        if self.cleaned is not None:
+            df_clean = to_typed(self.cleaned[columns])
+        else:
+            df_clean = load_cleaned(columns)
+
+        # The aggregates are saved too, so the Streamlit app starts warm
+        aggregates = compute_aggregates(df_clean[AGGREGATE_COLUMNS])
+        save_aggregates(aggregates, dataset_version())
+
+        results = part3_analysis.run(df_clean, aggregates['title_terms_by_year'].total(),
+                                     self.output_dir, show=self.show, publications=aggregates['publications'],
+                                     workers=self.workers)
+        with open(memo, 'wb') as f:
+            pickle.dump(results, f)
+        return results
+
+    def publish(self):
+        """Warm-start snapshot for the app; written once per cleaned dataset version.
+
+        The snapshot is always made the current one, also when it was written before,
+        so re-running the stage after a rollback switches the app back to it.
+        """
+        version = dataset_version()
+        if shared_dataset.published_snapshot(version) is not None:
+            print("Cleaned dataset unchanged, its snapshot is already written")
+        snapshot = shared_dataset.publish(version)
+        print(f"Snapshot '{snapshot}' published; the app opens it instead of loading the cleaned dataset")
+        return snapshot
+
+    def run(self, stages=STAGES):
+        """Run the selected stages in pipeline order; returns {stage: output}"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for stage in STAGES:
+            if stage in stages:
+                print(f"\n=== STAGE: {stage.upper()} ===\n")
+                with metrics.timed(f'pipeline.{stage}'):
+                    self.outputs[stage] = getattr(self, stage)()
+        if metrics.ENABLED:
+            metrics.report()
+            print("Metrics written to " + " and ".join(f"'{path}'" for path in metrics.REGISTRY.export()))
+        return self.outputs
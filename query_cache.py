@@ -0,0 +1,147 @@
+# query_cache.py - Query results shared by all app sessions (LRU + TTL, concurrent requests coalesced)
+import os
+import sys
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+import pandas as pd
+
+# Sized from the environment, so it can follow the expected peak concurrency without a code change
+DEFAULT_MAX_BYTES = int(os.environ.get('CORD19_QUERY_CACHE_MB', '64')) * 1024 * 1024
+DEFAULT_TTL = float(os.environ.get('CORD19_QUERY_CACHE_TTL', '600'))  # seconds an entry is served
+
+
+def value_nbytes(value):
+    """Approximate memory held by a cached result"""
+    if value is None:
+        return 0
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(value_nbytes(item) for item in value)
+    return sys.getsizeof(value)
+
+
+def _read_only(value):
+    """Cached arrays are shared by every session, so writing to them is an error"""
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, tuple):
+        for item in value:
+            _read_only(item)
+    return value
+
+
+def _private(value):
+    """What a caller gets: its own copy of pandas results, which cannot be made read-only"""
+    if isinstance(value, (pd.Series, pd.DataFrame)):
+        return value.copy()
+    if isinstance(value, tuple):
+        return tuple(_private(item) for item in value)
+    return value
+
+
+class QueryCache:
+    """LRU cache of query results with a time to live, bounded by total size.
+
+    Keys are normalized query parameters (including the dataset version). Safe to
+    share between sessions (threads): when several sessions ask for a key that is
+    being computed, one computes it and the others wait for its result. Results
+    must not be modified by callers: cached arrays are made read-only, and each
+    caller gets its own copy of pandas results.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0  # requests that waited for a computation already running
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()  # key -> (stored at, nbytes, value)
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, compute):
+        """Cached result for key; compute() runs on a miss, once for all concurrent callers"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if time.monotonic() - entry[0] <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return _private(entry[2])
+                self._remove(key)
+                self.expirations += 1
+            future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = self._pending[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            return _private(future.result())
+        try:
+            value = _read_only(compute())
+        except BaseException as error:
+            with self._lock:
+                del self._pending[key]
+            future.set_exception(error)
+            raise
+        with self._lock:
+            self._put(key, value)
+            del self._pending[key]
+        future.set_result(value)
+        return _private(value)
+
+    def _put(self, key, value):
+        size = value_nbytes(value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic(), size, value)
+        self.nbytes += size
+        while self.nbytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        self.nbytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        """Counters for sizing the cache: a low hit rate with many evictions means it is too small"""
+        with self._lock:
+            requests = self.hits + self.misses + self.coalesced
+            return {
+                'entries': len(self._entries),
+                'mb': round(self.nbytes / 1e6, 2),
+                'max_mb': round(self.max_bytes / 1e6, 2),
+                'ttl_seconds': self.ttl,
+                'requests': requests,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'hit_rate': round((self.hits + self.coalesced) / requests, 3) if requests else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'in_flight': len(self._pending),
+            }
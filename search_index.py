@@ -0,0 +1,216 @@
+# search_index.py - Inverted full-text index over paper titles and abstracts
+import os
+import re
+import numpy as np
+import pandas as pd
+
+from cleaning import CLEANED_PARQUET_PATH
+from dataset import load_cleaned, dataset_version
+from metrics import instrument
+
+SEARCH_INDEX_PATH = 'data/search_index.npz'
+TOKEN_PATTERN = r'[a-z0-9]+'
+PHRASE_PATTERN = re.compile(r'"([^"]*)"')
+
+# Placeholder written by the cleaning step; it is not indexed as paper text
+NO_ABSTRACT = 'No abstract available'
+
+# Documents tokenized at a time while building, to bound memory
+BUILD_BATCH_SIZE = 50_000
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text):
+    """Lower-case word tokens, the same way documents are indexed"""
+    return re.findall(TOKEN_PATTERN, text.lower())
+
+
+def document_text(documents):
+    """Title and abstract of each paper as one string"""
+    abstracts = documents['abstract'].fillna('').astype(str)
+    abstracts = abstracts.where(abstracts != NO_ABSTRACT, '')
+    return documents['title'].fillna('').astype(str) + ' ' + abstracts
+
+
+def parse_query(query):
+    """Split a query into phrases (in double quotes) and the set of all required terms"""
+    phrases = [tokenize(p) for p in PHRASE_PATTERN.findall(query)]
+    phrases = [p for p in phrases if len(p) > 1]
+    terms = tokenize(query)
+    return list(dict.fromkeys(terms)), phrases
+
+
+def query_key(query):
+    """Normalized form of a query (case, spacing and word order ignored): equal keys, equal results"""
+    terms, phrases = parse_query(query)
+    return tuple(sorted(terms)), tuple(sorted(tuple(p) for p in phrases))
+
+
+def contains_phrase(tokens, phrase):
+    """True if the phrase appears as consecutive tokens"""
+    n = len(phrase)
+    first = phrase[0]
+    return any(tokens[i:i + n] == phrase for i, tok in enumerate(tokens) if tok == first)
+
+
+class InvertedIndex:
+    """Token -> postings index stored as CSR-style arrays.
+
+    The postings for term t are doc_ids[offsets[t]:offsets[t + 1]] (sorted by document)
+    with matching term frequencies in tfs. Document ids are row positions in the
+    cleaned dataset.
+    """
+
+    def __init__(self, vocab, offsets, doc_ids, tfs, doc_lengths, version=None):
+        self.vocab = vocab
+        self.term_ids = {term: i for i, term in enumerate(vocab)}
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.avg_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        self.version = version
+
+    @property
+    def num_docs(self):
+        return len(self.doc_lengths)
+
+    @classmethod
+    def build(cls, documents, version=None, batch_size=BUILD_BATCH_SIZE):
+        """Build the index from a frame with title and abstract columns"""
+        vocab = {}
+        term_parts, doc_parts, tf_parts, length_parts = [], [], [], []
+
+        for start in range(0, len(documents), batch_size):
+            batch = documents.iloc[start:start + batch_size]
+            tokens = document_text(batch).str.lower().str.findall(TOKEN_PATTERN)
+            tokens.index = np.arange(start, start + len(batch))
+            length_parts.append(tokens.str.len().to_numpy(dtype=np.int32))
+
+            exploded = tokens.explode().dropna()
+            counts = exploded.groupby([exploded.index, exploded.values]).size()
+            docs = counts.index.get_level_values(0).to_numpy(dtype=np.int32)
+            codes, uniques = pd.factorize(counts.index.get_level_values(1))
+            global_ids = np.array([vocab.setdefault(tok, len(vocab)) for tok in uniques], dtype=np.int32)
+
+            term_parts.append(global_ids[codes])
+            doc_parts.append(docs)
+            tf_parts.append(counts.to_numpy(dtype=np.int32))
+
+        if not term_parts:
+            empty = np.zeros(0, dtype=np.int32)
+            return cls([], np.zeros(1, dtype=np.int64), empty, empty, empty, version)
+
+        term_ids = np.concatenate(term_parts)
+        # Documents are already increasing within each term, so a stable sort keeps postings ordered
+        order = np.argsort(term_ids, kind='stable')
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(vocab)), out=offsets[1:])
+
+        return cls(
+            list(vocab),
+            offsets,
+            np.concatenate(doc_parts)[order],
+            np.concatenate(tf_parts)[order],
+            np.concatenate(length_parts),
+            version,
+        )
+
+    def postings(self, term):
+        """(doc_ids, term frequencies) for a term; empty arrays if it never occurs"""
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+        start, end = self.offsets[term_id], self.offsets[term_id + 1]
+        return self.doc_ids[start:end], self.tfs[start:end]
+
+    @instrument('search.query', rows=lambda results: len(results[0]))
+    def search(self, query, documents=None, limit=None):
+        """Papers matching every term of the query, ranked by BM25.
+
+        Quoted phrases ("viral load") must appear as consecutive words; checking them
+        needs the documents the index was built from: the frame, or anything with a
+        take(positions) returning title and abstract (such as corpus.CorpusStore).
+        Returns (doc_ids, scores) ordered by descending relevance, or None when the
+        query has no searchable words.
+        """
+        terms, phrases = parse_query(query)
+        if not terms:
+            return None
+
+        postings = [self.postings(term) for term in terms]
+        postings.sort(key=lambda p: len(p[0]))
+        candidates = postings[0][0]
+        for doc_ids, _ in postings[1:]:
+            candidates = np.intersect1d(candidates, doc_ids, assume_unique=True)
+
+        if phrases and documents is not None and len(candidates):
+            candidate_tokens = document_text(documents.take(candidates)).str.lower().str.findall(TOKEN_PATTERN)
+            keep = [all(contains_phrase(tokens, p) for p in phrases) for tokens in candidate_tokens]
+            candidates = candidates[np.array(keep, dtype=bool)]
+
+        scores = self.bm25(candidates, postings)
+        order = np.argsort(-scores, kind='stable')
+        if limit is not None:
+            order = order[:limit]
+        return candidates[order], scores[order]
+
+    def bm25(self, candidates, postings):
+        """BM25 score of each candidate document for the given term postings"""
+        scores = np.zeros(len(candidates), dtype=np.float64)
+        if len(candidates) == 0:
+            return scores
+        lengths = self.doc_lengths[candidates]
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(self.avg_length, 1e-9))
+        for doc_ids, tfs in postings:
+            df = len(doc_ids)
+            idf = np.log(1 + (self.num_docs - df + 0.5) / (df + 0.5))
+            tf = tfs[np.searchsorted(doc_ids, candidates)]
+            scores += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def save(self, path=SEARCH_INDEX_PATH):
+        # The vocabulary is stored as one newline-separated UTF-8 blob
+        vocab_blob = np.frombuffer('\n'.join(self.vocab).encode('utf-8'), dtype=np.uint8)
+        np.savez(path, vocab=vocab_blob, offsets=self.offsets, doc_ids=self.doc_ids,
+                 tfs=self.tfs, doc_lengths=self.doc_lengths, version=np.array(self.version or ''))
+
+    @classmethod
+    def load(cls, path=SEARCH_INDEX_PATH):
+        with np.load(path) as data:
+            vocab = data['vocab'].tobytes().decode('utf-8').split('\n') if data['vocab'].size else []
+            return cls(vocab, data['offsets'], data['doc_ids'], data['tfs'],
+                       data['doc_lengths'], str(data['version']) or None)
+
+
+    def save_arrays(self, directory):
+        """Save as one .npy file per array, so load_arrays() can memory-map them"""
+        os.makedirs(directory, exist_ok=True)
+        vocab_blob = np.frombuffer('\n'.join(self.vocab).encode('utf-8'), dtype=np.uint8)
+        for name, array in (('vocab', vocab_blob), ('offsets', self.offsets), ('doc_ids', self.doc_ids),
+                            ('tfs', self.tfs), ('doc_lengths', self.doc_lengths)):
+            np.save(os.path.join(directory, f'{name}.npy'), array)
+
+    @classmethod
+    def load_arrays(cls, directory, version=None, mmap_mode='r'):
+        """Index saved by save_arrays(); the postings stay in the (shared) page cache"""
+        arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode)
+                  for name in ('vocab', 'offsets', 'doc_ids', 'tfs', 'doc_lengths')}
+        vocab = arrays['vocab'].tobytes().decode('utf-8').split('\n') if arrays['vocab'].size else []
+        return cls(vocab, arrays['offsets'], arrays['doc_ids'], arrays['tfs'], arrays['doc_lengths'], version)
+
+
+def load_search_index(version=None, path=SEARCH_INDEX_PATH, source=CLEANED_PARQUET_PATH):
+    """Return the search index for the current dataset version, building (from source) and saving it if needed"""
+    version = version or dataset_version()
+    if os.path.exists(path):
+        index = InvertedIndex.load(path)
+        if index.version == version:
+            return index
+
+    index = InvertedIndex.build(load_cleaned(['title', 'abstract'], path=source), version=version)
+    index.save(path)
+    return index
@@ -0,0 +1,188 @@
+# shared_dataset.py - Read-only, memory-mapped serving snapshots shared by all app processes
+import os
+import sys
+import json
+import pickle
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+from cleaning import CLEANED_PARQUET_PATH
+from dataset import load_cleaned, dataset_version
+from aggregates import AGGREGATES_FORMAT, load_aggregates, read_aggregates, save_aggregates
+from search_index import InvertedIndex, load_search_index
+from facets import FacetIndex, FACET_COLUMNS, build_facets
+from corpus import CORPUS_COLUMNS, AbstractStore, CorpusStore, to_compact, write_abstracts
+from time_index import PublicationIndex
+from dataset_profile import load_profile
+from similarity import SimilarityIndex, load_similarity_index
+from entities import EntityTables, load_entities
+from figures import render_first_page
+
+SERVING_DIR = 'data/serving'
+CURRENT_FILE = 'CURRENT'  # name of the current snapshot, replaced atomically on publish
+KEEP_SNAPSHOTS = 2  # older snapshots are deleted; processes still mapping them keep working
+# Bumped whenever the files of a snapshot change, so a version is published again
+SNAPSHOT_FORMAT = 10
+
+# Loading mode of the app: set CORD19_SHARED_DATASET=1 to serve published snapshots
+SHARED_MODE = os.environ.get('CORD19_SHARED_DATASET', '') not in ('', '0')
+
+# Files of a snapshot
+SNAPSHOT_META = 'snapshot.json'
+CLEANED_FILE = 'cleaned_metadata.parquet'
+CORPUS_FILE = 'corpus.arrow'
+AGGREGATES_FILE = 'aggregates.pkl'
+SEARCH_INDEX_DIR = 'search_index'
+FACETS_DIR = 'facets'
+PUBLICATIONS_DIR = 'publications'
+SIMILARITY_DIR = 'similarity'
+ENTITIES_DIR = 'entities'
+FIGURES_FILE = 'figures.pkl'
+
+
+def snapshot_name(version):
+    key = f'{SNAPSHOT_FORMAT}:{AGGREGATES_FORMAT}:{version}'
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def _write_snapshot(directory, version):
+    """Everything the app serves, for one dataset version, in mappable files.
+
+    Every file is derived from the copy of the cleaned dataset, so an update of the
+    live file during publishing cannot mix two versions. Indexes already built for
+    this version are reused; stale ones are rebuilt from the copy.
+    """
+    cleaned_path = os.path.join(directory, CLEANED_FILE)
+    shutil.copyfile(CLEANED_PARQUET_PATH, cleaned_path)
+    if dataset_version() != version:
+        raise RuntimeError("The cleaned dataset changed while it was being published; publish again")
+    load_profile(cleaned_path)  # persisted next to the copy, so the data summary never waits
+
+    table = pa.Table.from_pandas(to_compact(load_cleaned(CORPUS_COLUMNS, path=cleaned_path)), preserve_index=False)
+    # Uncompressed Arrow IPC, so columns can be used straight from the mapped file
+    with pa.OSFile(os.path.join(directory, CORPUS_FILE), 'wb') as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    write_abstracts(load_cleaned(['abstract'], path=cleaned_path)['abstract'], version,
+                    path=os.path.join(directory, 'abstracts.bin'),
+                    offsets_path=os.path.join(directory, 'abstracts.offsets.npy'),
+                    meta_path=os.path.join(directory, 'abstracts.json'))
+
+    aggregates = load_aggregates(version, source=cleaned_path)
+    save_aggregates(aggregates, version, os.path.join(directory, AGGREGATES_FILE))
+    with open(os.path.join(directory, FIGURES_FILE), 'wb') as f:
+        pickle.dump(render_first_page(aggregates), f)
+    load_search_index(version, source=cleaned_path).save_arrays(os.path.join(directory, SEARCH_INDEX_DIR))
+    load_similarity_index(version, source=cleaned_path).save_arrays(os.path.join(directory, SIMILARITY_DIR))
+    load_entities(version, source=cleaned_path).save_arrays(os.path.join(directory, ENTITIES_DIR))
+
+    publish_time = load_cleaned(['publish_time'], path=cleaned_path)['publish_time']
+    PublicationIndex.from_dates(publish_time).save_arrays(os.path.join(directory, PUBLICATIONS_DIR))
+
+    os.makedirs(os.path.join(directory, FACETS_DIR))
+    for col, facet in build_facets(load_cleaned(FACET_COLUMNS, path=cleaned_path)).items():
+        values, offsets, positions = facet.to_arrays()
+        with open(os.path.join(directory, FACETS_DIR, f'{col}.json'), 'w') as f:
+            json.dump(values, f)
+        np.save(os.path.join(directory, FACETS_DIR, f'{col}.offsets.npy'), offsets)
+        np.save(os.path.join(directory, FACETS_DIR, f'{col}.positions.npy'), positions)
+
+    with open(os.path.join(directory, SNAPSHOT_META), 'w') as f:
+        json.dump({'version': version, 'facets': FACET_COLUMNS}, f)
+
+
+def publish(version=None, serving_dir=SERVING_DIR, keep=KEEP_SNAPSHOTS):
+    """Write a snapshot of the current cleaned dataset and make it the one served.
+
+    Running app processes switch to it on their next rerun, without a restart.
+    Returns the snapshot directory.
+    """
+    version = version or dataset_version()
+    if version is None:
+        raise FileNotFoundError("Cleaned dataset not found. Please run the data cleaning script first.")
+
+    name = snapshot_name(version)
+    target = os.path.join(serving_dir, name)
+    if not os.path.isdir(target):
+        staging = target + '.tmp'
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        _write_snapshot(staging, version)
+        os.replace(staging, target)
+
+    # Readers see either the old or the new name, never a partial file
+    pointer = os.path.join(serving_dir, CURRENT_FILE)
+    with open(pointer + '.tmp', 'w') as f:
+        f.write(name)
+    os.replace(pointer + '.tmp', pointer)
+
+    snapshots = [entry for entry in os.scandir(serving_dir)
+                 if entry.is_dir() and not entry.name.endswith('.tmp') and entry.name != name]
+    for entry in sorted(snapshots, key=lambda e: e.stat().st_mtime, reverse=True)[keep - 1:]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+    return target
+
+
+def current_snapshot(serving_dir=SERVING_DIR):
+    """Directory of the snapshot currently served, or None when nothing is published"""
+    try:
+        with open(os.path.join(serving_dir, CURRENT_FILE)) as f:
+            return os.path.join(serving_dir, f.read().strip())
+    except FileNotFoundError:
+        return None
+
+
+def published_snapshot(version, serving_dir=SERVING_DIR):
+    """Directory of the snapshot published for version (whether current or not), or None"""
+    directory = os.path.join(serving_dir, snapshot_name(version))
+    return directory if os.path.isdir(directory) else None
+
+
+class SharedDataset:
+    """A published snapshot opened read-only through memory maps.
+
+    Nothing is copied into the process: the corpus columns are Arrow arrays over
+    the mapped file and the search index, paper embeddings, author edges and
+    facet positions are mapped NumPy arrays, so every process on the host shares
+    the same page-cache pages. Nothing is rebuilt either: a snapshot whose files are
+    out of date raises ValueError and has to be published again.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, SNAPSHOT_META)) as f:
+            meta = json.load(f)
+        self.version = meta['version']
+        self.parquet_path = os.path.join(directory, CLEANED_FILE)
+
+        table = ipc.open_file(pa.memory_map(os.path.join(directory, CORPUS_FILE), 'r')).read_all()
+        self.corpus = CorpusStore(table.to_pandas(types_mapper=pd.ArrowDtype),
+                                  AbstractStore(os.path.join(directory, 'abstracts.bin'),
+                                                os.path.join(directory, 'abstracts.offsets.npy')))
+        self.aggregates = read_aggregates(self.version, os.path.join(directory, AGGREGATES_FILE))
+        self.search_index = InvertedIndex.load_arrays(os.path.join(directory, SEARCH_INDEX_DIR), self.version)
+        self.publications = PublicationIndex.load_arrays(os.path.join(directory, PUBLICATIONS_DIR))
+        self.similarity = SimilarityIndex.load_arrays(os.path.join(directory, SIMILARITY_DIR))
+        self.entities = EntityTables.load_arrays(os.path.join(directory, ENTITIES_DIR))
+        with open(os.path.join(directory, FIGURES_FILE), 'rb') as f:
+            self.figures = pickle.load(f)  # first-page charts, {key without version: PNG bytes}
+
+        self.facets = {}
+        for col in meta['facets']:
+            base = os.path.join(directory, FACETS_DIR, col)
+            with open(f'{base}.json') as f:
+                values = json.load(f)
+            self.facets[col] = FacetIndex.from_arrays(values, np.load(f'{base}.offsets.npy'),
+                                                      np.load(f'{base}.positions.npy', mmap_mode='r'))
+
+
+if __name__ == "__main__":
+    try:
+        print(f"✅ Published '{publish()}'")
+    except FileNotFoundError as error:
+        print(error)
+        sys.exit(1)
@@ -0,0 +1,322 @@
+# similarity.py - "Papers like this": TF-IDF + truncated SVD embeddings with an IVF nearest-neighbour index
+import os
+import json
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from cleaning import CLEANED_PARQUET_PATH, DEFAULT_WORKERS, MIN_PARALLEL_ROWS
+from dataset import load_cleaned, dataset_version, swap_directory, current_directory
+from search_index import TOKEN_PATTERN, document_text
+from metrics import instrument
+
+SIMILARITY_DIR = 'data/similarity'
+# Bumped whenever the model or the stored arrays change, so older indexes get rebuilt
+SIMILARITY_FORMAT = 3
+
+# Model: TF-IDF over a vocabulary learned from a sample, reduced to DIMENSIONS by truncated SVD
+DIMENSIONS = 128
+MODEL_SAMPLE = 20_000  # papers the vocabulary, IDF and SVD are fitted on
+MAX_VOCABULARY = 30_000
+MIN_DOCUMENT_FREQUENCY = 2
+MAX_DOCUMENT_RATIO = 0.5  # terms in more than half of the papers carry no topic
+SVD_OVERSAMPLING = 10
+SVD_POWER_ITERATIONS = 2
+
+# IVF index: about sqrt(n) lists, PROBE_LISTS of them scanned per query
+PROBE_LISTS = 8
+KMEANS_SAMPLE = 50_000
+KMEANS_ITERATIONS = 10
+
+# Papers embedded at a time (and per worker task)
+EMBED_BATCH = 10_000
+
+_SEED = 19
+
+
+def term_counts(texts, vocabulary=None):
+    """Sparse (row, term, count) of every text.
+
+    Terms are ids in vocabulary (a pd.Index; other words are dropped), or the
+    words themselves when no vocabulary is given.
+    """
+    words = texts.reset_index(drop=True).str.lower().str.findall(TOKEN_PATTERN).explode().dropna()
+    if vocabulary is not None:
+        ids = vocabulary.get_indexer(words.to_numpy())
+        words = pd.Series(ids, index=words.index)[ids >= 0]
+    counts = words.groupby([words.index, words.to_numpy()]).size()
+    return (counts.index.get_level_values(0).to_numpy(dtype=np.int64),
+            counts.index.get_level_values(1).to_numpy(), counts.to_numpy(dtype=np.float32))
+
+
+def sparse_dot(rows, cols, values, dense, n_rows):
+    """(n_rows x k) product of the sparse matrix (rows, cols, values) with dense.
+
+    One weighted bincount per output column: faster than reducing the
+    (nonzeros x k) products, and never holds more than one column of them.
+    """
+    columns = np.ascontiguousarray(dense.T)
+    out = np.empty((dense.shape[1], n_rows), dtype=np.float32)
+    for j, column in enumerate(columns):
+        out[j] = np.bincount(rows, weights=values * column[cols], minlength=n_rows)
+    return out.T
+
+
+def tfidf(rows, terms, counts, idf, n_rows):
+    """Sublinear TF-IDF weights of (rows, terms, counts), each row scaled to unit length"""
+    weights = (1 + np.log(counts)) * idf[terms]
+    norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=n_rows))
+    return (weights / np.maximum(norms[rows], 1e-12)).astype(np.float32)
+
+
+def quantize(vectors):
+    """int8 vectors and a per-vector float32 scale (vector ~ codes * scale)"""
+    peak = np.abs(vectors).max(axis=1) if len(vectors) else np.zeros(0, dtype=np.float32)
+    scales = (peak / 127).astype(np.float32)
+    codes = np.round(vectors / np.maximum(scales, 1e-12)[:, None]).astype(np.int8)
+    return codes, scales
+
+
+def dequantize(codes, scales):
+    return codes.astype(np.float32) * scales[:, None]
+
+
+def nearest_centroid(vectors, centroids):
+    """IVF list of each vector: its most similar centroid"""
+    if not len(vectors):
+        return np.zeros(0, dtype=np.int32)
+    return np.argmax(vectors @ centroids.T, axis=1).astype(np.int32)
+
+
+class EmbeddingModel:
+    """Vocabulary, IDF and SVD components mapping a title + abstract to a unit vector"""
+
+    def __init__(self, vocabulary, idf, components):
+        self.vocabulary = pd.Index(vocabulary)
+        self.idf = idf
+        self.components = components  # vocabulary x DIMENSIONS
+
+    @classmethod
+    def fit(cls, texts, dimensions=DIMENSIONS):
+        """Fit on a sample of texts (randomized truncated SVD of the TF-IDF matrix)"""
+        rng = np.random.default_rng(_SEED)
+        if len(texts) > MODEL_SAMPLE:
+            texts = texts.iloc[np.sort(rng.choice(len(texts), MODEL_SAMPLE, replace=False))]
+        rows, words, counts = term_counts(texts)
+        n = len(texts)
+
+        document_frequency = pd.Series(words).value_counts()
+        repeated = document_frequency[document_frequency >= MIN_DOCUMENT_FREQUENCY]
+        document_frequency = repeated[repeated <= MAX_DOCUMENT_RATIO * n]
+        if len(document_frequency) < min(dimensions, len(repeated)):
+            # A tiny vocabulary (most terms in most papers): the cut would leave too few terms
+            # to embed most papers, so the common terms are kept
+            print(f"Warning: only {len(document_frequency)} terms are in at most {MAX_DOCUMENT_RATIO:.0%} "
+                  "of the papers; keeping the common ones too, similar papers will be less topical")
+            document_frequency = repeated
+        if len(document_frequency) == 0:
+            print("Warning: no term occurs in two papers; no similar papers will be found")
+        vocabulary = pd.Index(document_frequency.index[:MAX_VOCABULARY])
+        idf = (np.log((1 + n) / (1 + document_frequency.to_numpy()[:MAX_VOCABULARY])) + 1).astype(np.float32)
+
+        terms = vocabulary.get_indexer(words)
+        keep = terms >= 0
+        rows, terms, counts = rows[keep], terms[keep], counts[keep]
+        values = tfidf(rows, terms, counts, idf, n)
+
+        # Randomized range finder for the top right singular vectors of A (n x vocabulary)
+        rank = min(dimensions, len(vocabulary), n)
+        a_dot = lambda dense: sparse_dot(rows, terms, values, dense, n)
+        at_dot = lambda dense: sparse_dot(terms, rows, values, dense, len(vocabulary))
+        sample = a_dot(rng.standard_normal((len(vocabulary), rank + SVD_OVERSAMPLING)).astype(np.float32))
+        for _ in range(SVD_POWER_ITERATIONS):
+            sample = a_dot(at_dot(np.linalg.qr(sample)[0]))
+        basis = np.linalg.qr(sample)[0]
+        _, _, right = np.linalg.svd(at_dot(basis).T, full_matrices=False)
+        components = np.zeros((len(vocabulary), dimensions), dtype=np.float32)
+        components[:, :rank] = right[:rank].T
+        return cls(vocabulary, idf, components)
+
+    def embed(self, texts):
+        """Unit vectors of a batch of texts (all zeros for texts without known words)"""
+        rows, terms, counts = term_counts(texts, self.vocabulary)
+        vectors = sparse_dot(rows, terms, tfidf(rows, terms, counts, self.idf, len(texts)),
+                             self.components, len(texts))
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1), 1e-12)[:, None]
+
+
+def _embed_batch(model, texts):
+    return quantize(model.embed(texts))
+
+
+def compute_embeddings(texts, model, workers=DEFAULT_WORKERS):
+    """Quantized embeddings of all texts, in batches, in worker processes when worthwhile"""
+    batches = [texts.iloc[start:start + EMBED_BATCH] for start in range(0, len(texts), EMBED_BATCH)]
+    if workers > 1 and len(texts) >= MIN_PARALLEL_ROWS:
+        with ProcessPoolExecutor(workers) as executor:
+            results = list(executor.map(_embed_batch, [model] * len(batches), batches))
+    else:
+        results = [_embed_batch(model, batch) for batch in batches]
+    if not results:
+        return np.zeros((0, model.components.shape[1]), dtype=np.int8), np.zeros(0, dtype=np.float32)
+    return np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results])
+
+
+def spherical_kmeans(vectors, lists):
+    """Unit-length centroids of lists clusters of (unit) vectors"""
+    if not len(vectors):
+        return np.zeros((1, vectors.shape[1]), dtype=np.float32)  # one empty list
+    rng = np.random.default_rng(_SEED)
+    if len(vectors) > KMEANS_SAMPLE:
+        vectors = vectors[rng.choice(len(vectors), KMEANS_SAMPLE, replace=False)]
+    centroids = vectors[rng.choice(len(vectors), lists, replace=False)]
+    for _ in range(KMEANS_ITERATIONS):
+        nearest = nearest_centroid(vectors, centroids)
+        sums = sparse_dot(nearest, np.arange(len(vectors)), np.ones(len(vectors), dtype=np.float32), vectors, lists)
+        empty = ~sums.any(axis=1)
+        sums[empty] = centroids[empty]  # keep the old centroid of an empty list
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1), 1e-12)[:, None]
+    return centroids.astype(np.float32)
+
+
+class SimilarityIndex:
+    """int8 paper embeddings with an inverted-file (IVF) index over them.
+
+    Row i is the paper at row position i of the cleaned dataset. Each paper is
+    filed under its nearest centroid; a query scans the PROBE_LISTS lists whose
+    centroids are closest, so it touches about PROBE_LISTS * sqrt(n) vectors.
+    The lists are stored CSR-style: list l holds order[offsets[l]:offsets[l + 1]];
+    they are derived from the assignments unless given (as when loaded).
+    """
+
+    def __init__(self, model, codes, scales, paper_ids, centroids, assignments, version=None,
+                 order=None, offsets=None):
+        self.model = model
+        self.codes = codes
+        self.scales = scales
+        self.paper_ids = paper_ids
+        self.centroids = centroids
+        self.assignments = assignments
+        self.version = version
+        if order is None:
+            order = np.argsort(assignments, kind='stable')
+            offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(assignments, minlength=len(centroids)), out=offsets[1:])
+        self.order = order
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.codes)
+
+    def vectors(self, positions):
+        """Approximate unit vectors of the papers at positions"""
+        return dequantize(self.codes[positions], self.scales[positions])
+
+    @classmethod
+    def build(cls, frame, version=None, workers=DEFAULT_WORKERS):
+        """Fit the model and embed every paper of a frame with title, abstract and paper_id"""
+        texts = document_text(frame).reset_index(drop=True)
+        model = EmbeddingModel.fit(texts)
+        codes, scales = compute_embeddings(texts, model, workers)
+        embedded = np.flatnonzero(scales > 0)
+        centroids = spherical_kmeans(dequantize(codes[embedded], scales[embedded]),
+                                     max(1, min(len(embedded), int(np.sqrt(len(codes))))))
+        assignments = np.zeros(len(codes), dtype=np.int32)
+        for start in range(0, len(codes), EMBED_BATCH):
+            batch = slice(start, start + EMBED_BATCH)
+            assignments[batch] = nearest_centroid(dequantize(codes[batch], scales[batch]), centroids)
+        return cls(model, codes, scales, frame['paper_id'].to_numpy(dtype=np.int64), centroids, assignments, version)
+
+    def update(self, frame, changed_ids, workers=DEFAULT_WORKERS):
+        """Index over frame (the live papers, in row order) reusing the vectors of unchanged papers.
+
+        Papers that are new or in changed_ids are embedded with the existing model and
+        filed under the existing centroids; the model is refitted only by build().
+        """
+        paper_ids = frame['paper_id'].to_numpy(dtype=np.int64)
+        previous = pd.Series(np.arange(len(self.paper_ids)), index=self.paper_ids)
+        old = previous.reindex(paper_ids).to_numpy()
+        reuse = ~np.isnan(old) & ~np.isin(paper_ids, np.fromiter(changed_ids, dtype=np.int64))
+        old = old[reuse].astype(np.int64)
+
+        codes = np.zeros((len(frame), self.codes.shape[1]), dtype=np.int8)
+        scales = np.zeros(len(frame), dtype=np.float32)
+        assignments = np.zeros(len(frame), dtype=np.int32)
+        codes[reuse], scales[reuse], assignments[reuse] = self.codes[old], self.scales[old], self.assignments[old]
+
+        fresh = np.flatnonzero(~reuse)
+        if len(fresh):
+            texts = document_text(frame.iloc[fresh]).reset_index(drop=True)
+            codes[fresh], scales[fresh] = compute_embeddings(texts, self.model, workers)
+            assignments[fresh] = nearest_centroid(dequantize(codes[fresh], scales[fresh]), self.centroids)
+        return SimilarityIndex(self.model, codes, scales, paper_ids, self.centroids, assignments)
+
+    def search_vector(self, vector, k=10, probe=PROBE_LISTS, exclude=None):
+        """(positions, cosine similarities) of the k papers closest to a unit vector, best first"""
+        lists = np.argsort(-(self.centroids @ vector))[:probe]
+        candidates = np.concatenate([self.order[self.offsets[l]:self.offsets[l + 1]] for l in lists])
+        if exclude is not None:
+            candidates = candidates[candidates != exclude]
+        scores = (self.codes[candidates].astype(np.float32) @ vector) * self.scales[candidates]
+        top = np.argpartition(-scores, k)[:k] if len(scores) > k else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return candidates[top], scores[top]
+
+    @instrument('similarity.query')
+    def similar(self, position, k=10, probe=PROBE_LISTS):
+        """Papers most similar to the paper at a row position (itself left out)"""
+        if self.scales[position] == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        return self.search_vector(self.vectors([position])[0], k, probe, exclude=position)
+
+    def save_arrays(self, directory, version=None):
+        """Save as .npy files (plus a small JSON header), so load_arrays() can memory-map them.
+
+        The lists (order and offsets) are saved too, so loading sorts nothing. The
+        files are switched in whole (see dataset.swap_directory): a reader gets the
+        old index or the new one, never a mix.
+        """
+        vocabulary_blob = np.frombuffer('\n'.join(self.model.vocabulary).encode('utf-8'), dtype=np.uint8)
+
+        def write(path):
+            for name, array in (('vocabulary', vocabulary_blob), ('idf', self.model.idf),
+                                ('components', self.model.components), ('codes', self.codes),
+                                ('scales', self.scales), ('paper_ids', self.paper_ids),
+                                ('centroids', self.centroids), ('assignments', self.assignments),
+                                ('order', self.order), ('offsets', self.offsets)):
+                np.save(os.path.join(path, f'{name}.npy'), array)
+            with open(os.path.join(path, 'similarity.json'), 'w') as f:
+                json.dump({'version': version or self.version, 'format': SIMILARITY_FORMAT}, f)
+
+        swap_directory(directory, write)
+
+    @classmethod
+    def load_arrays(cls, directory, mmap_mode='r'):
+        """Index saved by save_arrays(); the vectors and lists stay in the (shared) page cache"""
+        directory = current_directory(directory)
+        with open(os.path.join(directory, 'similarity.json')) as f:
+            meta = json.load(f)
+        if meta.get('format') != SIMILARITY_FORMAT:
+            raise ValueError(f"Similarity index in '{directory}' has an old format")
+        arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode)
+                  for name in ('vocabulary', 'idf', 'components', 'codes', 'scales', 'paper_ids',
+                               'centroids', 'assignments', 'order', 'offsets')}
+        vocabulary = arrays['vocabulary'].tobytes().decode('utf-8').split('\n') if arrays['vocabulary'].size else []
+        model = EmbeddingModel(vocabulary, np.asarray(arrays['idf']), np.asarray(arrays['components']))
+        return cls(model, arrays['codes'], arrays['scales'], arrays['paper_ids'], np.asarray(arrays['centroids']),
+                   arrays['assignments'], meta['version'], arrays['order'], np.asarray(arrays['offsets']))
+
+
+def load_similarity_index(version=None, directory=SIMILARITY_DIR, workers=DEFAULT_WORKERS,
+                          source=CLEANED_PARQUET_PATH):
+    """SimilarityIndex for the current dataset version, building (from source) and saving it if needed"""
+    version = version or dataset_version()
+    try:
+        index = SimilarityIndex.load_arrays(directory)
+        if index.version == version:
+            return index
+    except (FileNotFoundError, ValueError):
+        pass
+    index = SimilarityIndex.build(load_cleaned(['paper_id', 'title', 'abstract'], path=source), version, workers)
+    index.save_arrays(directory)
+    return index
@@ -0,0 +1,126 @@
+# term_frequency.py - Batched, vectorized word counts over titles or abstracts
+import numpy as np
+import pandas as pd
+
+# Common words left out of the word counts
+STOP_WORDS = {'the', 'and', 'of', 'in', 'to', 'a', 'for', 'with', 'on', 'by',
+              'as', 'an', 'from', 'at', 'that', 'is', 'are', 'this', 'was', 'were'}
+MIN_WORD_LENGTH = 3
+
+# Texts tokenized at a time, to bound memory
+BATCH_SIZE = 100_000
+
+# Group key used for rows whose group value (e.g. year) is missing
+UNKNOWN_GROUP = -1
+
+
+class TermCounts:
+    """Terms and their counts as two arrays, most frequent first"""
+
+    def __init__(self, terms, counts):
+        order = np.argsort(-np.asarray(counts), kind='stable')
+        self.terms = np.asarray(terms, dtype=object)[order]
+        self.counts = np.asarray(counts, dtype=np.int64)[order]
+
+    def __len__(self):
+        return len(self.terms)
+
+    def most_common(self, n=None):
+        """[(term, count), ...] like collections.Counter.most_common"""
+        return list(zip(self.terms[:n].tolist(), self.counts[:n].tolist()))
+
+    def to_frequencies(self, max_terms=None):
+        """{term: count} for WordCloud.generate_from_frequencies"""
+        return dict(self.most_common(max_terms))
+
+
+class GroupedTermCounts:
+    """Term counts per group (e.g. per year), stored as three parallel arrays.
+
+    Any set of groups is answered by summing the matching entries, without
+    looking at the texts again. Supports + and - so it can be updated from
+    added and removed rows.
+    """
+
+    def __init__(self, groups, terms, counts):
+        self.groups = np.asarray(groups)
+        self.terms = np.asarray(terms, dtype=object)
+        self.counts = np.asarray(counts, dtype=np.int64)
+
+    @classmethod
+    def from_series(cls, counts):
+        counts = counts[counts > 0]
+        return cls(counts.index.get_level_values(0).to_numpy(),
+                   counts.index.get_level_values(1).to_numpy(),
+                   counts.to_numpy())
+
+    def to_series(self):
+        index = pd.MultiIndex.from_arrays([self.groups, self.terms], names=['group', 'term'])
+        return pd.Series(self.counts, index=index)
+
+    def __add__(self, other):
+        return GroupedTermCounts.from_series(self.to_series().add(other.to_series(), fill_value=0).astype('int64'))
+
+    def __sub__(self, other):
+        return GroupedTermCounts.from_series(self.to_series().sub(other.to_series(), fill_value=0).astype('int64'))
+
+    def select(self, groups=None, start=None, end=None):
+        """Summed TermCounts over the given groups and/or the group range [start, end]"""
+        mask = np.ones(len(self.groups), dtype=bool)
+        if groups is not None:
+            mask &= np.isin(self.groups, list(groups))
+        if start is not None:
+            mask &= self.groups >= start
+        if end is not None:
+            mask &= self.groups <= end
+        vocabulary, term_ids = self._term_ids()
+        counts = np.bincount(term_ids[mask], weights=self.counts[mask], minlength=len(vocabulary))
+        present = np.flatnonzero(counts)
+        return TermCounts(vocabulary[present], counts[present].astype(np.int64))
+
+    def _term_ids(self):
+        """(vocabulary, term id per entry), built on first use; a selection is then one bincount"""
+        if getattr(self, '_vocabulary', None) is None:
+            self._vocabulary, self._ids = np.unique(self.terms.astype(str), return_inverse=True)
+            self._vocabulary = self._vocabulary.astype(object)
+        return self._vocabulary, self._ids
+
+    def total(self):
+        """TermCounts over all groups"""
+        return self.select()
+
+
+def _batch_words(texts):
+    """Exploded, filtered words of a batch of texts (index = row of the text)"""
+    words = texts.dropna().astype(str).str.lower().str.split().explode().dropna()
+    return words[~words.isin(STOP_WORDS) & (words.str.len() >= MIN_WORD_LENGTH)]
+
+
+def count_terms(texts, batch_size=BATCH_SIZE):
+    """TermCounts over a column of texts (titles or abstracts), processed in batches"""
+    total = None
+    for start in range(0, len(texts), batch_size):
+        counts = _batch_words(texts.iloc[start:start + batch_size]).value_counts()
+        total = counts if total is None else total.add(counts, fill_value=0)
+    if total is None:
+        return TermCounts([], [])
+    return TermCounts(total.index.to_numpy(), total.to_numpy(dtype=np.int64))
+
+
+def count_terms_by(texts, groups, batch_size=BATCH_SIZE):
+    """GroupedTermCounts over a column of texts, grouped by a parallel column (year, journal...)"""
+    texts = texts.reset_index(drop=True)
+    groups = pd.Series(groups).reset_index(drop=True)
+    if pd.api.types.is_numeric_dtype(groups):
+        groups = groups.astype('float64').fillna(UNKNOWN_GROUP).astype('int64')
+    else:
+        groups = groups.astype(str)
+
+    total = None
+    for start in range(0, len(texts), batch_size):
+        words = _batch_words(texts.iloc[start:start + batch_size])
+        counts = words.groupby([groups.loc[words.index].to_numpy(), words.to_numpy()]).size()
+        total = counts if total is None else total.add(counts, fill_value=0)
+    if total is None:
+        return GroupedTermCounts([], [], [])
+    return GroupedTermCounts.from_series(total.astype('int64'))
@@ -0,0 +1,39 @@
+# test_aggregates.py - Aggregates updated from a delta against aggregates of the whole dataset
+import pandas as pd
+import pytest
+
+from benchmark import make_synthetic_metadata
+from cleaning import clean_chunk, first_publish_time
+from aggregates import (AGGREGATE_COLUMNS, compute_aggregates, update_aggregates, recent_papers,
+                        save_aggregates, read_aggregates)
+
+
+@pytest.fixture(scope='module')
+def frame():
+    raw = make_synthetic_metadata(300, seed=4)
+    return clean_chunk(raw, date_anchor=first_publish_time(raw))[AGGREGATE_COLUMNS].reset_index(drop=True)
+
+
+def test_update_equals_recompute(frame):
+    old, removed, added = frame.iloc[:250], frame.iloc[10:30], frame.iloc[250:]
+    current = pd.concat([old.drop(removed.index), added])
+    updated = update_aggregates(compute_aggregates(old), removed, added, recent=recent_papers(current))
+    expected = compute_aggregates(current)
+
+    for key in ('total_papers', 'abstract_sum', 'year_min', 'year_max', 'unique_journals'):
+        assert updated[key] == expected[key], key
+    assert updated['abstract_mean'] == pytest.approx(expected['abstract_mean'])
+    for key in ('year_counts', 'journal_counts', 'journal_year_counts', 'day_counts'):
+        assert updated[key].to_dict() == expected[key].to_dict(), key
+    assert updated['title_terms_by_year'].total().most_common(30) == \
+        expected['title_terms_by_year'].total().most_common(30)
+    pd.testing.assert_frame_equal(updated['recent_papers'], expected['recent_papers'])
+
+
+def test_saved_aggregates_are_tied_to_their_version(frame, tmp_path):
+    path = str(tmp_path / 'aggregates.pkl')
+    save_aggregates(compute_aggregates(frame), 'v1', path)
+    assert read_aggregates('v1', path)['total_papers'] == len(frame)
+    with pytest.raises(ValueError):
+        read_aggregates('v2', path)
+    assert [p.name for p in tmp_path.iterdir()] == ['aggregates.pkl']
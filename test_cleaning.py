@@ -0,0 +1,57 @@
+# test_cleaning.py - The streaming and parallel cleaning modes against cleaning the whole file serially
+import pandas as pd
+
+import cleaning
+from benchmark import make_synthetic_metadata
+from cleaning import (ID_COLUMNS, FeatureExtractor, clean_chunk, clean_csv_streaming, first_publish_time,
+                      read_metadata)
+from dataset import to_typed
+from dedup import deduplicate
+
+CHUNKSIZE = 64
+
+
+def test_streaming_equals_in_memory(tmp_path):
+    raw = make_synthetic_metadata(500, seed=4)
+    raw.loc[CHUNKSIZE, 'publish_time'] = '2015'  # a chunk starting with a year-only date
+    raw.loc[2 * CHUNKSIZE, 'title'] = None  # a chunk whose first row is dropped
+    source, csv_path, parquet_path = (str(tmp_path / name) for name in
+                                      ('metadata.csv', 'cleaned.csv', 'cleaned.parquet'))
+    raw.to_csv(source, index=False)
+
+    rows = clean_csv_streaming(source, csv_path, CHUNKSIZE, parquet_path, workers=1)
+
+    whole = read_metadata(source)
+    expected, _ = deduplicate(clean_chunk(whole, date_anchor=first_publish_time(whole)), workers=1)
+    expected = expected.reset_index(drop=True)
+    assert rows == len(expected)
+
+    streamed = pd.read_parquet(parquet_path)
+    pd.testing.assert_frame_equal(streamed, to_typed(expected)[streamed.columns],
+                                  check_dtype=False, check_categorical=False)
+    exported = pd.read_csv(csv_path, dtype={col: str for col in ID_COLUMNS})
+    assert list(exported.columns) == list(expected.columns)
+    pd.testing.assert_series_equal(exported['paper_id'], expected['paper_id'])
+    pd.testing.assert_series_equal(exported['cluster_id'], expected['cluster_id'])
+
+
+def test_parallel_equals_serial(monkeypatch):
+    raw = make_synthetic_metadata(300, seed=6)
+    anchor = first_publish_time(raw)
+    serial = clean_chunk(raw, date_anchor=anchor)
+
+    monkeypatch.setattr(cleaning, 'MIN_PARALLEL_ROWS', 0)  # small chunks go to the pool too
+    with FeatureExtractor(workers=3) as extractor:
+        assert extractor.executor is not None
+        parallel = clean_chunk(raw, date_anchor=anchor, extractor=extractor)
+
+    pd.testing.assert_frame_equal(parallel, serial)
+
+
+def test_small_chunks_stay_serial():
+    raw = make_synthetic_metadata(50, seed=6)
+    with FeatureExtractor(workers=2) as extractor:
+        extractor.executor.shutdown()  # a chunk below MIN_PARALLEL_ROWS never reaches the pool
+        features = extractor(raw)
+    expected = cleaning.derive_features(raw['publish_time'], raw['title'], raw['abstract'])
+    pd.testing.assert_frame_equal(features, expected)
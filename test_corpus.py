@@ -0,0 +1,54 @@
+# test_corpus.py - The compact corpus store hands out the same rows as the cleaned frame
+import os
+
+import pandas as pd
+
+from benchmark import make_synthetic_metadata
+from cleaning import clean_chunk, first_publish_time
+from corpus import CORPUS_COLUMNS, AbstractStore, CorpusStore, to_compact, write_abstracts
+
+
+def cleaned_frame():
+    raw = make_synthetic_metadata(300, seed=7)
+    raw.loc[3, 'abstract'] = 'Résumé: ünïcode abstract'
+    return clean_chunk(raw, date_anchor=first_publish_time(raw)).reset_index(drop=True)
+
+
+def store(frame, tmp_path):
+    paths = [str(tmp_path / name) for name in ('abstracts.bin', 'abstracts.offsets.npy', 'abstracts.json')]
+    write_abstracts(frame['abstract'], 'v1', *paths)
+    return CorpusStore(to_compact(frame[CORPUS_COLUMNS]), AbstractStore(*paths[:2]))
+
+
+def test_take_equals_frame_rows(tmp_path):
+    frame = cleaned_frame()
+    corpus = store(frame, tmp_path)
+    positions = [3, 0, len(frame) - 1, 17, 3]
+    columns = CORPUS_COLUMNS + ['abstract']
+
+    rows = corpus.take(positions)
+    expected = frame.iloc[positions][columns]
+    assert list(rows.columns) == columns
+    for col in ('title', 'authors', 'journal', 'abstract'):
+        assert rows[col].tolist() == expected[col].tolist()
+    pd.testing.assert_series_equal(rows['publish_time'], expected['publish_time'])
+    assert corpus.take([5], ['title']).columns.tolist() == ['title']
+
+
+def test_placeholders_take_no_space(tmp_path):
+    frame = cleaned_frame()
+    corpus = store(frame, tmp_path)
+    missing = frame['abstract'] == 'No abstract available'
+    assert missing.any()
+    assert corpus.abstracts.get(int(missing.idxmax())) is None
+    assert corpus.frame['journal'].isna().sum() == (frame['journal'] == 'Unknown Journal').sum()
+    # Only the bytes of the real abstracts are written
+    assert os.path.getsize(tmp_path / 'abstracts.bin') == frame['abstract'][~missing].str.encode('utf-8').str.len().sum()
+    assert sorted(os.listdir(tmp_path)) == ['abstracts.bin', 'abstracts.json', 'abstracts.offsets.npy']
+
+
+def test_compact_frame_is_smaller():
+    frame = cleaned_frame()[CORPUS_COLUMNS]
+    compact = to_compact(frame)
+    assert compact['journal'].dtype == 'category'
+    assert compact.memory_usage(deep=True).sum() < frame.memory_usage(deep=True).sum()
@@ -0,0 +1,63 @@
+# test_dataset.py - The typed Parquet file: dtypes, column projection and the CSV fallback
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from benchmark import make_synthetic_metadata
+from cleaning import clean_chunk, first_publish_time
+from dataset import TOMBSTONE_COLUMN, load_cleaned, write_parquet, dataset_version
+
+
+def cleaned_frame():
+    raw = make_synthetic_metadata(200, seed=5)
+    return clean_chunk(raw, date_anchor=first_publish_time(raw)).reset_index(drop=True)
+
+
+def test_typed_round_trip(tmp_path):
+    frame = cleaned_frame()
+    path = str(tmp_path / 'cleaned.parquet')
+    write_parquet(frame, path)
+
+    loaded = load_cleaned(path=path)
+    assert loaded['journal'].dtype == 'category'
+    assert loaded['year'].dtype == 'Int16'
+    assert loaded['abstract_word_count'].dtype == 'int32'
+    assert loaded['publish_time'].dtype == 'datetime64[ns]'
+    assert loaded['pubmed_id'].tolist() == frame['pubmed_id'].tolist()  # identifiers stay text
+    pd.testing.assert_series_equal(loaded['year'].astype('float64'), frame['year'])
+
+
+def test_column_projection(tmp_path):
+    frame = cleaned_frame()
+    path = str(tmp_path / 'cleaned.parquet')
+    write_parquet(frame, path)
+    loaded = load_cleaned(['year', 'journal'], path=path)
+    assert list(loaded.columns) == ['year', 'journal']
+    assert len(loaded) == len(frame)
+
+
+def test_tombstoned_rows_are_left_out(tmp_path):
+    frame = cleaned_frame()
+    frame[TOMBSTONE_COLUMN] = np.arange(len(frame)) % 10 == 0
+    path = str(tmp_path / 'cleaned.parquet')
+    write_parquet(frame, path)
+    assert TOMBSTONE_COLUMN in pq.read_schema(path).names
+
+    loaded = load_cleaned(['paper_id'], path=path)
+    assert list(loaded.columns) == ['paper_id']
+    assert loaded['paper_id'].tolist() == frame.loc[~frame[TOMBSTONE_COLUMN], 'paper_id'].tolist()
+
+
+def test_csv_fallback_and_version(tmp_path):
+    frame = cleaned_frame()
+    parquet_path, csv_path = str(tmp_path / 'cleaned.parquet'), str(tmp_path / 'cleaned.csv')
+    assert dataset_version(parquet_path, csv_path) is None
+    frame.to_csv(csv_path, index=False)
+
+    loaded = load_cleaned(['journal', 'pubmed_id'], path=parquet_path, csv_path=csv_path)
+    assert loaded['journal'].dtype == 'category'
+    assert loaded['pubmed_id'].tolist() == frame['pubmed_id'].tolist()
+    assert dataset_version(parquet_path, csv_path).startswith('cleaned.csv:')
+
+    write_parquet(frame, parquet_path)
+    assert dataset_version(parquet_path, csv_path).startswith('cleaned.parquet:')
@@ -0,0 +1,61 @@
+# test_dataset_profile.py - The persisted dataset profile against pandas computed on the loaded frame
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmark import make_synthetic_metadata
+from cleaning import clean_chunk, first_publish_time
+from dataset import TOMBSTONE_COLUMN, load_cleaned, write_parquet
+from dataset_profile import ProfileBuilder, describe, load_profile, profile_path, read_profile, file_version
+
+
+@pytest.fixture
+def cleaned(tmp_path):
+    raw = make_synthetic_metadata(200, seed=11)
+    frame = clean_chunk(raw, date_anchor=first_publish_time(raw))
+    frame[TOMBSTONE_COLUMN] = np.arange(len(frame)) % 9 == 0
+    path = str(tmp_path / 'cleaned.parquet')
+    write_parquet(frame, path)
+    return path
+
+
+def test_profile_matches_pandas(cleaned):
+    frame = load_cleaned(path=cleaned)
+    profile = load_profile(cleaned)
+    assert profile['rows'] == len(frame)
+    assert TOMBSTONE_COLUMN not in profile['columns'].index
+    columns = profile['columns']
+    for col in frame.columns:
+        assert columns.loc[col, 'null'] == frame[col].isna().sum()
+        assert columns.loc[col, 'cardinality'] == frame[col].nunique()
+    expected = frame['abstract_word_count'].describe()
+    pd.testing.assert_series_equal(describe(profile, 'abstract_word_count').astype('float64'), expected,
+                                   check_names=False)
+    assert columns.loc['publish_time', 'min'] == frame['publish_time'].min()
+
+
+def test_profile_is_persisted_per_version(cleaned):
+    profile = load_profile(cleaned)
+    assert os.path.exists(profile_path(cleaned))
+    assert read_profile(file_version(cleaned), cleaned)['rows'] == profile['rows']
+    assert read_profile('another version', cleaned) is None
+
+
+def test_builder_shares_the_pending_future(cleaned):
+    builder = ProfileBuilder()
+    first = builder.submit(cleaned)
+    second = builder.submit(cleaned)
+    assert second is first or second.done()  # the same future, unless the build already finished
+    assert first.result(30)['rows'] == len(load_cleaned(['paper_id'], path=cleaned))
+    again = builder.submit(cleaned)  # persisted: answered without the thread
+    assert again.done() and again.result()['rows'] == first.result()['rows']
+
+
+def test_failed_build_is_not_kept(tmp_path):
+    path = str(tmp_path / 'missing.parquet')
+    builder = ProfileBuilder()
+    assert builder.submit(path, version='v1').exception(30) is not None
+    write_parquet(pd.DataFrame({'year': [2020.0, 2021.0]}), path)
+    assert builder.submit(path, version='v1').result(30)['rows'] == 2
@@ -0,0 +1,95 @@
+# test_dedup.py - Duplicate detection: identifiers, MinHash/LSH candidates and the streaming spill
+import numpy as np
+import pandas as pd
+import pytest
+
+import dedup
+from dedup import DuplicateIndex, DuplicateSpill, NUM_PERM, BANDS
+
+TEXT = ('severe acute respiratory syndrome coronavirus outbreak in wuhan china clinical features '
+        'of hospitalized patients with pneumonia and their mortality risk factors in intensive care')
+OTHER = ('randomized vaccine trial measuring antibody response and cellular immunity in healthy '
+         'adult volunteers across several public health centres during the lockdown period')
+
+
+def papers(titles, **identifiers):
+    n = len(titles)
+    frame = pd.DataFrame({
+        'paper_id': np.arange(1, n + 1),
+        'title': titles,
+        'abstract': ['No abstract available'] * n,
+        'publish_time': pd.to_datetime(['2020-03-01'] * n),
+        'abstract_word_count': [0] * n,
+    })
+    for col in dedup.KEY_COLUMNS:
+        frame[col] = identifiers.get(col, [None] * n)
+    return frame
+
+
+def test_known_duplicates_are_clustered():
+    frame = papers([TEXT, OTHER, TEXT.upper() + '.', 'Editorial', 'Editorial'],
+                   doi=[None, 'https://doi.org/10.1/ABC', None, None, '10.1/abc'])
+    clusters = DuplicateIndex.build(frame).clusters().set_index('paper_id')
+    # Same text (case and punctuation aside), and the same DOI with a URL prefix
+    assert clusters.loc[3, 'cluster_id'] == 1
+    assert clusters.loc[5, 'cluster_id'] == 2
+    # Short texts only match through identifiers
+    assert clusters.loc[4, 'cluster_id'] == 4
+    assert clusters['canonical'].sum() == 3
+
+
+def test_bucket_members_are_all_compared():
+    # A and A' differ in a few values; B shares band 0 with both but nothing else,
+    # and sorts between them inside the bucket
+    rng = np.random.default_rng(0)
+    a = rng.integers(0, 2**32 - 1, NUM_PERM, dtype=np.uint32)
+    a2 = a.copy()
+    a2[-4:] += 1
+    b = rng.integers(0, 2**32 - 1, NUM_PERM, dtype=np.uint32)
+    b[:NUM_PERM // BANDS] = a[:NUM_PERM // BANDS]
+    signatures = np.stack([a, b, a2])
+    rows = pd.DataFrame({'shingles': [10, 10, 10], **{col: [None] * 3 for col in dedup.KEY_COLUMNS}})
+
+    first, second = dedup.candidate_pairs(lambda col: rows[col], signatures)
+    pairs = {tuple(sorted(p)) for p in zip(first.tolist(), second.tolist())}
+    assert (0, 2) in pairs
+    assert (0, 1) not in pairs and (1, 2) not in pairs
+
+
+def test_group_pairs():
+    first, second = dedup._group_pairs(np.array([5, 1, 5, 2, 5, 1]))
+    pairs = {tuple(sorted(p)) for p in zip(first.tolist(), second.tolist())}
+    assert pairs == {(0, 2), (0, 4), (2, 4), (1, 5)}
+
+
+def test_large_groups_are_paired_in_a_window():
+    values = np.array([5, 1, 5, 2, 5, 1, 5])
+    first, second = dedup._group_pairs(values, window=1)
+    pairs = {tuple(sorted(p)) for p in zip(first.tolist(), second.tolist())}
+    # Neighbours in the group, plus every member further than the window to the first one
+    assert pairs == {(0, 2), (2, 4), (4, 6), (0, 4), (0, 6), (1, 5)}
+    assert len(dedup._group_pairs(np.zeros(1000, dtype=np.int64))[0]) < 1000 * (dedup.BUCKET_WINDOW + 1)
+
+
+def test_spill_matches_in_memory_index(tmp_path):
+    frame = papers([TEXT, OTHER, TEXT + ' update', OTHER, 'Reply', TEXT],
+                   pmcid=[None, 'PMC1', None, None, 'PMC1', None])
+    spill = DuplicateSpill(str(tmp_path / 'cleaned.parquet'))
+    for start in range(0, len(frame), 2):
+        spill.append(frame.iloc[start:start + 2])
+    try:
+        spilled = spill.clusters()
+    finally:
+        spill.remove()
+    pd.testing.assert_frame_equal(spilled, DuplicateIndex.build(frame).clusters())
+    assert not list(tmp_path.iterdir())
+
+
+def test_spill_files_are_removed_when_cleaning_fails(tmp_path):
+    from cleaning import clean_csv_streaming
+
+    source = tmp_path / 'metadata.csv'
+    pd.DataFrame({'cord_uid': ['a', 'b'], 'abstract': [TEXT, OTHER]}).to_csv(source, index=False)  # no title column
+    with pytest.raises(KeyError):
+        clean_csv_streaming(str(source), str(tmp_path / 'cleaned.csv'), 1, str(tmp_path / 'cleaned.parquet'))
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['metadata.csv']
@@ -0,0 +1,52 @@
+# test_entities.py - Author/journal tables and their CSR edges against brute-force answers
+import numpy as np
+import pandas as pd
+
+from entities import EntityTables, load_entities
+
+FRAME = pd.DataFrame({
+    'authors': ['Smith, J.; Smith, J', 'Doe, A.; Lee, K.', 'doe, a', 'Doe, A.; Smith, J.', 'Unknown authors'],
+    'journal': ['Lancet', 'BMJ', 'lancet', 'Lancet', ''],
+    'year': pd.array([2020, 2021, 2020, None, 2019], dtype='Int16'),
+    'abstract_word_count': [100, 200, 0, 50, 10],
+})
+
+
+def test_authors_ranked_by_distinct_papers():
+    tables = EntityTables.build(FRAME)
+    top = tables.top_authors(n=3)
+    # The first paper lists Smith twice; it still counts as one paper
+    assert top.to_dict() == {'Doe, A.': 3, 'Smith, J.': 2, 'Lee, K.': 1}
+    assert list(tables.author_names[:2]) == ['Doe, A.', 'Smith, J.']
+
+
+def test_edges_match_brute_force():
+    tables = EntityTables.build(FRAME)
+    smith = tables.author_id('SMITH,  j')
+    assert list(tables.papers_by_author(smith)) == [0, 3]
+    assert tables.author_list(0) == ['Smith, J.']
+    assert tables.author_list(4) == []
+    assert tables.coauthors(tables.author_id('Doe, A.')).to_dict() == {'Lee, K.': 1, 'Smith, J.': 1}
+    assert tables.top_authors([1, 3]).to_dict() == {'Doe, A.': 2, 'Lee, K.': 1, 'Smith, J.': 1}
+    assert tables.top_authors([], n=5).empty
+
+
+def test_journal_table():
+    table = EntityTables.build(FRAME).journal_table()
+    assert table.index[0] == 'Lancet'
+    assert table.loc['Lancet', 'papers'] == 3
+    assert (table.loc['Lancet', 'first_year'], table.loc['Lancet', 'last_year']) == (2020, 2020)
+    assert table.loc['Lancet', 'abstract_mean'] == 50
+    assert table.loc['Unknown Journal', 'papers'] == 1
+
+
+def test_saved_tables_round_trip(tmp_path):
+    tables = EntityTables.build(FRAME, version='v1')
+    tables.save_arrays(str(tmp_path))
+    loaded = load_entities('v1', str(tmp_path))
+    for name in EntityTables.ARRAYS:
+        np.testing.assert_array_equal(getattr(loaded, name), getattr(tables, name))
+
+    # A second save switches readers to the new tables
+    EntityTables.build(FRAME.iloc[:2], version='v2').save_arrays(str(tmp_path))
+    assert len(load_entities('v2', str(tmp_path))) == 2
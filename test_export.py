@@ -0,0 +1,63 @@
+# test_export.py - Exports streamed in batches against the live rows of the cleaned dataset
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from benchmark import make_synthetic_metadata
+from cleaning import ID_COLUMNS, clean_chunk, first_publish_time
+from dataset import TOMBSTONE_COLUMN, load_cleaned, write_parquet
+from export import FORMATS, export, export_columns, iter_batches
+
+COLUMNS = ['paper_id', 'title', 'journal', 'pubmed_id']
+
+
+@pytest.fixture
+def cleaned(tmp_path):
+    raw = make_synthetic_metadata(250, seed=10)
+    frame = clean_chunk(raw, date_anchor=first_publish_time(raw))
+    frame[TOMBSTONE_COLUMN] = np.arange(len(frame)) % 7 == 0
+    path = str(tmp_path / 'cleaned.parquet')
+    write_parquet(frame, path)
+    return path
+
+
+def read_export(path, fmt):
+    if fmt == 'parquet':
+        return pd.read_parquet(path)
+    codec = FORMATS[fmt][2]  # decompressed by Arrow, like it was written
+    with pa.CompressedInputStream(path, codec) if codec else open(path, 'rb') as f:
+        return pd.read_csv(f, dtype={col: str for col in ID_COLUMNS})
+
+
+@pytest.mark.parametrize('fmt', list(FORMATS))
+def test_export_equals_live_rows(cleaned, tmp_path, fmt):
+    expected = load_cleaned(COLUMNS, path=cleaned)
+    path = export(fmt, COLUMNS, path=cleaned, export_dir=str(tmp_path / 'exports'))
+    exported = read_export(path, fmt)
+    assert list(exported.columns) == COLUMNS
+    assert exported['paper_id'].tolist() == expected['paper_id'].tolist()
+    assert exported['pubmed_id'].tolist() == expected['pubmed_id'].tolist()
+    assert exported['journal'].astype(str).tolist() == expected['journal'].astype(str).tolist()
+
+
+def test_selected_rows_across_batches(cleaned):
+    live = load_cleaned(['paper_id'], path=cleaned)
+    positions = np.array([0, 15, 16, 17, 100, len(live) - 1])
+    batches = list(iter_batches(cleaned, ['paper_id'], positions, batch_rows=16))
+    assert len(batches) == 4  # batches without a selected row are skipped
+    assert pa.Table.from_batches(batches).column('paper_id').to_pylist() == live['paper_id'].iloc[positions].tolist()
+
+
+def test_exports_are_reused_per_version(cleaned, tmp_path):
+    export_dir = str(tmp_path / 'exports')
+    first = export('csv', path=cleaned, export_dir=export_dir)
+    assert export('csv', path=cleaned, export_dir=export_dir) == first
+    assert TOMBSTONE_COLUMN not in pd.read_csv(first, nrows=1).columns
+    assert TOMBSTONE_COLUMN not in export_columns(cleaned)
+    assert export('csv', path=cleaned, export_dir=export_dir, version='other') != first
+    assert not [name for name in os.listdir(export_dir) if name.endswith('.tmp')]
+    with pytest.raises(ValueError):
+        export('xlsx', path=cleaned, export_dir=export_dir)
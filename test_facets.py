@@ -0,0 +1,41 @@
+# test_facets.py - Filtering by precomputed row positions against boolean masks on the frame
+import numpy as np
+import pandas as pd
+
+from facets import FacetIndex, build_facets, select_rows
+
+FRAME = pd.DataFrame({
+    'year': pd.array([2020, 2021, None, 2020, 2019, 2021, 2020], dtype='Int16'),
+    'journal': pd.Categorical(['Lancet', 'BMJ', 'Lancet', 'Nature', 'Lancet', 'Lancet', 'BMJ']),
+})
+
+
+def test_positions_match_masks():
+    facets = build_facets(FRAME)
+    for col, facet in facets.items():
+        for value in facet.values():
+            np.testing.assert_array_equal(facet.positions(value), np.flatnonzero((FRAME[col] == value).fillna(False)))
+    assert sorted(facets['year'].values()) == [2019, 2020, 2021]
+    assert len(facets['year'].positions(1999)) == 0
+    assert facets['year'].positions(np.int64(2020)).tolist() == [0, 3, 6]  # NumPy and Python values alike
+
+
+def test_select_rows():
+    facets = build_facets(FRAME)
+    year, journal = facets['year'].positions(2020), facets['journal'].positions('Lancet')
+    expected = np.flatnonzero((FRAME['year'] == 2020).fillna(False) & (FRAME['journal'] == 'Lancet'))
+    np.testing.assert_array_equal(select_rows([year, journal]), expected)
+    assert select_rows([]) is None
+
+    # Ranked results keep their order, filtered by the selections
+    ranked = np.array([6, 5, 0, 2])
+    assert select_rows([journal], ranked).tolist() == [5, 0, 2]
+    assert select_rows([], ranked).tolist() == [6, 5, 0, 2]
+
+
+def test_arrays_round_trip():
+    facet = FacetIndex(FRAME['journal'])
+    loaded = FacetIndex.from_arrays(*facet.to_arrays())
+    assert loaded.values() == facet.values()
+    for value in facet.values():
+        np.testing.assert_array_equal(loaded.positions(value), facet.positions(value))
@@ -0,0 +1,53 @@
+# test_figures.py - The shared chart cache: background word clouds, coalesced renders and eviction
+import threading
+
+from figures import FigureCache, wordcloud_png
+from term_frequency import TermCounts
+
+PNG_SIGNATURE = b'\x89PNG'
+
+
+def test_wordcloud_is_rendered_once_per_key():
+    cache = FigureCache()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def render():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return wordcloud_png(TermCounts(['virus', 'spread', 'vaccine'], [5, 3, 1]), width=200, height=100)
+
+    first = cache.submit(('wordcloud', 2020, 2021), render)
+    started.wait(5)
+    second = cache.submit(('wordcloud', 2020, 2021), render)  # still rendering: same future
+    assert second is first
+    release.set()
+    assert first.result(5).startswith(PNG_SIGNATURE)
+
+    third = cache.submit(('wordcloud', 2020, 2021), render)  # rendered: answered from the cache
+    assert third.done() and third.result() == first.result()
+    assert len(calls) == 1
+
+
+def test_failed_render_is_not_kept_pending():
+    cache = FigureCache()
+
+    def fail():
+        raise RuntimeError('no terms')
+
+    assert isinstance(cache.submit('key', fail).exception(5), RuntimeError)
+    assert cache.submit('key', lambda: b'png').result(5) == b'png'
+
+
+def test_eviction_keeps_total_size():
+    cache = FigureCache(max_bytes=10)
+    cache.put('a', b'1234')
+    cache.put('b', b'1234')
+    cache.get('a')  # a is now the most recently used
+    cache.put('c', b'1234')
+    assert cache.get('b') is None
+    assert cache.get('a') == b'1234' and cache.get('c') == b'1234'
+    assert cache.nbytes == 8
+    cache.put('huge', b'x' * 11)  # larger than the cache: not stored
+    assert cache.get('huge') is None and len(cache) == 2
@@ -0,0 +1,76 @@
+# test_incremental.py - An incremental update against a full rebuild of the same snapshot
+import os
+
+import pandas as pd
+import pytest
+
+import incremental
+from benchmark import make_synthetic_metadata
+from cleaning import RAW_PATH, CLEANED_PARQUET_PATH
+from dataset import TOMBSTONE_COLUMN, dataset_version
+from aggregates import load_aggregates
+
+COMPARED_COLUMNS = ['title', 'abstract', 'authors', 'journal', 'source_x', 'publish_time', 'year',
+                    'abstract_word_count']
+
+
+def snapshots():
+    """A snapshot and its successor: rows deleted, rows changed and rows added"""
+    first = make_synthetic_metadata(300, seed=2)
+    second = first.drop(first.index[[5, 17, 120]]).copy()
+    second.loc[second.index[:4], 'title'] = 'Revised: ' + second['title'].iloc[:4]
+    second.loc[second.index[50], 'abstract'] = None
+    second.loc[second.index[60], 'publish_time'] = '2021-06-01'
+    added = make_synthetic_metadata(20, seed=3)
+    added['cord_uid'] = 'new' + added['cord_uid']
+    return first, pd.concat([second, added], ignore_index=True)
+
+
+def live_store():
+    store = pd.read_parquet(CLEANED_PARQUET_PATH)
+    if TOMBSTONE_COLUMN in store.columns:
+        store = store[~store[TOMBSTONE_COLUMN]]
+    return store.sort_values('cord_uid', kind='stable').reset_index(drop=True)
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('data')
+    return tmp_path
+
+
+def test_update_equals_full_rebuild(workdir):
+    first, second = snapshots()
+    first.to_csv(RAW_PATH, index=False)
+    incremental.full_rebuild()
+    second.to_csv(RAW_PATH, index=False)
+    incremental.update_incremental()
+    updated, updated_aggregates = live_store(), load_aggregates(dataset_version())
+
+    os.rename('data', 'data.incremental')
+    os.makedirs('data')
+    second.to_csv(RAW_PATH, index=False)
+    incremental.full_rebuild()
+    rebuilt, rebuilt_aggregates = live_store(), load_aggregates(dataset_version())
+
+    pd.testing.assert_frame_equal(updated[['cord_uid'] + COMPARED_COLUMNS].astype(object),
+                                  rebuilt[['cord_uid'] + COMPARED_COLUMNS].astype(object))
+    assert updated['paper_id'].is_unique
+    assert updated[COMPARED_COLUMNS].dtypes.to_dict() == rebuilt[COMPARED_COLUMNS].dtypes.to_dict()
+    for key in ('total_papers', 'abstract_sum'):
+        assert updated_aggregates[key] == rebuilt_aggregates[key], key
+    for key in ('year_counts', 'journal_counts', 'day_counts'):
+        assert updated_aggregates[key].to_dict() == rebuilt_aggregates[key].to_dict(), key
+    assert (updated_aggregates['title_terms_by_year'].total().most_common(50) ==
+            rebuilt_aggregates['title_terms_by_year'].total().most_common(50))
+
+
+def test_unchanged_snapshot_is_a_no_op(workdir, capsys):
+    first, _ = snapshots()
+    first.to_csv(RAW_PATH, index=False)
+    incremental.full_rebuild()
+    before = live_store()
+    incremental.update_incremental()
+    assert "0 added, 0 changed, 0 tombstoned" in capsys.readouterr().out
+    pd.testing.assert_frame_equal(live_store()[before.columns], before)
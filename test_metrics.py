@@ -0,0 +1,66 @@
+# test_metrics.py - Stage instrumentation: spans, the no-op mode, quantiles and the exporters
+import json
+
+import pytest
+
+import metrics
+from metrics import Registry, StageStats, instrument, timed
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = Registry()
+    monkeypatch.setattr(metrics, 'REGISTRY', registry)
+    monkeypatch.setattr(metrics, 'ENABLED', True)
+    return registry
+
+
+def test_instrumented_calls_are_recorded(registry):
+    @instrument('test.load', rows=len)
+    def load(n):
+        return list(range(n))
+
+    assert load(3) == [0, 1, 2]
+    load(5)
+    with timed('test.block') as span:
+        span.rows = 7
+    summary = registry.summary()
+    assert list(summary) == ['test.block', 'test.load']
+    assert summary['test.load']['count'] == 2
+    assert (summary['test.load']['rows'], summary['test.load']['last_rows']) == (8, 5)
+    assert summary['test.block']['rows'] == 7
+    assert summary['test.load']['peak_mb'] is None  # memory is only traced in 'memory' mode
+
+
+def test_nothing_is_recorded_while_disabled(registry, monkeypatch):
+    monkeypatch.setattr(metrics, 'ENABLED', False)
+    with timed('test.block') as span:
+        span.rows = 7
+    instrument('test.call')(lambda: None)()
+    assert registry.summary() == {}
+
+
+def test_quantiles_from_buckets():
+    stats = StageStats()
+    for seconds in [0.002] * 90 + [0.3] * 10:
+        stats.add(seconds)
+    assert stats.quantile(0.5) == 0.0025
+    assert stats.quantile(0.95) == 0.3  # the bucket bound (0.5) capped at the slowest call
+    assert StageStats().quantile(0.5) == 0.0
+
+
+def test_exporters(registry, tmp_path):
+    registry.record('stage', 0.002, rows=10)
+    registry.record('stage', 3.0, rows=5)
+    registry.export_jsonl(str(tmp_path / 'metrics.jsonl'))
+    registry.export_jsonl(str(tmp_path / 'metrics.jsonl'))  # appended
+    lines = [json.loads(line) for line in (tmp_path / 'metrics.jsonl').read_text().splitlines()]
+    assert len(lines) == 2 and lines[0]['stage'] == 'stage' and lines[0]['rows'] == 15
+
+    registry.export_prometheus(str(tmp_path / 'metrics.prom'))
+    prom = (tmp_path / 'metrics.prom').read_text().splitlines()
+    assert 'cord19_stage_seconds_bucket{stage="stage",le="0.0025"} 1' in prom
+    assert 'cord19_stage_seconds_bucket{stage="stage",le="+Inf"} 2' in prom
+    assert 'cord19_stage_seconds_count{stage="stage"} 2' in prom
+    assert 'cord19_stage_rows_total{stage="stage"} 15' in prom
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['metrics.jsonl', 'metrics.prom']
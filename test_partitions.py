@@ -0,0 +1,57 @@
+# test_partitions.py - The out-of-core analysis over the partitioned dataset against analyze()
+import numpy as np
+import pytest
+
+import part3_analysis
+from benchmark import make_synthetic_metadata
+from cleaning import clean_chunk, first_publish_time
+from dataset import TOMBSTONE_COLUMN, write_parquet
+from aggregates import compute_aggregates, AGGREGATE_COLUMNS
+from partitions import write_partitions, list_partitions, partitions_version
+
+
+@pytest.fixture
+def cleaned(tmp_path):
+    """A small cleaned dataset with one tombstoned row, and its partitioned copy"""
+    raw = make_synthetic_metadata(400, seed=1)
+    frame = clean_chunk(raw, date_anchor=first_publish_time(raw))
+    frame[TOMBSTONE_COLUMN] = False
+    frame.loc[frame.index[3], TOMBSTONE_COLUMN] = True
+    path = str(tmp_path / 'cleaned.parquet')
+    write_parquet(frame, path)
+    directory = write_partitions('v1', source=path, directory=str(tmp_path / 'partitioned'))
+    return frame[~frame[TOMBSTONE_COLUMN]], directory
+
+
+def test_partitioned_results_equal_analyze(cleaned):
+    frame, directory = cleaned
+    columns = sorted(set(part3_analysis.ANALYSIS_COLUMNS) | set(AGGREGATE_COLUMNS))
+    aggregates = compute_aggregates(frame[AGGREGATE_COLUMNS])
+    expected = part3_analysis.analyze(frame[columns], aggregates['title_terms_by_year'].total(),
+                                      aggregates['publications'])
+    results, partitioned = part3_analysis.analyze_partitioned(directory, workers=1)
+
+    assert results['yearly_counts'].to_dict() == {int(year): n for year, n in expected['yearly_counts'].items()}
+    for key in ('source_counts', 'monthly_trend'):
+        assert results[key].to_dict() == expected[key].to_dict()
+    # Journals tied at the cut may be listed in either order
+    assert results['top_journals'].tolist() == expected['top_journals'].tolist()
+    assert partitioned['journal_counts'].to_dict() == frame['journal'].value_counts().to_dict()
+    assert results['word_freq'] == expected['word_freq']
+    np.testing.assert_array_equal(results['abstract_histogram'][0], expected['abstract_histogram'][0])
+    np.testing.assert_allclose(results['abstract_histogram'][1], expected['abstract_histogram'][1])
+
+    assert partitioned['total_papers'] == len(frame)
+    assert partitioned['abstract_mean'] == pytest.approx(frame['abstract_word_count'].mean())
+    assert partitioned['unique_journals'] == frame['journal'].nunique()
+
+
+def test_year_range_reads_only_its_partitions(cleaned):
+    frame, directory = cleaned
+    assert partitions_version(directory) == 'v1'
+    assert all(2020 <= year <= 2021 for year, _, _ in list_partitions(directory, 2020, 2021))
+
+    results, aggregates = part3_analysis.analyze_partitioned(directory, start_year=2020, end_year=2021, workers=1)
+    in_range = frame['year'].between(2020, 2021)
+    assert aggregates['total_papers'] == int(in_range.sum())
+    assert results['yearly_counts'].to_dict() == frame.loc[in_range, 'year'].astype(int).value_counts().to_dict()
@@ -0,0 +1,46 @@
+# test_pipeline.py - Cold start: the app imports no charting library; publish() serves the warm-start snapshot
+import os
+import sys
+import subprocess
+
+import pytest
+
+from benchmark import make_synthetic_metadata
+from cleaning import RAW_PATH
+from figures import FIRST_PAGE_FIGURES
+from pipeline import Pipeline
+from shared_dataset import SERVING_DIR, CURRENT_FILE, SharedDataset, current_snapshot
+
+CHARTING_MODULES = ['matplotlib', 'wordcloud', 'seaborn']
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('data')
+    make_synthetic_metadata(200, seed=12).to_csv(RAW_PATH, index=False)
+    return tmp_path
+
+
+def test_app_import_loads_no_charting_library():
+    script = f"import sys, app; print(sorted(set({CHARTING_MODULES!r}) & set(sys.modules)))"
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert result.stdout.strip().splitlines()[-1] == '[]'
+
+
+def test_publish_switches_current_snapshot(workdir):
+    pipeline = Pipeline(streaming=True)
+    outputs = pipeline.run(['clean', 'publish'])
+    snapshot = outputs['publish']
+    assert current_snapshot() == snapshot
+    shared = SharedDataset(snapshot)
+    assert set(shared.figures) == set(FIRST_PAGE_FIGURES)  # the first page's charts come prerendered
+
+    # Publishing an unchanged dataset again writes nothing but repoints CURRENT
+    with open(os.path.join(SERVING_DIR, CURRENT_FILE), 'w') as f:
+        f.write('an older snapshot')
+    modified = os.stat(os.path.join(snapshot, 'snapshot.json')).st_mtime_ns
+    assert Pipeline(streaming=True).publish() == snapshot
+    assert current_snapshot() == snapshot
+    assert os.stat(os.path.join(snapshot, 'snapshot.json')).st_mtime_ns == modified
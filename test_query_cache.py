@@ -0,0 +1,73 @@
+# test_query_cache.py - The shared query cache: coalescing, LRU eviction, TTL and read-only results
+import time
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from query_cache import QueryCache
+
+
+def test_concurrent_misses_are_computed_once():
+    cache = QueryCache()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return np.arange(3)
+
+    results = []
+    owner = threading.Thread(target=lambda: results.append(cache.get('k', compute)))
+    owner.start()
+    started.wait(5)
+    waiters = [threading.Thread(target=lambda: results.append(cache.get('k', compute))) for _ in range(3)]
+    for thread in waiters:
+        thread.start()
+    while cache.stats()['coalesced'] < 3:
+        time.sleep(0.01)
+    release.set()
+    for thread in [owner] + waiters:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert [r.tolist() for r in results] == [[0, 1, 2]] * 4
+    assert cache.stats()['misses'] == 1 and cache.stats()['in_flight'] == 0
+
+
+def test_failed_computation_is_not_cached():
+    cache = QueryCache()
+    with pytest.raises(ZeroDivisionError):
+        cache.get('k', lambda: 1 / 0)
+    assert cache.get('k', lambda: 2) == 2
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = QueryCache(max_bytes=3 * 800)
+    for key in 'abc':
+        cache.get(key, lambda: np.zeros(100))
+    cache.get('a', lambda: None)  # a is now the most recently used
+    cache.get('d', lambda: np.zeros(100))
+    assert cache.stats()['evictions'] == 1
+    assert cache.get('b', lambda: 'recomputed') == 'recomputed'
+    assert isinstance(cache.get('a', lambda: 'recomputed'), np.ndarray)
+
+
+def test_entries_expire_after_the_ttl():
+    cache = QueryCache(ttl=0.05)
+    cache.get('k', lambda: 1)
+    time.sleep(0.1)
+    assert cache.get('k', lambda: 2) == 2
+    assert cache.stats()['expirations'] == 1
+
+
+def test_results_cannot_be_changed_for_other_sessions():
+    cache = QueryCache()
+    array, series = cache.get('k', lambda: (np.arange(3), pd.Series([1, 2])))
+    with pytest.raises(ValueError):
+        array[0] = 5
+    series[0] = 99
+    assert cache.get('k', lambda: None)[1].tolist() == [1, 2]
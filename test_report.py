@@ -0,0 +1,48 @@
+# test_report.py - The headless part 3 report redraws only the figures whose inputs changed
+import os
+
+import pytest
+
+import part3_analysis
+from benchmark import make_synthetic_metadata
+from cleaning import clean_chunk, first_publish_time
+from dataset import to_typed
+from aggregates import compute_aggregates, AGGREGATE_COLUMNS
+from part3_analysis import HASHES_FILE, figure_jobs, render_report
+
+DPI = 20  # small files; the figures are compared by name only
+
+
+@pytest.fixture
+def jobs():
+    raw = make_synthetic_metadata(300, seed=13)
+    frame = to_typed(clean_chunk(raw, date_anchor=first_publish_time(raw)))
+    aggregates = compute_aggregates(frame[AGGREGATE_COLUMNS])
+    title_terms = aggregates['title_terms_by_year'].total()
+    results = part3_analysis.analyze(frame, title_terms, aggregates['publications'])
+    return figure_jobs(results, title_terms, aggregates, families=('journal', 'year'), top_n=2)
+
+
+def test_unchanged_figures_are_skipped(jobs, tmp_path):
+    output_dir = str(tmp_path)
+    names = sorted(name for name, _, _ in jobs)
+    assert len(names) == 3 + 2 + 2
+
+    drawn = render_report(jobs, output_dir, workers=1, dpi=DPI)
+    assert sorted(os.path.basename(path) for path in drawn) == names
+    assert sorted(os.listdir(output_dir)) == sorted(names + [HASHES_FILE])
+    assert render_report(jobs, output_dir, workers=1, dpi=DPI) == []
+
+    # A changed input and a deleted file are drawn again, nothing else
+    name, plot, (journal, counts) = next(job for job in jobs if job[0].startswith('journal_trend_01'))
+    changed = [(name, plot, (journal, counts * 2)) if job[0] == name else job for job in jobs]
+    os.remove(os.path.join(output_dir, 'wordcloud.png'))
+    drawn = render_report(changed, output_dir, workers=1, dpi=DPI)
+    assert sorted(os.path.basename(path) for path in drawn) == sorted([name, 'wordcloud.png'])
+    assert render_report(jobs, output_dir, workers=1, dpi=DPI) == [os.path.join(output_dir, name)]
+
+
+def test_parallel_rendering_draws_every_figure(jobs, tmp_path):
+    drawn = render_report(jobs, str(tmp_path), workers=3, dpi=DPI)
+    assert sorted(os.path.basename(path) for path in drawn) == sorted(name for name, _, _ in jobs)
+    assert all(os.path.getsize(path) > 0 for path in drawn)
@@ -0,0 +1,66 @@
+# test_search_index.py - The CSR inverted index and BM25 ranking against brute-force answers
+import numpy as np
+import pandas as pd
+import pytest
+
+from search_index import InvertedIndex, BM25_K1, BM25_B, query_key, tokenize
+
+DOCUMENTS = pd.DataFrame({
+    'title': ['Viral load in children', 'Vaccine trial', 'Viral shedding and viral load', 'Load testing'],
+    'abstract': ['High viral load was measured.', 'No abstract available', 'Load of virus.', 'load'],
+})
+
+
+def brute_force_bm25(query):
+    """BM25 of every document containing all query terms, from the token lists"""
+    tokens = [tokenize(f'{t} {a if a != "No abstract available" else ""}')
+              for t, a in zip(DOCUMENTS['title'], DOCUMENTS['abstract'])]
+    terms = list(dict.fromkeys(tokenize(query)))
+    avg_length = np.mean([len(t) for t in tokens])
+    scores = {}
+    for doc, words in enumerate(tokens):
+        if not all(term in words for term in terms):
+            continue
+        score = 0.0
+        for term in terms:
+            df = sum(term in w for w in tokens)
+            idf = np.log(1 + (len(tokens) - df + 0.5) / (df + 0.5))
+            tf = words.count(term)
+            score += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * len(words) / avg_length))
+        scores[doc] = score
+    return scores
+
+
+@pytest.mark.parametrize('batch_size', [1, 3, 100])
+def test_postings_match_token_counts(batch_size):
+    index = InvertedIndex.build(DOCUMENTS, batch_size=batch_size)
+    doc_ids, tfs = index.postings('viral')
+    assert doc_ids.tolist() == [0, 2] and tfs.tolist() == [2, 2]
+    assert index.postings('abstract')[0].tolist() == []  # the placeholder is not indexed
+    assert index.doc_lengths.tolist() == [9, 2, 8, 3]
+
+
+@pytest.mark.parametrize('query', ['load', 'viral load', 'LOAD viral load'])
+def test_bm25_matches_brute_force(query):
+    doc_ids, scores = InvertedIndex.build(DOCUMENTS).search(query)
+    expected = brute_force_bm25(query)
+    assert sorted(doc_ids.tolist()) == sorted(expected)
+    np.testing.assert_allclose(scores, [expected[doc] for doc in doc_ids.tolist()])
+    assert (np.diff(scores) <= 0).all()
+
+
+def test_phrases_and_empty_queries():
+    index = InvertedIndex.build(DOCUMENTS)
+    assert sorted(index.search('"viral load"', DOCUMENTS)[0].tolist()) == [0, 2]
+    assert index.search('"load viral"', DOCUMENTS)[0].tolist() == []
+    assert index.search('!!') is None
+    assert query_key('Load  viral') == query_key('viral LOAD')
+
+
+def test_saved_arrays_round_trip(tmp_path):
+    index = InvertedIndex.build(DOCUMENTS, version='v1')
+    index.save_arrays(str(tmp_path))
+    loaded = InvertedIndex.load_arrays(str(tmp_path), 'v1')
+    assert loaded.vocab == index.vocab
+    for query in ('viral load', 'trial'):
+        np.testing.assert_array_equal(loaded.search(query)[0], index.search(query)[0])
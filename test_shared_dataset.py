@@ -0,0 +1,62 @@
+# test_shared_dataset.py - A published snapshot serves the same data as the live cleaned dataset
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import shared_dataset
+from benchmark import make_synthetic_metadata
+from cleaning import RAW_PATH, clean_csv_streaming
+from corpus import CORPUS_COLUMNS
+from dataset import load_cleaned, dataset_version
+from facets import FACET_COLUMNS, build_facets
+from shared_dataset import SharedDataset, current_snapshot, published_snapshot
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('data')
+    make_synthetic_metadata(300, seed=8).to_csv(RAW_PATH, index=False)
+    clean_csv_streaming(RAW_PATH)
+    return tmp_path
+
+
+def test_snapshot_serves_the_cleaned_dataset(workdir):
+    assert current_snapshot() is None
+    directory = shared_dataset.publish()
+    assert current_snapshot() == directory == published_snapshot(dataset_version())
+
+    shared = SharedDataset(directory)
+    assert shared.version == dataset_version()
+    cleaned = load_cleaned(sorted(set(CORPUS_COLUMNS + FACET_COLUMNS)) + ['abstract'])
+    assert len(shared.corpus) == len(cleaned)
+    positions = [0, 5, len(cleaned) - 1]
+    rows = shared.corpus.take(positions, ['title', 'journal', 'abstract'])
+    for col in rows.columns:
+        assert rows[col].tolist() == cleaned[col].iloc[positions].tolist()
+
+    for col, facet in build_facets(cleaned).items():
+        for value in facet.values():
+            np.testing.assert_array_equal(shared.facets[col].positions(value), facet.positions(value))
+    assert isinstance(shared.facets['journal'].positions(cleaned['journal'].iloc[0]), np.memmap)
+    assert shared.aggregates['journal_counts'].to_dict() == cleaned['journal'].value_counts().to_dict()
+    assert len(shared.entities) == len(cleaned)
+
+
+def test_publishing_a_new_version_switches_current(workdir):
+    first = shared_dataset.publish()
+    old = SharedDataset(first)
+
+    raw = pd.read_csv(RAW_PATH)
+    raw.iloc[:50].to_csv(RAW_PATH, index=False)
+    clean_csv_streaming(RAW_PATH)
+    second = shared_dataset.publish()
+    assert second != first and current_snapshot() == second
+    assert len(SharedDataset(second).corpus) < len(old.corpus)
+    assert old.corpus.take([0], ['title'])['title'].notna().all()  # the old snapshot's maps stay readable
+
+    # Publishing the old version again only repoints CURRENT
+    assert shared_dataset.publish(old.version) == first
+    assert current_snapshot() == first
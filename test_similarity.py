@@ -0,0 +1,90 @@
+# test_similarity.py - Paper embeddings and the IVF index against an exhaustive scan
+import os
+
+import numpy as np
+import pandas as pd
+
+from search_index import document_text
+from similarity import SimilarityIndex, EmbeddingModel, quantize, dequantize
+
+TOPICS = [
+    'vaccine antibody trial dose immunity efficacy adults placebo booster response',
+    'ventilation airborne aerosol masks indoor droplets distance spread school office',
+    'genome sequencing variant mutation spike lineage phylogenetic strain protein receptor',
+]
+
+
+def papers(n_per_topic=40, seed=0):
+    rng = np.random.default_rng(seed)
+    titles, topics = [], []
+    for topic, words in enumerate(TOPICS):
+        words = words.split()
+        for _ in range(n_per_topic):
+            titles.append(' '.join(rng.choice(words, 8)))
+            topics.append(topic)
+    return pd.DataFrame({'title': titles, 'abstract': 'No abstract available',
+                         'paper_id': np.arange(1, len(titles) + 1), 'topic': topics})
+
+
+def test_quantize_round_trip():
+    vectors = np.random.default_rng(1).standard_normal((5, 16)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1)[:, None]
+    np.testing.assert_allclose(dequantize(*quantize(vectors)), vectors, atol=0.01)
+
+
+def test_probing_every_list_equals_exhaustive_scan():
+    index = SimilarityIndex.build(papers())
+    everything = index.vectors(np.arange(len(index)))
+    for position in (0, 45, 100):
+        found, scores = index.similar(position, k=5, probe=len(index.centroids))
+        exhaustive = everything @ index.vectors([position])[0]
+        exhaustive[position] = -np.inf
+        assert position not in found
+        np.testing.assert_allclose(scores, np.sort(exhaustive)[::-1][:5], rtol=1e-5)
+
+
+def test_similar_papers_share_the_topic():
+    frame = papers()
+    index = SimilarityIndex.build(frame)
+    for position in (3, 50, 90):
+        found, _ = index.similar(position, k=5)
+        assert (frame['topic'].to_numpy()[found] == frame['topic'][position]).all()
+
+
+def test_update_embeds_only_changed_papers():
+    frame = papers()
+    index = SimilarityIndex.build(frame)
+    changed = frame.copy()
+    changed.loc[0, 'title'] = TOPICS[2]
+    updated = index.update(changed, {int(frame['paper_id'][0])})
+
+    np.testing.assert_array_equal(updated.codes[1:], index.codes[1:])
+    codes, _ = quantize(index.model.embed(document_text(changed.iloc[:1])))
+    np.testing.assert_array_equal(updated.codes[0], codes[0])
+    found, _ = updated.similar(0, k=5)
+    assert (frame['topic'].to_numpy()[found] == 2).all()
+
+
+def test_common_terms_are_kept_when_the_cut_empties_the_vocabulary():
+    texts = pd.Series(['cov study', 'cov study data', 'cov data study', 'data study cov'])
+    model = EmbeddingModel.fit(texts)
+    assert set(model.vocabulary) == {'cov', 'study', 'data'}
+
+
+def test_saved_arrays_round_trip(tmp_path):
+    index = SimilarityIndex.build(papers(), version='v1')
+    directory = str(tmp_path / 'similarity')
+    index.save_arrays(directory)
+    first = SimilarityIndex.load_arrays(directory)
+    for _ in range(3):
+        index.save_arrays(directory)  # replacing an existing index
+    loaded = SimilarityIndex.load_arrays(directory)
+    assert loaded.version == 'v1'
+    np.testing.assert_array_equal(loaded.codes, index.codes)
+    np.testing.assert_array_equal(loaded.similar(7)[0], index.similar(7)[0])
+    # The lists are mapped, not sorted again
+    assert isinstance(loaded.order, np.memmap)
+    np.testing.assert_array_equal(loaded.order, index.order)
+    # The current and the previous write are kept; older ones are pruned
+    assert len(os.listdir(directory)) == 3
+    np.testing.assert_array_equal(first.similar(7)[0], index.similar(7)[0])
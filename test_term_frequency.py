@@ -0,0 +1,43 @@
+# test_term_frequency.py - Vectorized word counts against a plain Counter over the same texts
+from collections import Counter
+
+import pandas as pd
+
+from term_frequency import STOP_WORDS, MIN_WORD_LENGTH, UNKNOWN_GROUP, count_terms, count_terms_by
+
+TITLES = pd.Series(['The Spread of the Virus', 'Virus spread in cities', None, 'A new virus vaccine',
+                    'Vaccine trials and results', 'On the spread'])
+YEARS = pd.Series([2020, 2020, 2021, 2021, None, 2019], dtype='Int16')
+
+
+def brute_force(texts):
+    counter = Counter()
+    for text in texts.dropna():
+        counter.update(word for word in text.lower().split()
+                       if word not in STOP_WORDS and len(word) >= MIN_WORD_LENGTH)
+    return counter
+
+
+def test_counts_match_counter():
+    expected = brute_force(TITLES)
+    counts = count_terms(TITLES)
+    assert dict(counts.most_common()) == dict(expected)
+    assert counts.most_common(1) == [('spread', 3)]
+    assert count_terms(TITLES, batch_size=2).to_frequencies() == counts.to_frequencies()
+    assert len(count_terms(pd.Series([], dtype=object))) == 0
+
+
+def test_grouped_counts():
+    grouped = count_terms_by(TITLES, YEARS, batch_size=4)
+    assert grouped.total().to_frequencies() == dict(brute_force(TITLES))
+    assert grouped.select([2020]).to_frequencies() == dict(brute_force(TITLES[YEARS == 2020]))
+    assert grouped.select(start=2020, end=2021).to_frequencies() == dict(brute_force(TITLES.iloc[:4]))
+    assert grouped.select([UNKNOWN_GROUP]).to_frequencies() == {'vaccine': 1, 'trials': 1, 'results': 1}
+
+
+def test_grouped_counts_update():
+    before = count_terms_by(TITLES.iloc[:4], YEARS.iloc[:4])
+    added = count_terms_by(TITLES.iloc[4:], YEARS.iloc[4:])
+    updated = before + added
+    assert updated.total().to_frequencies() == count_terms_by(TITLES, YEARS).total().to_frequencies()
+    assert (updated - added).total().to_frequencies() == before.total().to_frequencies()
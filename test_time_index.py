@@ -0,0 +1,50 @@
+# test_time_index.py - Publication counts from prefix sums against counting the dates directly
+import numpy as np
+import pandas as pd
+
+from time_index import GRANULARITIES, PublicationIndex
+
+rng = np.random.default_rng(9)
+DATES = pd.Series(pd.Timestamp('2019-11-20') + pd.to_timedelta(rng.integers(0, 500, 400), unit='D'))
+DATES[rng.random(len(DATES)) < 0.1] = pd.NaT
+
+
+def test_count_between_dates():
+    index = PublicationIndex.from_dates(DATES)
+    assert len(index) == DATES.notna().sum()
+    for start, end in (('2020-01-01', '2020-03-31'), ('2020-02-29', '2020-02-29'), (None, '2020-06-15'),
+                       ('2021-01-01', None), ('2022-01-01', '2023-01-01'), ('2020-05-01', '2020-04-01')):
+        mask = DATES.notna()
+        if start is not None:
+            mask &= DATES >= pd.Timestamp(start)
+        if end is not None:
+            mask &= DATES <= pd.Timestamp(end)
+        assert index.count(start, end) == mask.sum()
+        np.testing.assert_array_equal(index.positions_between(start, end), np.flatnonzero(mask))
+
+
+def test_counts_per_granularity():
+    index = PublicationIndex.from_dates(DATES)
+    for granularity, freq in GRANULARITIES.items():
+        counts = index.counts(granularity, '2020-01-15', '2020-12-31')
+        in_range = DATES[(DATES >= '2020-01-15') & (DATES <= '2020-12-31')]
+        expected = in_range.dt.to_period(freq).value_counts()
+        assert counts.sum() == len(in_range)
+        assert counts[counts > 0].to_dict() == expected.to_dict()
+        assert counts.index.is_monotonic_increasing
+    # Zero buckets are included
+    assert len(index.counts('day', '2020-01-01', '2020-01-31')) == 31
+    assert index.counts('month', '2020-05-01', '2020-04-01').empty
+
+
+def test_day_counts_and_saved_arrays(tmp_path):
+    index = PublicationIndex.from_dates(DATES)
+    from_counts = PublicationIndex.from_day_counts(DATES.dropna().dt.normalize().value_counts())
+    assert from_counts.counts('quarter').to_dict() == index.counts('quarter').to_dict()
+
+    index.save_arrays(str(tmp_path))
+    loaded = PublicationIndex.load_arrays(str(tmp_path))
+    assert isinstance(loaded.positions, np.memmap)
+    assert loaded.counts('week').to_dict() == index.counts('week').to_dict()
+    np.testing.assert_array_equal(loaded.positions_between('2020-06-01', '2020-06-30'),
+                                  index.positions_between('2020-06-01', '2020-06-30'))
@@ -0,0 +1,117 @@
+# time_index.py - Publication counts over any date range and granularity, from prefix sums
+import os
+import numpy as np
+import pandas as pd
+
+from dataset import load_cleaned
+
+# Granularities understood by PublicationIndex.counts(), as pandas period frequencies
+GRANULARITIES = {'day': 'D', 'week': 'W', 'month': 'M', 'quarter': 'Q', 'year': 'Y'}
+
+
+def _day(value):
+    return np.datetime64(pd.Timestamp(value).date(), 'D')
+
+
+class PublicationIndex:
+    """Papers per publication day, stored as sorted days and prefix sums of their counts.
+
+    The number of papers between two dates is two binary searches; counts per
+    day/week/month/quarter/year over a range are one binary search per bucket.
+    When built from rows it also keeps the row positions in date order, so the
+    rows published in a date range are a slice.
+    """
+
+    def __init__(self, days, cumulative, positions=None):
+        self.days = days              # distinct publication days, sorted (datetime64[D])
+        self.cumulative = cumulative  # cumulative[i] = papers published before days[i]
+        self.positions = positions    # row positions ordered by publication day, or None
+
+    @classmethod
+    def from_dates(cls, dates):
+        """Index over a column of publication dates (row positions kept; missing dates skipped)"""
+        dates = pd.Series(dates).reset_index(drop=True)
+        valid = np.flatnonzero(dates.notna().to_numpy())
+        days = dates.to_numpy(dtype='datetime64[ns]')[valid].astype('datetime64[D]')
+        order = np.argsort(days, kind='stable')
+        unique_days, counts = np.unique(days[order], return_counts=True)
+        return cls(unique_days, cls._prefix_sums(counts), valid[order].astype(np.int64))
+
+    @classmethod
+    def from_day_counts(cls, day_counts):
+        """Index over papers-per-day counts (a Series indexed by date), without row positions"""
+        day_counts = day_counts.sort_index()
+        return cls(day_counts.index.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]'),
+                   cls._prefix_sums(day_counts.to_numpy()))
+
+    @staticmethod
+    def _prefix_sums(counts):
+        cumulative = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=cumulative[1:])
+        return cumulative
+
+    def __len__(self):
+        return int(self.cumulative[-1])
+
+    @property
+    def first_day(self):
+        return pd.Timestamp(self.days[0]) if len(self.days) else None
+
+    @property
+    def last_day(self):
+        return pd.Timestamp(self.days[-1]) if len(self.days) else None
+
+    def _bounds(self, start=None, end=None):
+        """Index range of days within [start, end] (both inclusive, None = open)"""
+        lo = 0 if start is None else int(np.searchsorted(self.days, _day(start), side='left'))
+        hi = len(self.days) if end is None else int(np.searchsorted(self.days, _day(end), side='right'))
+        return lo, max(lo, hi)
+
+    def count(self, start=None, end=None):
+        """Papers published between start and end (inclusive)"""
+        lo, hi = self._bounds(start, end)
+        return int(self.cumulative[hi] - self.cumulative[lo])
+
+    def counts(self, granularity='month', start=None, end=None):
+        """Papers per day/week/month/quarter/year between start and end, zero buckets included.
+
+        Returns a Series indexed by pandas Periods; empty when there is nothing to count.
+        """
+        start = _day(start) if start is not None else (self.days[0] if len(self.days) else None)
+        end = _day(end) if end is not None else (self.days[-1] if len(self.days) else None)
+        if start is None or end is None or start > end:
+            return pd.Series([], dtype='int64', index=pd.PeriodIndex([], freq=GRANULARITIES[granularity]))
+
+        periods = pd.period_range(start, end, freq=GRANULARITIES[granularity])
+        # Bucket edges: the range start, each later period's first day and the day after the range
+        edges = np.concatenate([[start], periods.start_time[1:].to_numpy().astype('datetime64[D]'),
+                                [end + np.timedelta64(1, 'D')]])
+        totals = self.cumulative[np.searchsorted(self.days, edges, side='left')]
+        return pd.Series(np.diff(totals), index=periods)
+
+    def positions_between(self, start=None, end=None):
+        """Sorted row positions of the papers published between start and end"""
+        if self.positions is None:
+            raise ValueError("This index was built from counts and has no row positions")
+        lo, hi = self._bounds(start, end)
+        return np.sort(self.positions[self.cumulative[lo]:self.cumulative[hi]])
+
+    def save_arrays(self, directory):
+        """Save as .npy files, so load_arrays() can memory-map them"""
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, 'days.npy'), self.days)
+        np.save(os.path.join(directory, 'cumulative.npy'), self.cumulative)
+        if self.positions is not None:
+            np.save(os.path.join(directory, 'positions.npy'), self.positions)
+
+    @classmethod
+    def load_arrays(cls, directory, mmap_mode='r'):
+        positions_path = os.path.join(directory, 'positions.npy')
+        return cls(np.load(os.path.join(directory, 'days.npy')),
+                   np.load(os.path.join(directory, 'cumulative.npy')),
+                   np.load(positions_path, mmap_mode=mmap_mode) if os.path.exists(positions_path) else None)
+
+
+def load_publication_index():
+    """PublicationIndex with row positions, built from the cleaned dataset"""
+    return PublicationIndex.from_dates(load_cleaned(['publish_time'])['publish_time'])